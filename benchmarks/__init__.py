@@ -0,0 +1,8 @@
+"""
+Benchmarki procesu dopasowania.
+
+- generators: syntetyczne pliki WF/REF (opisy robót budowlanych) o zadanej liczbie wierszy
+- run: pomiar etapów MatchingOrchestrator (czas, liczniki, szczyt pamięci) z zapisem JSON
+
+Uruchomienie: python -m benchmarks.run --sizes 1k 10k --engines rapidfuzz tfidf
+"""
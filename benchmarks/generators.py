@@ -0,0 +1,259 @@
+import itertools
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import openpyxl
+
+# Rozmiary plików używane w benchmarkach (liczba wierszy WF i REF)
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+# Zmiana generatora zmienia nazwy plików - wcześniej wygenerowane dane nie są używane
+GENERATOR_VERSION = 1
+
+WORKS = [
+    "Wykonanie",
+    "Montaż",
+    "Demontaż",
+    "Dostawa i montaż",
+    "Rozbiórka",
+    "Układanie",
+    "Malowanie",
+    "Tynkowanie",
+    "Izolacja",
+    "Obsadzenie",
+    "Wymiana",
+    "Naprawa",
+]
+ELEMENTS = [
+    "ścian działowych",
+    "stropu gęstożebrowego",
+    "posadzki",
+    "rurociągu kanalizacyjnego",
+    "przewodów wentylacyjnych",
+    "okładziny ściennej",
+    "pokrycia dachowego",
+    "ław fundamentowych",
+    "stolarki okiennej",
+    "drzwi wewnętrznych",
+    "instalacji wodociągowej",
+    "kabli elektrycznych",
+    "nawierzchni chodnika",
+    "obrzeży betonowych",
+    "studni rewizyjnej",
+    "balustrady stalowej",
+    "sufitu podwieszanego",
+    "ocieplenia ścian",
+    "podbudowy z kruszywa",
+    "krawężników",
+]
+MATERIALS = [
+    "z betonu C20/25",
+    "z betonu C25/30",
+    "z płyt gipsowo-kartonowych",
+    "z cegły pełnej",
+    "z bloczków silikatowych",
+    "z rur PVC",
+    "z rur PE",
+    "z blachy stalowej ocynkowanej",
+    "z płytek ceramicznych",
+    "z wełny mineralnej",
+    "ze styropianu EPS 100",
+    "z kostki brukowej",
+    "z drewna sosnowego",
+    "z paneli PCV",
+    "z kruszywa łamanego",
+]
+PARAMETERS = (
+    [f"gr. {thickness} cm" for thickness in range(4, 31)]
+    + [f"DN {diameter}" for diameter in (50, 75, 110, 160, 200, 250, 315, 400)]
+    + [
+        "o wys. do 3 m",
+        "o wys. powyżej 3 m",
+        "w pomieszczeniach",
+        "na zewnątrz budynku",
+        "mocowanych na klej",
+        "mocowanych mechanicznie",
+    ]
+)
+
+# Skróty spotykane w przedmiarach (opisy WF rzadko są identyczne z katalogiem)
+ABBREVIATIONS = {
+    "Wykonanie": "Wyk.",
+    "Montaż": "Mont.",
+    "Dostawa i montaż": "Dost. i mont.",
+    "Rozbiórka": "Rozb.",
+    "gipsowo-kartonowych": "g-k",
+    "ocynkowanej": "ocynk.",
+    "o wys.": "wys.",
+    "pomieszczeniach": "pom.",
+}
+
+
+@dataclass
+class BenchmarkFiles:
+    """Para wygenerowanych plików wraz z konfiguracją kolumn (układ jak w plikach przykładowych)"""
+
+    working_file: Path
+    reference_file: Path
+    wf_rows: int
+    ref_rows: int
+
+    # Układ plików jak w WF_Oferta.xlsx i REF_Ceny firmy.xlsx
+    FIRST_DATA_ROW = 4
+    WF_DESCRIPTION_COLUMN = "B"
+    WF_PRICE_TARGET_COLUMN = "D"
+    REF_DESCRIPTION_COLUMN = "C"
+    REF_PRICE_SOURCE_COLUMN = "E"
+
+    def config_values(self) -> Dict:
+        """Parametry MatchingConfig dotyczące plików, kolumn i zakresów"""
+        return {
+            "working_file_path": self.working_file,
+            "reference_file_path": self.reference_file,
+            "wf_description_column": self.WF_DESCRIPTION_COLUMN,
+            "wf_description_range": {
+                "start": str(self.FIRST_DATA_ROW),
+                "end": str(self.FIRST_DATA_ROW + self.wf_rows - 1),
+            },
+            "wf_price_target_column": self.WF_PRICE_TARGET_COLUMN,
+            "ref_description_column": self.REF_DESCRIPTION_COLUMN,
+            "ref_description_range": {
+                "start": str(self.FIRST_DATA_ROW),
+                "end": str(self.FIRST_DATA_ROW + self.ref_rows - 1),
+            },
+            "ref_price_source_column": self.REF_PRICE_SOURCE_COLUMN,
+        }
+
+
+class WorkbookGenerator:
+    """
+    Generator syntetycznych plików WF (oferta) i REF (katalog cen) z opisami robót budowlanych.
+
+    Opisy REF są unikalnymi kombinacjami rodzaju robót, elementu, materiału i parametru.
+    Część opisów WF (match_ratio) pochodzi z katalogu i jest zniekształcona (skróty,
+    literówki, pominięte słowa, wielkość liter), pozostałe nie mają odpowiednika w REF.
+    Wynik zależy wyłącznie od ziarna (seed).
+    """
+
+    def __init__(self, seed: int = 0, match_ratio: float = 0.8):
+        self.seed = seed
+        self.match_ratio = match_ratio
+
+    def generate(self, wf_rows: int, ref_rows: int, directory: Path) -> BenchmarkFiles:
+        """
+        Zwraca parę plików o zadanej liczbie wierszy; pliki wygenerowane wcześniej
+        (ten sam rozmiar, ziarno i wersja generatora) są używane ponownie.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        suffix = f"{wf_rows}x{ref_rows}_s{self.seed}_v{GENERATOR_VERSION}"
+        files = BenchmarkFiles(
+            working_file=directory / f"WF_{suffix}.xlsx",
+            reference_file=directory / f"REF_{suffix}.xlsx",
+            wf_rows=wf_rows,
+            ref_rows=ref_rows,
+        )
+        if files.working_file.exists() and files.reference_file.exists():
+            return files
+
+        rng = random.Random(self.seed)
+        catalog, unmatched = self._descriptions(rng, ref_rows)
+        working = self._working_descriptions(rng, catalog, unmatched, wf_rows)
+
+        self._write_reference(
+            files.reference_file,
+            [
+                (description, rng.randint(1, 500), round(rng.uniform(5, 2500), 2))
+                for description in catalog
+            ],
+        )
+        self._write_working(
+            files.working_file,
+            [(description, rng.randint(1, 1000)) for description in working],
+        )
+        return files
+
+    @staticmethod
+    def _descriptions(rng: random.Random, ref_rows: int) -> Tuple[List[str], List[str]]:
+        """Opisy katalogu REF oraz opisy spoza katalogu (dla wierszy WF bez dopasowania)"""
+        combinations = [
+            " ".join(parts)
+            for parts in itertools.product(WORKS, ELEMENTS, MATERIALS, PARAMETERS)
+        ]
+        rng.shuffle(combinations)
+        catalog = combinations[:ref_rows]
+        # Większe katalogi niż liczba kombinacji - kolejne pozycje z numerem wariantu
+        for variant in range(ref_rows - len(catalog)):
+            base, repeat = divmod(variant, len(combinations))
+            catalog.append(f"{combinations[repeat]} wariant {base + 2}")
+        return catalog, combinations[ref_rows:]
+
+    def _working_descriptions(
+        self,
+        rng: random.Random,
+        catalog: List[str],
+        unmatched: List[str],
+        wf_rows: int,
+    ) -> List[str]:
+        descriptions = []
+        for _ in range(wf_rows):
+            if rng.random() < self.match_ratio or not unmatched:
+                descriptions.append(self._distort(rng, rng.choice(catalog)))
+            else:
+                descriptions.append(rng.choice(unmatched))
+        return descriptions
+
+    @staticmethod
+    def _distort(rng: random.Random, description: str) -> str:
+        """Zniekształca opis katalogowy tak, jak różnią się opisy w przedmiarach"""
+        if rng.random() < 0.4:
+            for full, short in ABBREVIATIONS.items():
+                if full in description:
+                    description = description.replace(full, short, 1)
+                    break
+        if rng.random() < 0.3:
+            words = description.split()
+            if len(words) > 3:
+                del words[rng.randrange(1, len(words))]
+                description = " ".join(words)
+        if rng.random() < 0.3 and len(description) > 2:
+            # Literówka - zamiana dwóch sąsiednich znaków
+            position = rng.randrange(len(description) - 1)
+            description = (
+                description[:position]
+                + description[position + 1]
+                + description[position]
+                + description[position + 2 :]
+            )
+        if rng.random() < 0.1:
+            description = description.lower()
+        return description
+
+    @staticmethod
+    def _write_reference(path: Path, rows: List[Tuple[str, int, float]]) -> None:
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append([])
+        sheet.append([None, None, "REFERENCE FILE - baza cen jednostkowych firmy"])
+        sheet.append([None, None, "Zadania", "Ilość", "Cena jednostkowa", "cena"])
+        for row, (description, quantity, price) in enumerate(
+            rows, start=BenchmarkFiles.FIRST_DATA_ROW
+        ):
+            sheet.append([None, None, description, quantity, price, f"=D{row}*E{row}"])
+        workbook.save(path)
+
+    @staticmethod
+    def _write_working(path: Path, rows: List[Tuple[str, int]]) -> None:
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append([])
+        sheet.append([None, "WORKING FILE - oferta"])
+        sheet.append([None, "Opis zadania", "Ilość", "Cena jednostkowa", "cena"])
+        first_row = BenchmarkFiles.FIRST_DATA_ROW
+        for row, (description, quantity) in enumerate(rows, start=first_row):
+            sheet.append([None, description, quantity, None, f"=C{row}*D{row}"])
+        last_row = first_row + len(rows) - 1
+        sheet.append([None, "suma", None, None, f"=SUM(E{first_row}:E{last_row})"])
+        workbook.save(path)
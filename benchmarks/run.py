@@ -0,0 +1,281 @@
+"""
+Pomiar etapów MatchingOrchestrator na syntetycznych plikach WF/REF.
+
+Każdy przebieg zapisuje czasy etapów (JobTrace), liczniki, szczyt pamięci
+(tracemalloc) i maksymalny RSS procesu. Wyniki zapisywane są jako JSON,
+a przy podaniu --baseline porównywane z wcześniejszym pomiarem.
+
+    python -m benchmarks.run --sizes 1k 10k --engines rapidfuzz tfidf
+    python -m benchmarks.run --sizes 10k --baseline cache/benchmarks/results/old.json
+
+tracemalloc spowalnia etapy wykonywane w Pythonie (odczyt i zapis Excela) -
+do porównań samych czasów służy --no-tracemalloc.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import django
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_DATA_DIR = BASE_DIR / "cache" / "benchmarks" / "data"
+DEFAULT_RESULTS_DIR = BASE_DIR / "cache" / "benchmarks" / "results"
+
+
+def setup_django() -> None:
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "fast_bidder_app.settings")
+    django.setup()
+
+
+def run_case(
+    files,
+    engine: str,
+    threshold: float,
+    top_k: int,
+    trace_memory: bool,
+    index_dir: Path,
+    warm_index: bool,
+) -> Dict:
+    """
+    Jeden przebieg dopasowania na kopii pliku WF (zapis cen modyfikuje plik).
+
+    Args:
+        files: BenchmarkFiles z generatora
+        engine: Silnik dopasowania
+        threshold: Próg podobieństwa
+        top_k: Liczba kandydatów na wiersz WF
+        trace_memory: Czy mierzyć szczyt pamięci przez tracemalloc
+        index_dir: Katalog indeksów REF przebiegu
+        warm_index: False - indeks REF i pamięć wyników dopasowania budowane od zera
+            (pusty katalog i pamięć procesu)
+    """
+    from matching.services.instrumentation import JobTrace
+    from matching.services.match_cache import MatchCache
+    from matching.services.matching_jobs import create_matching_orchestrator
+    from matching.services.matching_orchestrator import MatchingConfig
+    from matching.services.reference_index import ReferenceIndexStore
+
+    if not warm_index:
+        shutil.rmtree(index_dir, ignore_errors=True)
+        ReferenceIndexStore.clear_memory_cache()
+        MatchCache.clear_memory()
+
+    with tempfile.TemporaryDirectory(prefix="fastbidder_bench_") as work_dir:
+        working_file = Path(work_dir) / files.working_file.name
+        shutil.copy(files.working_file, working_file)
+        config = MatchingConfig(
+            **{
+                **files.config_values(),
+                "working_file_path": working_file,
+            },
+            matching_threshold=threshold,
+            top_k=top_k,
+            engine=engine,
+        )
+        orchestrator = create_matching_orchestrator(
+            reference_index_store=ReferenceIndexStore(index_dir),
+            match_cache=MatchCache(sqlite_path=str(index_dir / "match_cache.sqlite3")),
+        )
+        trace = JobTrace(benchmark=True)
+
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            orchestrator.process_matching_request(
+                config, trace=trace, output_directory=Path(work_dir)
+            )
+        finally:
+            total_seconds = time.perf_counter() - start
+            peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+            if trace_memory:
+                tracemalloc.stop()
+
+    summary = trace.summary()
+    return {
+        "wf_rows": files.wf_rows,
+        "ref_rows": files.ref_rows,
+        "engine": engine,
+        "index_cache": "warm" if warm_index else "cold",
+        "total_seconds": round(total_seconds, 6),
+        "stages": summary["spans"],
+        "counters": summary["counters"],
+        "rows_per_second": round(files.wf_rows / total_seconds, 1),
+        "peak_memory_mb": (
+            round(peak_memory / 1024**2, 1) if peak_memory is not None else None
+        ),
+        "max_rss_mb": round(max_rss_bytes() / 1024**2, 1),
+    }
+
+
+def max_rss_bytes() -> int:
+    """Maksymalny RSS procesu od jego startu (Linux podaje KiB, macOS bajty)"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+    }
+
+
+def case_key(run: Dict) -> tuple:
+    return run["wf_rows"], run["ref_rows"], run["engine"], run["index_cache"]
+
+
+def compare_with_baseline(runs: List[Dict], baseline: Dict) -> List[str]:
+    """Porównanie czasów z wcześniejszym pomiarem (stosunek > 1 = szybciej niż baseline)"""
+    baseline_runs = {case_key(run): run for run in baseline["runs"]}
+    lines = []
+    for run in runs:
+        previous = baseline_runs.get(case_key(run))
+        if previous is None:
+            continue
+        stages = ", ".join(
+            f"{stage} x{previous['stages'][stage] / seconds:.2f}"
+            for stage, seconds in run["stages"].items()
+            if seconds and previous["stages"].get(stage)
+        )
+        lines.append(
+            f"{run['wf_rows']}x{run['ref_rows']} {run['engine']} ({run['index_cache']}): "
+            f"x{previous['total_seconds'] / run['total_seconds']:.2f} [{stages}]"
+        )
+    return lines
+
+
+def format_run(run: Dict) -> str:
+    stages = ", ".join(
+        f"{stage} {seconds:.2f}s" for stage, seconds in run["stages"].items()
+    )
+    memory = (
+        f"peak {run['peak_memory_mb']} MB, " if run["peak_memory_mb"] is not None else ""
+    )
+    return (
+        f"{run['wf_rows']}x{run['ref_rows']} {run['engine']} ({run['index_cache']}): "
+        f"{run['total_seconds']:.2f}s [{stages}] {memory}RSS {run['max_rss_mb']} MB, "
+        f"dopasowania {run['counters'].get('matches_above_threshold', 0)}, "
+        f"z pamięci {run['counters'].get('match_cache_hits', 0)}"
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    from benchmarks.generators import SIZES
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark etapów dopasowania na syntetycznych plikach WF/REF"
+    )
+    parser.add_argument("--sizes", nargs="+", default=["1k"], choices=list(SIZES))
+    parser.add_argument("--engines", nargs="+", default=["rapidfuzz"])
+    parser.add_argument(
+        "--ref-rows",
+        type=int,
+        help="Liczba wierszy REF (domyślnie tyle samo co WF)",
+    )
+    parser.add_argument("--threshold", type=float, default=80)
+    parser.add_argument("--top-k", type=int, default=1)
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help=(
+            "Liczba przebiegów; kolejne korzystają z gotowego indeksu REF "
+            "i pamięci wyników dopasowania (warm)"
+        ),
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-tracemalloc", action="store_true")
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR)
+    parser.add_argument("--output", type=Path, help="Plik wyników JSON")
+    parser.add_argument("--baseline", type=Path, help="Wcześniejszy plik wyników JSON")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    args = parse_args(argv)
+    setup_django()
+    logging.getLogger("matching").setLevel(args.log_level)
+
+    from benchmarks.generators import SIZES, WorkbookGenerator
+
+    generator = WorkbookGenerator(seed=args.seed)
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="fastbidder_bench_index_") as index_dir:
+        for size in args.sizes:
+            files = generator.generate(
+                wf_rows=SIZES[size],
+                ref_rows=args.ref_rows or SIZES[size],
+                directory=args.data_dir,
+            )
+            for engine in args.engines:
+                for repeat in range(args.repeat):
+                    run = run_case(
+                        files,
+                        engine=engine,
+                        threshold=args.threshold,
+                        top_k=args.top_k,
+                        trace_memory=not args.no_tracemalloc,
+                        index_dir=Path(index_dir) / f"{size}_{engine}",
+                        warm_index=repeat > 0,
+                    )
+                    runs.append(run)
+                    print(format_run(run))
+
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "parameters": {
+            "seed": args.seed,
+            "threshold": args.threshold,
+            "top_k": args.top_k,
+            "tracemalloc": not args.no_tracemalloc,
+        },
+        "runs": runs,
+    }
+
+    output = args.output or DEFAULT_RESULTS_DIR / (
+        f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"Wyniki zapisane w {output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        for line in compare_with_baseline(runs, baseline):
+            print(line)
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
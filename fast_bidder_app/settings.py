@@ -141,3 +141,109 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'uploaded_files')
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Maksymalny rozmiar pliku Excel - pliki czytane są strumieniowo (tryb tylko do odczytu),
+# więc pamięć nie rośnie razem z rozmiarem skoroszytu
+EXCEL_MAX_FILE_SIZE_MB = 50
+# Maksymalna liczba arkuszy w pliku Excel (i arkuszy w jednym żądaniu dopasowania)
+EXCEL_MAX_SHEETS = 10
+
+# Maksymalna liczba katalogów REF przeszukiwanych w jednym żądaniu dopasowania
+MATCHING_MAX_REFERENCE_CATALOGS = 5
+
+# Liczba procesów, między które dzielone są wiersze WF dla scorerów napisanych
+# w Pythonie (None - rdzenie dostępne wg cgroup i affinity, 0 - bez podziału)
+MATCHING_SHARD_WORKERS = None
+# Minimalna liczba opisów WF, od której opłaca się uruchomić pulę procesów
+MATCHING_SHARD_MIN_ROWS = 500
+
+# Katalog wyników zadań dopasowania - każde zadanie zapisuje kopię pliku WF z cenami
+# i raport we własnym podkatalogu (przesłany plik WF, przechowywany pod hashem
+# zawartości, nie jest modyfikowany)
+MATCHING_OUTPUT_DIR = os.path.join(BASE_DIR, 'matching_output')
+
+# Katalog z zaindeksowanymi katalogami cen REF (klucz: hash pliku + konfiguracja kolumn)
+REFERENCE_INDEX_DIR = os.path.join(BASE_DIR, 'cache', 'reference_index')
+
+# Normalizacja opisów WF i REF przed dopasowaniem (raz na opis przy odczycie);
+# zmiana ustawień wymusza przebudowę indeksów REF
+MATCHING_TEXT_NORMALIZATION = {
+    'casefold': True,
+    'fold_diacritics': True,
+    'canonical_units': True,
+    'normalize_numbers': True,
+}
+
+# Pamięć wyników dopasowania opisów WF między zadaniami (klucz: opis, hash katalogu REF,
+# scorer, próg) - w pamięci procesu (LRU) i we wspólnej bazie SQLite (None - tylko pamięć)
+MATCH_CACHE_MAX_ENTRIES = 100_000
+MATCH_CACHE_SQLITE_PATH = os.path.join(BASE_DIR, 'cache', 'match_cache.sqlite3')
+MATCH_CACHE_SQLITE_MAX_ENTRIES = 1_000_000
+
+# Zadania dopasowania uruchamiane są w puli procesów roboczych
+# (0 = wykonanie w wątku żądania, np. w testach)
+MATCHING_JOB_WORKERS = 2
+# Maksymalna liczba zadań oczekujących i wykonywanych jednocześnie - kolejne żądania są odrzucane
+MATCHING_JOB_MAX_QUEUED = 50
+# Zadania osierocone (np. po restarcie procesu serwera) oznaczane są jako błędne:
+# RUNNING bez sygnału życia dłużej niż MATCHING_JOB_STALE_MINUTES oraz PENDING
+# czekające dłużej niż MATCHING_JOB_PENDING_TIMEOUT_MINUTES (przy sprawdzaniu
+# miejsca w kolejce lub komendą manage.py recover_matching_jobs)
+MATCHING_JOB_STALE_MINUTES = 30
+MATCHING_JOB_PENDING_TIMEOUT_MINUTES = 360
+# Minimalny odstęp między zapisami sygnału życia zadania (heartbeat_at)
+MATCHING_JOB_HEARTBEAT_SECONDS = 30
+
+# Zdarzenia postępu zadań dopasowania (plik NDJSON na sesję) i ich strumieniowanie
+MATCHING_EVENTS_DIR = os.path.join(BASE_DIR, 'cache', 'matching_events')
+MATCHING_EVENTS_POLL_INTERVAL = 0.5
+# Maksymalny czas jednego połączenia strumienia w sekundach (klient wznawia przez Last-Event-ID)
+MATCHING_EVENTS_STREAM_TIMEOUT = 600
+
+# Liczba wierszy MatchingResult w jednym INSERT (bulk_create w jednej transakcji)
+MATCHING_RESULTS_BATCH_SIZE = 2000
+
+# Odstęp próbkowania stosów przy profilowaniu zadania (flaga "profile", tylko personel)
+MATCHING_PROFILE_SAMPLE_INTERVAL = 0.005
+# Katalog profili zadań (.pstats i .collapsed) - poza katalogami plików i wyników
+MATCHING_PROFILE_DIR = os.path.join(BASE_DIR, 'cache', 'profiles')
+
+# Maksymalny rozmiar jednej części przy przesyłaniu pliku w częściach (PUT /files/uploads/<id>/)
+UPLOAD_CHUNK_MAX_SIZE_MB = 8
+# Czas bez przesłania kolejnej części, po którym sesja przesyłania wygasa - jej plik
+# tymczasowy (.part) jest usuwany (przy tworzeniu nowej sesji lub komendą
+# manage.py expire_upload_sessions)
+UPLOAD_SESSION_TTL_HOURS = 24
+
+# Logi procesu dopasowania (logger "matching") jako linie JSON z trace_id zadania;
+# poziom DEBUG włącza logi początku etapów, INFO - czasy etapów i podsumowanie zadania
+MATCHING_LOG_LEVEL = os.environ.get('MATCHING_LOG_LEVEL', 'INFO')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {
+            '()': 'matching.services.instrumentation.StructuredFormatter',
+        },
+    },
+    'handlers': {
+        'matching_console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'structured',
+        },
+    },
+    'loggers': {
+        'matching': {
+            'handlers': ['matching_console'],
+            'level': MATCHING_LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
+# Migawki metryk procesów (serwer i procesy robocze) sumowane przez endpoint /metrics
+MATCHING_METRICS_DIR = os.path.join(BASE_DIR, 'cache', 'metrics')
+# Uprawnienia endpointu /metrics (np. 'rest_framework.permissions.AllowAny' dla
+# Prometheus w sieci wewnętrznej); domyślnie tylko administratorzy (Basic Auth)
+MATCHING_METRICS_PERMISSION_CLASSES = ['rest_framework.permissions.IsAdminUser']
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from files_recording.services import UploadStorage
+
+
+class Command(BaseCommand):
+    help = (
+        "Wygasza porzucone sesje przesyłania plików w częściach i usuwa ich pliki "
+        "tymczasowe (.part) oraz pliki .part bez aktywnej sesji"
+    )
+
+    def handle(self, *args, **options):
+        storage = UploadStorage()
+        expired = storage.expire_upload_sessions()
+        removed = storage.remove_orphaned_temp_files()
+        self.stdout.write(
+            f"Wygaszone sesje przesyłania: {expired}, "
+            f"usunięte pliki tymczasowe bez sesji: {removed}"
+        )
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files_recording", "0004_remove_uploadedfile_selected_column_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadedfile",
+            name="category",
+            field=models.CharField(blank=True, default="", max_length=20),
+        ),
+        migrations.AddField(
+            model_name="uploadedfile",
+            name="original_name",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="uploadedfile",
+            name="sha256",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="uploadedfile",
+            name="size",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="uploadedfile",
+            constraint=models.UniqueConstraint(
+                fields=("category", "sha256"), name="unique_uploaded_file_content"
+            ),
+        ),
+    ]
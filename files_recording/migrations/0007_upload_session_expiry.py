@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-17 05:30
+
+import files_recording.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files_recording", "0006_upload_session"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadsession",
+            name="expires_at",
+            field=models.DateTimeField(default=files_recording.models.upload_session_expiry),
+        ),
+        migrations.AlterField(
+            model_name="uploadsession",
+            name="status",
+            field=models.CharField(choices=[("ACTIVE", "W trakcie"), ("COMPLETED", "Zakończone"), ("FAILED", "Błąd"), ("EXPIRED", "Wygasło")], default="ACTIVE", max_length=20),
+        ),
+    ]
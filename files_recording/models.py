@@ -1,4 +1,14 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+def upload_session_expiry():
+    """Termin wygaśnięcia sesji przesyłania liczony od teraz"""
+    return timezone.now() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
 
 
 class UploadedFile(models.Model):
@@ -6,5 +16,68 @@ class UploadedFile(models.Model):
     uploaded_date = models.DateTimeField(auto_now_add=True)
     description = models.TextField(blank=True, null=True)
 
+    # Plik przechowywany jest pod swoim hashem - ta sama zawartość w danej
+    # kategorii zapisywana jest tylko raz (ponowne przesłanie zwraca istniejący rekord)
+    sha256 = models.CharField(max_length=64, null=True, blank=True)
+    size = models.BigIntegerField(null=True, blank=True)
+    category = models.CharField(max_length=20, blank=True, default="")
+    original_name = models.CharField(max_length=255, blank=True, default="")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "sha256"], name="unique_uploaded_file_content"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.file.name.split('/')[-1]} (ID: {self.id})"
+
+
+class UploadSession(models.Model):
+    """
+    Przesyłanie pliku w częściach (wznawialne): init -> PUT części od zadanego
+    przesunięcia -> finalize (weryfikacja hashu i utworzenie UploadedFile).
+    Sesja bez kolejnej części przez UPLOAD_SESSION_TTL_HOURS wygasa, a jej plik
+    tymczasowy jest usuwany.
+    """
+
+    STATUS_ACTIVE = "ACTIVE"
+    STATUS_COMPLETED = "COMPLETED"
+    STATUS_FAILED = "FAILED"
+    STATUS_EXPIRED = "EXPIRED"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    category = models.CharField(max_length=20)
+    original_name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    # Liczba bajtów zapisanych od początku pliku (kolejna część zaczyna się od tego miejsca)
+    received = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, default="")
+    temp_path = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            (STATUS_ACTIVE, "W trakcie"),
+            (STATUS_COMPLETED, "Zakończone"),
+            (STATUS_FAILED, "Błąd"),
+            (STATUS_EXPIRED, "Wygasło"),
+        ],
+        default=STATUS_ACTIVE,
+    )
+    uploaded_file = models.ForeignKey(
+        UploadedFile, null=True, blank=True, on_delete=models.SET_NULL
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Przesuwany przy każdej zapisanej części
+    expires_at = models.DateTimeField(default=upload_session_expiry)
+
+    @property
+    def is_expired(self) -> bool:
+        return self.status == self.STATUS_EXPIRED or (
+            self.status == self.STATUS_ACTIVE and self.expires_at <= timezone.now()
+        )
+
+    def __str__(self):
+        return f"{self.original_name} ({self.received}/{self.size} B, {self.status})"
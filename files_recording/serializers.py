@@ -1,8 +1,44 @@
 from rest_framework import serializers
-from .models import UploadedFile
+from .models import UploadedFile, UploadSession
 
 
 class UploadedFileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UploadedFile
         fields = "__all__"
+        # Wyliczane przez serwer przy zapisie pliku
+        read_only_fields = ["sha256", "size", "category", "original_name"]
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = [
+            "category",
+            "original_name",
+            "size",
+            "received",
+            "status",
+            "uploaded_file",
+            "created_at",
+            "updated_at",
+            "expires_at",
+        ]
+        read_only_fields = fields
+
+
+class UploadSessionInitSerializer(serializers.Serializer):
+    file_name = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    # Hash całego pliku - jeśli podany, plik o tej zawartości nie jest przesyłany ponownie
+    sha256 = serializers.RegexField(r"^[0-9a-fA-F]{64}$", required=False)
+
+    def validate_sha256(self, value):
+        return value.lower()
+
+
+class UploadSessionFinalizeSerializer(serializers.Serializer):
+    sha256 = serializers.RegexField(r"^[0-9a-fA-F]{64}$", required=False)
+
+    def validate_sha256(self, value):
+        return value.lower()
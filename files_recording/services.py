@@ -0,0 +1,237 @@
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import UploadedFile, UploadSession
+
+
+class UploadStorage:
+    """
+    Zapis przesłanych plików Excel pod hashem zawartości (SHA-256).
+
+    Hash liczony jest w trakcie zapisu kolejnych fragmentów do pliku tymczasowego.
+    Plik o tej samej zawartości w danej kategorii zapisywany jest tylko raz -
+    ponowne przesłanie zwraca istniejący rekord UploadedFile.
+
+    Zapisanych plików nie modyfikuje się - ResultWriter zapisuje ceny do kopii WF
+    w katalogu wyników zadania. Plik zmieniony mimo to poza aplikacją przestaje
+    odpowiadać swojemu hashowi, więc jego rekord jest odłączany (sha256=None),
+    a nowa kopia pliku zapisywana jest od nowa.
+    """
+
+    UPLOAD_ROOT = "uploaded_files"
+    CATEGORIES = ("uploaded", "reference", "working")
+    ALLOWED_EXTENSIONS = (".xls", ".xlsx")
+    FILE_MODE = 0o644
+
+    def category_directory(self, category: str) -> str:
+        return f"{self.UPLOAD_ROOT}/{category}_files"
+
+    def find_existing(self, category: str, sha256: str) -> Optional[UploadedFile]:
+        """Zwraca rekord pliku o podanym hashu w kategorii (jeśli już go przesłano)"""
+        existing = UploadedFile.objects.filter(
+            category=category, sha256=sha256.lower()
+        ).first()
+        if existing is None or self._is_unchanged(existing):
+            return existing
+
+        # Plik zmieniony po zapisie - rekord zostaje, ale nie reprezentuje już tej zawartości
+        UploadedFile.objects.filter(pk=existing.pk).update(sha256=None)
+        return None
+
+    @staticmethod
+    def _is_unchanged(instance: UploadedFile) -> bool:
+        """Plik istnieje, ma zapisany rozmiar i nie był modyfikowany po przesłaniu"""
+        try:
+            stat = os.stat(instance.file.name)
+        except OSError:
+            return False
+        return (
+            stat.st_size == instance.size
+            and stat.st_mtime <= instance.uploaded_date.timestamp()
+        )
+
+    @staticmethod
+    def file_digest(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as source:
+            for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def create_temp_file(self, category: str) -> str:
+        """Tworzy pusty plik tymczasowy w katalogu kategorii (ten sam system plików co cel)"""
+        directory = self.category_directory(category)
+        os.makedirs(directory, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        os.close(file_descriptor)
+        return temp_path
+
+    @staticmethod
+    def write_chunk(temp_path: str, offset: int, stream: BinaryIO, length: int) -> int:
+        """
+        Zapisuje część pliku od podanego przesunięcia.
+        Ponowienie tej samej części nadpisuje te same bajty.
+
+        Args:
+            temp_path: Plik tymczasowy przesyłania
+            offset: Przesunięcie początku części w pliku
+            stream: Treść żądania
+            length: Deklarowana długość części (Content-Length)
+
+        Returns:
+            int: Liczba faktycznie zapisanych bajtów (mniej, gdy połączenie zostało przerwane)
+        """
+        written = 0
+        with open(temp_path, "r+b") as destination:
+            destination.seek(offset)
+            while written < length:
+                block = stream.read(min(1024 * 1024, length - written))
+                if not block:
+                    break
+                destination.write(block)
+                written += len(block)
+        return written
+
+    def store_chunks(
+        self, chunks: Iterable[bytes], original_name: str, category: str
+    ) -> Tuple[UploadedFile, bool]:
+        """
+        Zapisuje plik przesyłany fragmentami, licząc jednocześnie jego hash.
+
+        Args:
+            chunks: Kolejne fragmenty pliku (np. UploadedFile.chunks())
+            original_name: Nazwa pliku po stronie klienta
+            category: Kategoria pliku ('uploaded', 'reference', 'working')
+
+        Returns:
+            (rekord UploadedFile, True jeśli plik zapisano po raz pierwszy)
+        """
+        temp_path = self.create_temp_file(category)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_path, "wb") as destination:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    destination.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+        return self.register_file(
+            temp_path, digest.hexdigest(), size, original_name, category
+        )
+
+    def register_file(
+        self,
+        temp_path: str,
+        sha256: str,
+        size: int,
+        original_name: str,
+        category: str,
+    ) -> Tuple[UploadedFile, bool]:
+        """
+        Przenosi kompletny plik pod jego hash i tworzy rekord UploadedFile.
+        Gdy plik o tej zawartości już istnieje, plik tymczasowy jest usuwany.
+
+        Returns:
+            (rekord UploadedFile, True jeśli plik zapisano po raz pierwszy)
+        """
+        existing = self.find_existing(category, sha256)
+        if existing is not None:
+            os.remove(temp_path)
+            return existing, False
+
+        extension = Path(original_name).suffix.lower()
+        file_path = f"{self.category_directory(category)}/{sha256}{extension}"
+        if os.path.exists(file_path) and self.file_digest(file_path) != sha256:
+            # Pod tą nazwą leży zmieniony plik odłączonego rekordu
+            file_path = (
+                f"{self.category_directory(category)}/"
+                f"{sha256}-{uuid.uuid4().hex[:8]}{extension}"
+            )
+
+        if os.path.exists(file_path):
+            os.remove(temp_path)
+        else:
+            os.chmod(temp_path, self.FILE_MODE)
+            os.replace(temp_path, file_path)
+
+        # get_or_create obsługuje równoległe przesłanie tego samego pliku
+        return UploadedFile.objects.get_or_create(
+            category=category,
+            sha256=sha256,
+            defaults={
+                "file": file_path,
+                "size": size,
+                "original_name": original_name,
+            },
+        )
+
+    @staticmethod
+    def expire_session(upload: UploadSession) -> bool:
+        """
+        Oznacza aktywną sesję przesyłania jako wygasłą i usuwa jej plik tymczasowy.
+
+        Returns:
+            bool: True, jeśli sesja wygasła w tym wywołaniu
+        """
+        # Warunek statusu chroni przed równoległym zatwierdzeniem tej samej sesji
+        expired = UploadSession.objects.filter(
+            pk=upload.pk, status=UploadSession.STATUS_ACTIVE
+        ).update(status=UploadSession.STATUS_EXPIRED, updated_at=timezone.now())
+        if expired and os.path.exists(upload.temp_path):
+            os.remove(upload.temp_path)
+        return bool(expired)
+
+    def expire_upload_sessions(self) -> int:
+        """
+        Wygasza sesje przesyłania bez nowej części dłużej niż UPLOAD_SESSION_TTL_HOURS.
+
+        Returns:
+            int: Liczba wygaszonych sesji
+        """
+        expired_sessions = UploadSession.objects.filter(
+            status=UploadSession.STATUS_ACTIVE, expires_at__lte=timezone.now()
+        )
+        return sum(self.expire_session(upload) for upload in expired_sessions)
+
+    def remove_orphaned_temp_files(self) -> int:
+        """
+        Usuwa pliki .part starsze niż UPLOAD_SESSION_TTL_HOURS, do których nie
+        należy żadna aktywna sesja (np. po przerwanym zapisie store_chunks).
+
+        Returns:
+            int: Liczba usuniętych plików
+        """
+        active_paths = {
+            os.path.abspath(path)
+            for path in UploadSession.objects.filter(
+                status=UploadSession.STATUS_ACTIVE
+            ).values_list("temp_path", flat=True)
+        }
+        cutoff = time.time() - settings.UPLOAD_SESSION_TTL_HOURS * 3600
+        removed = 0
+        for category in self.CATEGORIES:
+            directory = Path(self.category_directory(category))
+            if not directory.is_dir():
+                continue
+            for temp_path in directory.glob("*.part"):
+                if os.path.abspath(temp_path) in active_paths:
+                    continue
+                try:
+                    if temp_path.stat().st_mtime < cutoff:
+                        temp_path.unlink()
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
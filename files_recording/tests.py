@@ -1,3 +1,210 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from matching.services import metrics
+
+from .models import UploadedFile, UploadSession
+from .services import UploadStorage
+
+
+class ChunkedUploadTests(TestCase):
+    """Przesyłanie w częściach: przesunięcia, wznowienie, zatwierdzenie, wygaśnięcie"""
+
+    CONTENT = bytes(range(256)) * 40
+    CHUNK_SIZE = 4000
+
+    def setUp(self):
+        self.upload_root = tempfile.mkdtemp(prefix="fastbidder_uploads_")
+        self.addCleanup(shutil.rmtree, self.upload_root, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(UploadStorage, "UPLOAD_ROOT", self.upload_root),
+            mock.patch.object(metrics, "_registry", None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        metrics_dir = override_settings(
+            MATCHING_METRICS_DIR=os.path.join(self.upload_root, "metrics")
+        )
+        metrics_dir.enable()
+        self.addCleanup(metrics_dir.disable)
+        self.sha256 = hashlib.sha256(self.CONTENT).hexdigest()
+
+    def start_upload(self, **data):
+        response = self.client.post(
+            "/files/upload/working/sessions/",
+            {"file_name": "WF.xlsx", "size": len(self.CONTENT), **data},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()["upload_id"]
+
+    def put_chunk(self, upload_id, offset, chunk):
+        return self.client.put(
+            f"/files/uploads/{upload_id}/",
+            chunk,
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def upload_all(self, upload_id, offset=0):
+        while offset < len(self.CONTENT):
+            response = self.put_chunk(
+                upload_id, offset, self.CONTENT[offset : offset + self.CHUNK_SIZE]
+            )
+            self.assertEqual(response.status_code, 200)
+            offset = response.json()["received"]
+
+    def finalize(self, upload_id, **data):
+        return self.client.post(
+            f"/files/uploads/{upload_id}/finalize/",
+            data,
+            content_type="application/json",
+        )
+
+    def test_upload_in_chunks_and_finalize(self):
+        upload_id = self.start_upload(sha256=self.sha256)
+
+        self.upload_all(upload_id)
+        response = self.finalize(upload_id)
+
+        self.assertEqual(response.status_code, 201)
+        uploaded = UploadedFile.objects.get(sha256=self.sha256)
+        with open(uploaded.file.name, "rb") as source:
+            self.assertEqual(source.read(), self.CONTENT)
+        self.assertEqual(
+            UploadSession.objects.get(pk=upload_id).status,
+            UploadSession.STATUS_COMPLETED,
+        )
+        self.assertEqual(self.finalize(upload_id).status_code, 200)
+
+    def test_wrong_offset_returns_received_bytes(self):
+        upload_id = self.start_upload()
+        self.put_chunk(upload_id, 0, self.CONTENT[:100])
+
+        for offset in (0, 150):
+            with self.subTest(offset=offset):
+                response = self.put_chunk(upload_id, offset, self.CONTENT[:50])
+                self.assertEqual(response.status_code, 409)
+                self.assertEqual(response.json()["received"], 100)
+                self.assertEqual(response["Upload-Offset"], "100")
+
+    def test_resume_from_reported_offset(self):
+        upload_id = self.start_upload(sha256=self.sha256)
+        self.put_chunk(upload_id, 0, self.CONTENT[:1234])
+
+        offset = self.client.get(f"/files/uploads/{upload_id}/").json()["received"]
+        self.upload_all(upload_id, offset)
+
+        self.assertEqual(offset, 1234)
+        self.assertEqual(self.finalize(upload_id).status_code, 201)
+
+    def test_chunk_beyond_declared_size_is_rejected(self):
+        upload_id = self.start_upload()
+
+        response = self.put_chunk(upload_id, 0, self.CONTENT + b"x")
+
+        self.assertEqual(response.status_code, 413)
+
+    def test_finalize_before_all_chunks(self):
+        upload_id = self.start_upload(sha256=self.sha256)
+        self.put_chunk(upload_id, 0, self.CONTENT[:10])
+
+        response = self.finalize(upload_id)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["received"], 10)
+
+    def test_hash_mismatch_fails_session_and_removes_part_file(self):
+        upload_id = self.start_upload(sha256="0" * 64)
+        self.upload_all(upload_id)
+        temp_path = UploadSession.objects.get(pk=upload_id).temp_path
+
+        response = self.finalize(upload_id)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["sha256"], self.sha256)
+        self.assertFalse(os.path.exists(temp_path))
+        self.assertFalse(UploadedFile.objects.exists())
+
+    def test_known_hash_returns_existing_file(self):
+        upload_id = self.start_upload(sha256=self.sha256)
+        self.upload_all(upload_id)
+        self.finalize(upload_id)
+
+        response = self.client.post(
+            "/files/upload/working/sessions/",
+            {
+                "file_name": "kopia.xlsx",
+                "size": len(self.CONTENT),
+                "sha256": self.sha256,
+            },
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UploadSession.objects.count(), 1)
+
+    def test_expired_session_is_gone_and_part_file_removed(self):
+        upload_id = self.start_upload(sha256=self.sha256)
+        self.put_chunk(upload_id, 0, self.CONTENT[:100])
+        upload = UploadSession.objects.get(pk=upload_id)
+        UploadSession.objects.filter(pk=upload_id).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+
+        self.assertEqual(self.put_chunk(upload_id, 100, b"x").status_code, 410)
+        self.assertEqual(self.finalize(upload_id).status_code, 410)
+        self.assertFalse(os.path.exists(upload.temp_path))
+        self.assertEqual(
+            self.client.get(f"/files/uploads/{upload_id}/").json()["status"],
+            UploadSession.STATUS_EXPIRED,
+        )
+
+    def test_each_chunk_extends_expiry(self):
+        upload_id = self.start_upload()
+        UploadSession.objects.filter(pk=upload_id).update(
+            expires_at=timezone.now() + timedelta(minutes=1)
+        )
+
+        self.put_chunk(upload_id, 0, self.CONTENT[:10])
+
+        self.assertGreater(
+            UploadSession.objects.get(pk=upload_id).expires_at,
+            timezone.now() + timedelta(hours=1),
+        )
+
+    def test_cleanup_command_expires_sessions_and_orphaned_part_files(self):
+        stale_id = self.start_upload()
+        active_id = self.start_upload()
+        UploadSession.objects.filter(pk=stale_id).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        storage = UploadStorage()
+        orphan = storage.create_temp_file("working")
+        two_days_ago = time.time() - 48 * 3600
+        os.utime(orphan, (two_days_ago, two_days_ago))
+
+        output = StringIO()
+        call_command("expire_upload_sessions", stdout=output)
+
+        self.assertEqual(
+            output.getvalue().strip(),
+            "Wygaszone sesje przesyłania: 1, usunięte pliki tymczasowe bez sesji: 1",
+        )
+        self.assertFalse(os.path.exists(orphan))
+        self.assertEqual(
+            UploadSession.objects.get(pk=stale_id).status, UploadSession.STATUS_EXPIRED
+        )
+        active = UploadSession.objects.get(pk=active_id)
+        self.assertEqual(active.status, UploadSession.STATUS_ACTIVE)
+        self.assertTrue(os.path.exists(active.temp_path))
@@ -1,7 +1,18 @@
 from django.urls import path
-from .views import UploadExcelFileView
+from .views import (
+    UploadExcelFileView,
+    UploadSessionCreateView,
+    UploadSessionFinalizeView,
+    UploadSessionView,
+)
 
 urlpatterns  = [
     path('upload/<str:category>/', UploadExcelFileView.as_view(), 
          name='upload_excel_file'),
+    path('upload/<str:category>/sessions/', UploadSessionCreateView.as_view(),
+         name='upload_session_create'),
+    path('uploads/<uuid:upload_id>/', UploadSessionView.as_view(),
+         name='upload_session'),
+    path('uploads/<uuid:upload_id>/finalize/', UploadSessionFinalizeView.as_view(),
+         name='upload_session_finalize'),
 ]
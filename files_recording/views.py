@@ -4,11 +4,42 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from drf_spectacular.utils import extend_schema
-from .models import UploadedFile
-from .serializers import UploadedFileSerializer
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from .models import UploadedFile, UploadSession, upload_session_expiry
+from .serializers import (
+    UploadedFileSerializer,
+    UploadSessionFinalizeSerializer,
+    UploadSessionInitSerializer,
+    UploadSessionSerializer,
+)
+from .services import UploadStorage
+from matching.services import metrics
 import os
 
 
+def file_response(instance, created: bool) -> Response:
+    """Odpowiedź z rekordem UploadedFile (201 - nowy plik, 200 - plik już istniał)"""
+    if created:
+        message = (
+            f"Plik Excel został przesłany i zapisany w katalogu "
+            f"'{os.path.dirname(instance.file.name)}'"
+        )
+    else:
+        message = "Plik Excel o tej zawartości został już przesłany"
+
+    return Response(
+        {
+            "message": message,
+            "data": UploadedFileSerializer(instance).data,
+            "file_path": instance.file.name,
+        },
+        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+    )
+
+
 class UploadExcelFileView(APIView):
     """
     Klasa obsługująca przesyłanie plików Excel do aplikacji.
@@ -19,8 +50,12 @@ class UploadExcelFileView(APIView):
     @extend_schema(
         summary="Przesłanie pliku Excel",
         description="Endpoint umożliwiający przesyłanie pliku Excel "
-        "Walidajcja rozrzerzemoa .xls lub .xlsx.",
+        "Walidajcja rozrzerzemoa .xls lub .xlsx. "
+        "Plik zapisywany jest pod hashem SHA-256 zawartości - ponowne przesłanie "
+        "tego samego pliku zwraca istniejący rekord. Parametr ?sha256= pozwala "
+        "sprawdzić istniejący plik bez przesyłania jego zawartości.",
         responses={
+            200: {"message": "Plik już istnieje."},
             201: {"message": "Plik został przesłany."},
             400: {"message": "Nieprawidłowy plik."},
         },
@@ -29,8 +64,8 @@ class UploadExcelFileView(APIView):
         """
         Obsługuje przesyłanie plików Excel.
         """
-        file_category = ("uploaded", "reference", "working")
-        if category not in file_category:
+        storage = UploadStorage()
+        if category not in storage.CATEGORIES:
             return Response(
                 {
                     "error": "Nieprawidlowa kategoria zapisu. Dozwolone: 'uploaded', 'reference', 'working'"
@@ -38,34 +73,316 @@ class UploadExcelFileView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        # Znany hash - istniejący plik zwracany bez odczytu treści żądania
+        known_sha256 = request.query_params.get("sha256")
+        if known_sha256:
+            existing = storage.find_existing(category, known_sha256)
+            if existing is not None:
+                return file_response(existing, created=False)
+
         file_serializer = UploadedFileSerializer(data=request.data)
 
         if file_serializer.is_valid():
             uploaded_file = request.FILES["file"]
 
-            if not uploaded_file.name.endswith((".xls", ".xlsx")):
+            if not uploaded_file.name.lower().endswith(storage.ALLOWED_EXTENSIONS):
                 return Response(
                     {"error": "Tylko pliki Excel są obsługiwane!"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            directory = f"uploaded_files/{category}_files"
-            os.makedirs(directory, exist_ok=True)
+            instance, created = storage.store_chunks(
+                uploaded_file.chunks(), uploaded_file.name, category
+            )
+            metrics.record_upload(uploaded_file.size)
+            return file_response(instance, created)
+
+        return Response(file_serializer.errors, status=HTTP_400_BAD_REQUEST)
 
-            file_path = os.path.join(directory, uploaded_file.name)
-            with open(file_path, "wb") as destination:
-                for chunk in uploaded_file.chunks():
-                    destination.write(chunk)
 
-            instance = UploadedFile(file=file_path)
-            instance.save()
+class UploadSessionCreateView(APIView):
+    """
+    Rozpoczęcie przesyłania dużego pliku Excel w częściach.
+    """
 
+    @extend_schema(
+        summary="Rozpoczęcie przesyłania pliku w częściach",
+        description="Tworzy sesję przesyłania (nazwa pliku, rozmiar, opcjonalnie SHA-256). "
+        "Części przesyłane są żądaniami PUT na upload_url z nagłówkiem Upload-Offset, "
+        "a plik zatwierdzany przez POST na finalize_url. Jeśli plik o podanym hashu "
+        "już istnieje, zwracany jest istniejący rekord.",
+        request=UploadSessionInitSerializer,
+        responses={
+            200: {"message": "Plik już istnieje."},
+            201: {"upload_id": "Identyfikator sesji przesyłania."},
+            400: {"message": "Nieprawidłowe dane."},
+            413: {"message": "Plik jest zbyt duży."},
+        },
+    )
+    def post(self, request, category):
+        storage = UploadStorage()
+        if category not in storage.CATEGORIES:
             return Response(
                 {
-                    "message": f"Plik Excel został przesłany i zapisany w katalogu '{directory}'",
-                    "data": file_serializer.data,
+                    "error": "Nieprawidlowa kategoria zapisu. Dozwolone: 'uploaded', 'reference', 'working'"
                 },
-                status=status.HTTP_201_CREATED,
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        return Response(file_serializer.errors, status=HTTP_400_BAD_REQUEST)
+        serializer = UploadSessionInitSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        if not data["file_name"].lower().endswith(storage.ALLOWED_EXTENSIONS):
+            return Response(
+                {"error": "Tylko pliki Excel są obsługiwane!"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if data["size"] > settings.EXCEL_MAX_FILE_SIZE_MB * 1024 * 1024:
+            return Response(
+                {
+                    "error": f"Plik jest zbyt duży (maksymalnie "
+                    f"{settings.EXCEL_MAX_FILE_SIZE_MB} MB)"
+                },
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        if data.get("sha256"):
+            existing = storage.find_existing(category, data["sha256"])
+            if existing is not None:
+                return file_response(existing, created=False)
+
+        # Porzucone sesje przesyłania nie zajmują miejsca na dysku
+        storage.expire_upload_sessions()
+
+        upload = UploadSession.objects.create(
+            category=category,
+            original_name=data["file_name"],
+            size=data["size"],
+            sha256=data.get("sha256", ""),
+            temp_path=storage.create_temp_file(category),
+        )
+        return upload_session_response(request, upload, status.HTTP_201_CREATED)
+
+
+class UploadSessionView(APIView):
+    """
+    Stan sesji przesyłania, zapis kolejnych części i przerwanie przesyłania.
+    """
+
+    @extend_schema(
+        summary="Stan przesyłania pliku w częściach",
+        description="Zwraca liczbę odebranych bajtów - od tego miejsca klient wznawia "
+        "przesyłanie - oraz termin wygaśnięcia sesji (przesuwany przy każdej części).",
+    )
+    def get(self, request, upload_id):
+        upload = get_object_or_404(UploadSession, pk=upload_id)
+        if upload.is_expired and UploadStorage.expire_session(upload):
+            upload.refresh_from_db()
+        return upload_session_response(request, upload)
+
+    @extend_schema(
+        summary="Przesłanie części pliku",
+        description="Treść żądania to surowe bajty części, nagłówek Upload-Offset "
+        "(lub parametr ?offset=) wskazuje jej początek i musi być równy liczbie "
+        "odebranych bajtów. Przy niezgodności zwracane jest 409 z aktualnym przesunięciem.",
+        request={"application/offset+octet-stream": {"type": "string", "format": "binary"}},
+        responses={
+            200: {"received": "Liczba odebranych bajtów."},
+            409: {"message": "Nieprawidłowe przesunięcie."},
+            410: {"message": "Sesja przesyłania wygasła."},
+            413: {"message": "Część jest zbyt duża."},
+        },
+    )
+    def put(self, request, upload_id):
+        upload = get_object_or_404(UploadSession, pk=upload_id)
+        if upload.is_expired:
+            return expired_response(upload)
+        if upload.status != UploadSession.STATUS_ACTIVE:
+            return Response(
+                {"error": "Przesyłanie zostało już zakończone"},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        try:
+            offset = int(
+                request.headers.get("Upload-Offset", request.query_params.get("offset"))
+            )
+            length = int(request.headers.get("Content-Length") or 0)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "Wymagane są nagłówki Upload-Offset i Content-Length"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if offset != upload.received:
+            return Response(
+                {
+                    "error": "Przesunięcie części nie zgadza się z liczbą odebranych bajtów",
+                    "received": upload.received,
+                },
+                status=status.HTTP_409_CONFLICT,
+                headers={"Upload-Offset": str(upload.received)},
+            )
+        if length > settings.UPLOAD_CHUNK_MAX_SIZE_MB * 1024 * 1024:
+            return Response(
+                {
+                    "error": f"Część jest zbyt duża (maksymalnie "
+                    f"{settings.UPLOAD_CHUNK_MAX_SIZE_MB} MB)"
+                },
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        if offset + length > upload.size:
+            return Response(
+                {"error": "Część wykracza poza zadeklarowany rozmiar pliku"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        written = 0
+        if length:
+            written = UploadStorage.write_chunk(
+                upload.temp_path, offset, request.stream, length
+            )
+
+        # Równoległy zapis tej samej części przesuwa licznik tylko raz
+        updated = UploadSession.objects.filter(
+            pk=upload.pk, received=offset, status=UploadSession.STATUS_ACTIVE
+        ).update(
+            received=offset + written,
+            updated_at=timezone.now(),
+            expires_at=upload_session_expiry(),
+        )
+        upload.refresh_from_db()
+        if not updated:
+            return Response(
+                {
+                    "error": "Przesunięcie części nie zgadza się z liczbą odebranych bajtów",
+                    "received": upload.received,
+                },
+                status=status.HTTP_409_CONFLICT,
+                headers={"Upload-Offset": str(upload.received)},
+            )
+        return upload_session_response(request, upload)
+
+    @extend_schema(
+        summary="Przerwanie przesyłania pliku w częściach",
+        description="Usuwa sesję przesyłania i odebrane części pliku.",
+    )
+    def delete(self, request, upload_id):
+        upload = get_object_or_404(UploadSession, pk=upload_id)
+        if upload.status == UploadSession.STATUS_ACTIVE and os.path.exists(
+            upload.temp_path
+        ):
+            os.remove(upload.temp_path)
+        upload.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionFinalizeView(APIView):
+    """
+    Zatwierdzenie przesłanego w częściach pliku.
+    """
+
+    @extend_schema(
+        summary="Zatwierdzenie pliku przesłanego w częściach",
+        description="Sprawdza, czy odebrano cały plik, i porównuje jego SHA-256 "
+        "z hashem podanym przy rozpoczęciu lub w tym żądaniu. Zgodny plik zapisywany "
+        "jest tak samo jak przy zwykłym przesłaniu (rekord UploadedFile).",
+        request=UploadSessionFinalizeSerializer,
+        responses={
+            200: {"message": "Plik już istnieje."},
+            201: {"message": "Plik został przesłany."},
+            400: {"message": "Hash pliku jest niezgodny."},
+            409: {"message": "Plik nie został przesłany w całości."},
+            410: {"message": "Sesja przesyłania wygasła."},
+        },
+    )
+    def post(self, request, upload_id):
+        upload = get_object_or_404(UploadSession, pk=upload_id)
+        if upload.status == UploadSession.STATUS_COMPLETED:
+            return file_response(upload.uploaded_file, created=False)
+        if upload.is_expired:
+            return expired_response(upload)
+        if upload.status != UploadSession.STATUS_ACTIVE:
+            return Response(
+                {"error": "Przesyłanie zakończyło się błędem"},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        serializer = UploadSessionFinalizeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        expected_sha256 = serializer.validated_data.get("sha256") or upload.sha256
+        if not expected_sha256:
+            return Response(
+                {"error": "Wymagany jest hash SHA-256 pliku"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if upload.received != upload.size:
+            return Response(
+                {
+                    "error": "Plik nie został przesłany w całości",
+                    "received": upload.received,
+                    "size": upload.size,
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        storage = UploadStorage()
+        sha256 = storage.file_digest(upload.temp_path)
+        if sha256 != expected_sha256:
+            os.remove(upload.temp_path)
+            UploadSession.objects.filter(pk=upload.pk).update(
+                status=UploadSession.STATUS_FAILED, updated_at=timezone.now()
+            )
+            return Response(
+                {
+                    "error": "Hash przesłanego pliku jest niezgodny z oczekiwanym",
+                    "sha256": sha256,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        instance, created = storage.register_file(
+            upload.temp_path, sha256, upload.size, upload.original_name, upload.category
+        )
+        metrics.record_upload(upload.size)
+        UploadSession.objects.filter(pk=upload.pk).update(
+            status=UploadSession.STATUS_COMPLETED,
+            sha256=sha256,
+            uploaded_file=instance,
+            updated_at=timezone.now(),
+        )
+        return file_response(instance, created)
+
+
+def expired_response(upload: UploadSession) -> Response:
+    """Sesja wygasła - odebrane części zostały usunięte, przesyłanie trzeba zacząć od nowa"""
+    UploadStorage.expire_session(upload)
+    return Response(
+        {"error": "Sesja przesyłania wygasła - rozpocznij przesyłanie od nowa"},
+        status=status.HTTP_410_GONE,
+    )
+
+
+def upload_session_response(
+    request, upload: UploadSession, status_code: int = status.HTTP_200_OK
+) -> Response:
+    """Stan sesji przesyłania wraz z adresami kolejnych kroków"""
+    upload_url = request.build_absolute_uri(
+        reverse("upload_session", kwargs={"upload_id": upload.pk})
+    )
+    return Response(
+        {
+            "upload_id": upload.pk,
+            **UploadSessionSerializer(upload).data,
+            "upload_url": upload_url,
+            "finalize_url": request.build_absolute_uri(
+                reverse("upload_session_finalize", kwargs={"upload_id": upload.pk})
+            ),
+        },
+        status=status_code,
+        headers={"Upload-Offset": str(upload.received)},
+    )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from matching.services.matching_jobs import recover_stale_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Oznacza jako błędne zadania dopasowania osierocone po restarcie lub awarii "
+        "procesu serwera (PENDING/RUNNING bez sygnału życia)"
+    )
+
+    def handle(self, *args, **options):
+        recovered = recover_stale_jobs()
+        self.stdout.write(f"Oznaczone zadania osierocone: {recovered}")
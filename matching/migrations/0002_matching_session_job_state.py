@@ -0,0 +1,47 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matching", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="matchingsession",
+            name="config",
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name="matchingsession",
+            name="finished_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="matchingsession",
+            name="report_path",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="matchingsession",
+            name="started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="matchingsession",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDING", "Oczekuje"),
+                    ("RUNNING", "W trakcie"),
+                    ("COMPLETED", "Zakończone"),
+                    ("ERROR", "Błąd"),
+                ],
+                default="PENDING",
+                max_length=20,
+            ),
+        ),
+    ]
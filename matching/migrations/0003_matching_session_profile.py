@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matching", "0002_matching_session_job_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="matchingsession",
+            name="profile_enabled",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="matchingsession",
+            name="profile_path",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matching", "0003_matching_session_profile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="matchingresult",
+            name="ref_sheet",
+            field=models.CharField(blank=True, default="", max_length=31),
+        ),
+        migrations.AddField(
+            model_name="matchingresult",
+            name="wf_sheet",
+            field=models.CharField(blank=True, default="", max_length=31),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matching", "0004_matching_result_sheets"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="matchingsession",
+            name="output_file_path",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matching', '0005_matching_session_output_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchingsession',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
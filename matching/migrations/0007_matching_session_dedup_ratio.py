@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matching', '0006_matching_session_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchingsession',
+            name='dedup_ratio',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matching', '0007_matching_session_dedup_ratio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchingsession',
+            name='exact_match_rate',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -4,20 +4,53 @@ from django.db import models
 class MatchingSession(models.Model):
     """Model przechowujący informacje o sesjii do porownywania"""
 
+    # Statusy zadania: PENDING -> RUNNING -> COMPLETED / ERROR
+    STATUS_PENDING = "PENDING"
+    STATUS_RUNNING = "RUNNING"
+    STATUS_COMPLETED = "COMPLETED"
+    STATUS_ERROR = "ERROR"
+
     created_at = models.DateTimeField(auto_now_add=True)
     working_file_path = models.CharField(max_length=255)
     reference_file_path = models.CharField(max_length=255)
     status = models.CharField(
         max_length=20,
         choices=[
-            ("PENDING", "W trakcie"),
-            ("COMPLETED", "Zakończone"),
-            ("ERROR", "Błąd"),
+            (STATUS_PENDING, "Oczekuje"),
+            (STATUS_RUNNING, "W trakcie"),
+            (STATUS_COMPLETED, "Zakończone"),
+            (STATUS_ERROR, "Błąd"),
         ],
-        default="PENDING",
+        default=STATUS_PENDING,
     )
     error_message = models.TextField(null=True, blank=True)
 
+    # Pełna konfiguracja dopasowania (MatchingConfig.to_dict) - na jej podstawie
+    # zadanie uruchamiane jest w procesie roboczym
+    config = models.JSONField(default=dict)
+    report_path = models.CharField(max_length=255, null=True, blank=True)
+    # Kopia pliku WF z zapisanymi cenami (przesłany plik WF pozostaje bez zmian)
+    output_file_path = models.CharField(max_length=255, null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Ostatni sygnał życia wykonywanego zadania (odnawiany przy zdarzeniach
+    # postępu) - zadanie bez sygnału dłużej niż MATCHING_JOB_STALE_MINUTES
+    # uznawane jest za przerwane
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Udziały wierszy WF rozstrzygniętych bez porównania (zob. matching_rates):
+    # opis identyczny z opisem REF oraz wynik skopiowany z wcześniejszego,
+    # identycznego opisu WF - zapisywane po zakończeniu zadania
+    exact_match_rate = models.FloatField(null=True, blank=True)
+    dedup_ratio = models.FloatField(null=True, blank=True)
+
+    # Profilowanie zadania (na żądanie personelu) - plik .pstats zapisany w katalogu
+    # MATCHING_PROFILE_DIR, plik stosów .collapsed pod tą samą nazwą
+    profile_enabled = models.BooleanField(default=False)
+    profile_path = models.CharField(max_length=255, null=True, blank=True)
+
+    def __str__(self):
+        return f"Sesja {self.pk} ({self.status})"
+
 
 class MatchingResult(models.Model):
     """Model przechowujacy wyniki porownania"""
@@ -33,10 +66,13 @@ class MatchingResult(models.Model):
     source_info_cell = models.CharField(
         max_length=10
     )  # Komórka gdzie będzie info o źródle
+    # Arkusz WF ("" - aktywny arkusz), nazwa arkusza Excel ma najwyżej 31 znaków
+    wf_sheet = models.CharField(max_length=31, blank=True, default="")
 
     # Dane z pliku REF (Reference File)
     ref_description = models.TextField()
     ref_cell = models.CharField(max_length=10)
+    ref_sheet = models.CharField(max_length=31, blank=True, default="")
     ref_file_name = models.CharField(max_length=255)
 
     # Informacje o dopasowaniu
@@ -0,0 +1,80 @@
+import base64
+import binascii
+import json
+from typing import List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class MatchScoreKeysetPagination:
+    """
+    Stronicowanie wyników po kluczu (keyset / seek) w kolejności
+    match_score malejąco, id malejąco.
+
+    Kolejna strona zaczyna się za ostatnim wierszem poprzedniej
+    (match_score < s OR (match_score = s AND id < i)), więc zapytanie korzysta
+    z indeksu (session, match_score) i nie przegląda pominiętych wierszy jak OFFSET.
+    """
+
+    ordering = ("-match_score", "-id")
+    cursor_query_param = "cursor"
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.next_position: Optional[Tuple[float, int]] = None
+        self.request = None
+
+    @staticmethod
+    def encode_cursor(position: Tuple[float, int]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[float, int]:
+        try:
+            score, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return float(score), int(row_id)
+        except (binascii.Error, ValueError, TypeError):
+            raise ValidationError({"cursor": "Nieprawidłowy kursor"})
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request, cursor: Optional[str] = None
+    ) -> List:
+        """Zwraca wiersze strony (pobiera o jeden więcej, żeby wiedzieć, czy jest kolejna)"""
+        self.request = request
+        if cursor:
+            score, row_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(match_score__lt=score) | Q(match_score=score, id__lt=row_id)
+            )
+
+        rows = list(queryset.order_by(*self.ordering)[: self.limit + 1])
+        if len(rows) > self.limit:
+            rows = rows[: self.limit]
+            last = rows[-1]
+            self.next_position = (last.match_score, last.id)
+        return rows
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position),
+        )
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "next_cursor": (
+                    self.encode_cursor(self.next_position)
+                    if self.next_position is not None
+                    else None
+                ),
+                "results": data,
+            }
+        )
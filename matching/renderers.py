@@ -0,0 +1,53 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Odpowiedzi strumieniowe w formacie NDJSON (jeden obiekt JSON na linię).
+    Widoki zwracają StreamingHttpResponse - renderer obsługuje negocjację
+    formatu i odpowiedzi z błędami.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return (
+            json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+        ).encode(self.charset)
+
+
+class EventStreamRenderer(NDJSONRenderer):
+    """Server-sent events (text/event-stream)"""
+
+    media_type = "text/event-stream"
+    format = "sse"
+
+
+class CSVRenderer(NDJSONRenderer):
+    """
+    Eksport CSV - wiersze generuje widok (StreamingHttpResponse),
+    renderer zwraca tylko odpowiedzi z błędami (jako JSON).
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+
+
+class PrometheusTextRenderer(BaseRenderer):
+    """Metryki w formacie tekstowym Prometheus (widok przekazuje gotowy tekst)"""
+
+    media_type = "text/plain"
+    format = "prometheus"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
@@ -1,4 +1,6 @@
 import re
+from pathlib import Path
+from django.conf import settings
 from rest_framework import serializers
 
 from matching.models import MatchingSession, MatchingResult
@@ -51,12 +53,79 @@ class FileConfigSerializer(serializers.Serializer):
         return value
 
 
+class SheetConfigSerializer(serializers.Serializer):
+    """Serializer dla arkusza pliku Excel - pominięte kolumny i zakres przejmowane są
+    z konfiguracji pliku"""
+
+    name = serializers.CharField(max_length=31, help_text="Nazwa arkusza")
+    description_column = serializers.CharField(
+        max_length=1, required=False, help_text="Kolumna zawierająca opisy (np. 'A')"
+    )
+    description_range = CellRangeSerializer(
+        required=False, help_text="Zakres wierszy z opisami"
+    )
+
+    def validate_description_column(self, value):
+        # Walidacja, czy kolumna to pojedyncza litera A-Z
+        if not re.match(r"^[A-Z]$", value):
+            raise serializers.ValidationError(
+                "Kolumna musi być pojedynczą wielką literą (A-Z)"
+            )
+        return value
+
+
+class WorkingSheetConfigSerializer(SheetConfigSerializer):
+    """Serializer dla arkusza pliku WF"""
+
+    price_target_column = serializers.CharField(
+        max_length=1, required=False, help_text="Kolumna docelowa dla cen (np. 'F')"
+    )
+
+    def validate_price_target_column(self, value):
+        # Walidacja, czy kolumna to pojedyncza litera A-Z
+        if not re.match(r"^[A-Z]$", value):
+            raise serializers.ValidationError(
+                "Kolumna musi być pojedynczą wielką literą (A-Z)"
+            )
+        return value
+
+
+class ReferenceSheetConfigSerializer(SheetConfigSerializer):
+    """Serializer dla arkusza pliku REF"""
+
+    price_source_column = serializers.CharField(
+        max_length=1, required=False, help_text="Kolumna źródłowa z cenami (np. 'D')"
+    )
+
+    def validate_price_source_column(self, value):
+        # Walidacja, czy kolumna to pojedyncza litera A-Z
+        if not re.match(r"^[A-Z]$", value):
+            raise serializers.ValidationError(
+                "Kolumna musi być pojedynczą wielką literą (A-Z)"
+            )
+        return value
+
+
+def validate_sheet_names(sheets):
+    """Każdy arkusz może wystąpić w konfiguracji pliku tylko raz"""
+    names = [sheet["name"] for sheet in sheets]
+    if len(set(names)) != len(names):
+        raise serializers.ValidationError("Nazwy arkuszy nie mogą się powtarzać")
+    return sheets
+
+
 class WorkingFileConfigSerializer(FileConfigSerializer):
     """Serializer dla konfiguracji pliku WF"""
 
     price_target_column = serializers.CharField(
         max_length=1, help_text="Kolumna docelowa dla cen (np. 'F')"
     )
+    sheets = WorkingSheetConfigSerializer(
+        many=True,
+        required=False,
+        max_length=settings.EXCEL_MAX_SHEETS,
+        help_text="Arkusze do dopasowania (domyślnie aktywny arkusz)",
+    )
 
     def validate_price_target_column(self, value):
         # Walidacja, czy kolumna to pojedyncza litera A-Z
@@ -66,6 +135,9 @@ class WorkingFileConfigSerializer(FileConfigSerializer):
             )
         return value
 
+    def validate_sheets(self, value):
+        return validate_sheet_names(value)
+
 
 class ReferenceFileConfigSerializer(FileConfigSerializer):
     """Serializer dla konfiguracji pliku REF"""
@@ -73,6 +145,19 @@ class ReferenceFileConfigSerializer(FileConfigSerializer):
     price_source_column = serializers.CharField(
         max_length=1, help_text="Kolumna źródłowa z cenami (np. 'D')"
     )
+    sheets = ReferenceSheetConfigSerializer(
+        many=True,
+        required=False,
+        max_length=settings.EXCEL_MAX_SHEETS,
+        help_text="Arkusze katalogu (domyślnie aktywny arkusz)",
+    )
+    score_bias = serializers.FloatField(
+        min_value=-100,
+        max_value=100,
+        default=0,
+        help_text="Premia punktowa katalogu przy wyborze najlepszego dopasowania "
+        "(np. 5 dla własnego cennika)",
+    )
 
     def validate_price_source_column(self, value):
         # Walidacja, czy kolumna to pojedyncza litera A-Z
@@ -82,18 +167,38 @@ class ReferenceFileConfigSerializer(FileConfigSerializer):
             )
         return value
 
+    def validate_sheets(self, value):
+        return validate_sheet_names(value)
+
 
 class MatchingRequestSerializer(serializers.Serializer):
     """Główny serializer dla żądania porównania"""
 
     working_file = WorkingFileConfigSerializer()
     reference_file = ReferenceFileConfigSerializer()
+    additional_reference_files = ReferenceFileConfigSerializer(
+        many=True,
+        required=False,
+        max_length=settings.MATCHING_MAX_REFERENCE_CATALOGS - 1,
+        help_text="Kolejne katalogi REF przeszukiwane razem z reference_file "
+        "(przy równym wyniku wygrywa katalog podany wcześniej)",
+    )
     matching_threshold = serializers.IntegerField(
         min_value=1,
         max_value=100,
         default=80,
         help_text="Próg podobieństwa w procentach (domyślnie 80)",
     )
+    top_k = serializers.IntegerField(
+        min_value=1,
+        max_value=10,
+        default=1,
+        help_text="Liczba zwracanych kandydatów REF na opis WF (domyślnie 1)",
+    )
+    profile = serializers.BooleanField(
+        default=False,
+        help_text="Profilowanie zadania (pstats i stosy dla flamegraph) - tylko dla personelu",
+    )
 
     def validate(self, data):
         """Dodatkowa walidacja całości danych"""
@@ -111,11 +216,30 @@ class MatchingRequestSerializer(serializers.Serializer):
                 "Zakres REF: komórka początkowa musi być przed końcową"
             )
 
+        # Nazwa pliku katalogu oznacza w wynikach źródło ceny
+        catalog_names = [
+            Path(catalog["file_path"]).name
+            for catalog in [
+                data["reference_file"],
+                *data.get("additional_reference_files", []),
+            ]
+        ]
+        if len(set(catalog_names)) != len(catalog_names):
+            raise serializers.ValidationError(
+                "Katalogi REF muszą mieć różne nazwy plików"
+            )
+
         return data
 
 
 class MatchingSessionSerializers(serializers.ModelSerializer):
-    """Serializer dla modelu MatchingSession"""
+    """Serializer dla modelu MatchingSession
+
+    Ścieżka profilu (plik na serwerze) zwracana jest tylko personelowi -
+    wymaga przekazania żądania w kontekście serializera.
+    """
+
+    STAFF_ONLY_FIELDS = ("profile_path",)
 
     class Meta:
         model = MatchingSession
@@ -126,8 +250,23 @@ class MatchingSessionSerializers(serializers.ModelSerializer):
             "reference_file_path",
             "status",
             "error_message",
+            "report_path",
+            "output_file_path",
+            "started_at",
+            "finished_at",
+            "exact_match_rate",
+            "dedup_ratio",
+            "profile_path",
         ]
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        request = self.context.get("request")
+        if request is None or not request.user.is_staff:
+            for field in self.STAFF_ONLY_FIELDS:
+                data.pop(field, None)
+        return data
+
 
 class MatchingResultSerializer(serializers.ModelSerializer):
     """Serializer dla modelu MachingResult"""
@@ -138,9 +277,51 @@ class MatchingResultSerializer(serializers.ModelSerializer):
             "id",
             "session",
             "wf_description",
+            "wf_sheet",
             "wf_cell",
             "ref_description",
+            "ref_sheet",
             "ref_cell",
+            "ref_file_name",
+            "price_target_cell",
+            "source_info_cell",
             "match_score",
             "price",
         ]
+
+
+class ResultQuerySerializer(serializers.Serializer):
+    """Parametry odczytu wyników sesji (przedział podobieństwa i stronicowanie)"""
+
+    min_score = serializers.FloatField(
+        min_value=0,
+        max_value=100,
+        required=False,
+        help_text="Minimalne podobieństwo w procentach (włącznie)",
+    )
+    max_score = serializers.FloatField(
+        min_value=0,
+        max_value=100,
+        required=False,
+        help_text="Maksymalne podobieństwo w procentach (włącznie)",
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=1000,
+        default=100,
+        help_text="Liczba wyników na stronie (domyślnie 100)",
+    )
+    cursor = serializers.CharField(
+        required=False, help_text="Kursor kolejnej strony (next_cursor z odpowiedzi)"
+    )
+
+    def validate(self, data):
+        if (
+            "min_score" in data
+            and "max_score" in data
+            and data["min_score"] > data["max_score"]
+        ):
+            raise serializers.ValidationError(
+                "min_score nie może być większe niż max_score"
+            )
+        return data
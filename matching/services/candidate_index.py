@@ -0,0 +1,171 @@
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Kod znaku ograniczony do 20 bitów - trzy znaki mieszczą się w jednym int64
+_CODE_MASK = 0xFFFFF
+_CODE_BITS = 21
+
+
+def extract_ngrams(texts: List[str], ngram_size: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """Wyznacza unikalne n-gramy znakowe dla listy opisów (bez pętli po znakach)
+
+    Opisy są sprowadzane do małych liter i otaczane spacjami, więc krótkie słowa
+    także dają n-gramy. Każdy n-gram zakodowany jest jako liczba int64.
+
+    Args:
+        texts: lista opisów
+        ngram_size: długość n-gramu (2 lub 3)
+
+    Returns:
+        (numery opisów, klucze n-gramów) - pary unikalne, posortowane po kluczu i numerze
+    """
+    if not texts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # Każdy opis kończy się znakiem NUL, który oddziela go od następnego
+    padded = [f" {text.lower()} \0" for text in texts]
+    codes = (
+        np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(
+            np.int64
+        )
+        & _CODE_MASK
+    )
+    text_ids = np.repeat(
+        np.arange(len(texts), dtype=np.int64), [len(text) for text in padded]
+    )
+
+    window_count = len(codes) - ngram_size + 1
+    keys = np.zeros(window_count, dtype=np.int64)
+    valid = np.ones(window_count, dtype=bool)
+    for position in range(ngram_size):
+        window = codes[position : position + window_count]
+        keys = (keys << _CODE_BITS) | window
+        valid &= window != 0
+
+    text_ids = text_ids[:window_count][valid]
+    keys = keys[valid]
+
+    # Sortowanie po kluczu, a w obrębie klucza po numerze opisu + usunięcie duplikatów
+    order = np.lexsort((text_ids, keys))
+    text_ids, keys = text_ids[order], keys[order]
+    unique = np.ones(len(keys), dtype=bool)
+    unique[1:] = (keys[1:] != keys[:-1]) | (text_ids[1:] != text_ids[:-1])
+
+    return text_ids[unique], keys[unique]
+
+
+class NgramCandidateIndex:
+    """
+    Indeks odwrócony n-gramów znakowych opisów REF (n-gram -> wiersze REF).
+    Zwraca krótką listę kandydatów dla opisu WF - tylko ona trafia do scorera.
+    """
+
+    NGRAM_SIZE = 3
+
+    def __init__(
+        self,
+        gram_keys: np.ndarray,
+        indptr: np.ndarray,
+        row_ids: np.ndarray,
+        row_count: int,
+    ):
+        """
+        Args:
+            gram_keys: posortowane klucze n-gramów
+            indptr: granice list wierszy dla kolejnych n-gramów (jak w macierzy CSR)
+            row_ids: numery wierszy REF zawierających dany n-gram
+            row_count: liczba wierszy REF
+        """
+        self.gram_keys = gram_keys
+        self.indptr = indptr
+        self.row_ids = row_ids
+        self.row_count = row_count
+        self.document_frequency = np.diff(indptr)
+
+    @classmethod
+    def build(cls, texts: List[str]) -> "NgramCandidateIndex":
+        """Buduje indeks dla opisów REF"""
+        text_ids, keys = extract_ngrams(texts, cls.NGRAM_SIZE)
+        gram_keys, counts = np.unique(keys, return_counts=True)
+        indptr = np.zeros(len(gram_keys) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        return cls(gram_keys, indptr, text_ids.astype(np.int32), len(texts))
+
+    def to_features(self) -> Dict[str, np.ndarray]:
+        """Tablice indeksu do zapisania w ReferenceIndex.features"""
+        return {
+            "ngram_keys": self.gram_keys,
+            "ngram_indptr": self.indptr,
+            "ngram_rows": self.row_ids,
+        }
+
+    @classmethod
+    def from_features(
+        cls, features: Dict[str, np.ndarray], row_count: int
+    ) -> "NgramCandidateIndex":
+        return cls(
+            features["ngram_keys"],
+            features["ngram_indptr"],
+            features["ngram_rows"],
+            row_count,
+        )
+
+    def query_grams(self, texts: List[str]) -> List[np.ndarray]:
+        """Zwraca klucze n-gramów dla każdego z opisów WF (jedno przejście dla całej listy)"""
+        text_ids, keys = extract_ngrams(texts, self.NGRAM_SIZE)
+        order = np.argsort(text_ids, kind="stable")
+        bounds = np.searchsorted(text_ids[order], np.arange(len(texts) + 1))
+        keys = keys[order]
+        return [keys[bounds[i] : bounds[i + 1]] for i in range(len(texts))]
+
+    def candidates(
+        self,
+        query_keys: np.ndarray,
+        max_candidates: int,
+        min_overlap: float,
+        max_gram_frequency: float,
+    ) -> np.ndarray:
+        """Zwraca wiersze REF o największej liczbie wspólnych n-gramów z opisem WF
+
+        Args:
+            query_keys: klucze n-gramów opisu WF (z query_grams)
+            max_candidates: maksymalna liczba zwracanych wierszy
+            min_overlap: minimalny udział wspólnych n-gramów opisu WF (0-1)
+            max_gram_frequency: n-gramy obecne w większym udziale wierszy REF są
+                pomijane (np. "rur" w katalogu rur) - chyba że opis ma tylko takie
+
+        Returns:
+            Posortowane rosnąco numery wierszy REF
+        """
+        # Pozycje n-gramów opisu WF w indeksie (n-gramy nieobecne w REF są pomijane)
+        positions = np.searchsorted(self.gram_keys, query_keys)
+        found = positions < len(self.gram_keys)
+        found[found] = self.gram_keys[positions[found]] == query_keys[found]
+        positions = positions[found]
+
+        frequent = self.document_frequency[positions] > max_gram_frequency * self.row_count
+        if not frequent.all():
+            positions = positions[~frequent]
+        if len(positions) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # Konkatenacja list wierszy wszystkich n-gramów opisu bez pętli Pythona
+        starts = self.indptr[positions]
+        lengths = self.indptr[positions + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        postings = self.row_ids[offsets + np.arange(lengths.sum())]
+
+        # Liczba n-gramów wspólnych z opisem WF dla każdego wiersza REF
+        shared = np.bincount(postings, minlength=self.row_count)
+        min_shared = max(1, math.ceil(min_overlap * len(positions)))
+        rows = np.flatnonzero(shared >= min_shared)
+        shared = shared[rows]
+
+        if len(rows) > max_candidates:
+            best = np.argpartition(-shared, max_candidates - 1)[:max_candidates]
+            rows = np.sort(rows[best])
+
+        return rows
@@ -1,7 +1,9 @@
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 import openpyxl
+from django.conf import settings
 from matching.exceptions import ValidationError
+from matching.services.workbook_session import WorkbookSession
 
 
 class DataValidator:
@@ -9,34 +11,55 @@ class DataValidator:
     Klasa odpowiedzialna za walidację danych wejściowych
     """
 
-    MAX_FILE_SIZE_MB = 10
+    MAX_FILE_SIZE_MB = settings.EXCEL_MAX_FILE_SIZE_MB
     ALLOWED_EXTENSIONS = (".xlsx", ".xls")
     MIN_SHEETS = 1
-    MAX_SHEETS = 10
+    MAX_SHEETS = settings.EXCEL_MAX_SHEETS
     BYTES_IN_MB = 1024 * 1024
 
     def __init__(self):
         self.validation_errors: List[str] = []
 
     def validate_files(
-        self, working_file_path: Path, reference_file_path: Path
+        self,
+        working_file_path: Path,
+        reference_file_path: Path,
+        workbook_session: Optional[WorkbookSession] = None,
+        additional_reference_file_paths: Optional[List[Path]] = None,
     ) -> None:
         """Sprawdza poprawność plików wejściowych
 
         Args:
             working_file_path (Path): Ścieżka do pliku roboczego
             reference_file_path (Path): Ścieżka do pliku referencyjnego
+            workbook_session (WorkbookSession): Sesja skoroszytów zadania - plik WF
+                parsowany przy sprawdzaniu liczby arkuszy jest potem używany do
+                odczytu i zapisu. Plik REF nie jest tu parsowany (katalog może
+                być już zaindeksowany), jego arkusze sprawdza ExcelProcessor.
+            additional_reference_file_paths (List[Path]): Kolejne katalogi REF
+                (nazwy plików katalogów muszą się różnić - oznaczają źródło ceny)
 
         Raises:
             ValidationError: Gdy któryś z plików nie spełnia wymagań
 
         """
-        print("DEBUG: *** validate_files *** was called from the DataValidator")
+        additional_reference_file_paths = additional_reference_file_paths or []
         files_to_validate = [
             ("Working File", working_file_path),
             ("Reference File", reference_file_path),
+            *(
+                ("Reference File", file_path)
+                for file_path in additional_reference_file_paths
+            ),
         ]
 
+        catalog_names = [
+            file_path.name
+            for file_path in [reference_file_path, *additional_reference_file_paths]
+        ]
+        if len(set(catalog_names)) != len(catalog_names):
+            raise ValidationError("Katalogi REF muszą mieć różne nazwy plików")
+
         for file_name, file_path in files_to_validate:
             # Sprawdzenie czy plik istnieje
             if not file_path.exists():
@@ -57,17 +80,34 @@ class DataValidator:
                     f"Maksymalny rozmiar: {self.MAX_FILE_SIZE_MB}MB"
                 )
 
-    def validate_file_path(self, file_path: str) -> bool:
+        # Sprawdzenie liczby arkuszy pliku WF
+        if workbook_session is not None:
+            try:
+                sheet_count = len(workbook_session.get(working_file_path).sheetnames)
+            except Exception as e:
+                raise ValidationError(
+                    f"Nie można otworzyć pliku Working File: {str(e)}"
+                )
+            if not (self.MIN_SHEETS <= sheet_count <= self.MAX_SHEETS):
+                raise ValidationError(
+                    f"Nieprawidlowa liczba arkuszy w pliku {working_file_path}. "
+                    f"Wymagane: od {self.MIN_SHEETS} do {self.MAX_SHEETS}"
+                )
+
+    def validate_file_path(
+        self, file_path: str, workbook_session: Optional[WorkbookSession] = None
+    ) -> bool:
         """
         Sprawdza poprawność ścieżki do pliku Excel
 
         Args:
             file_path (str): Ścieżka do sprawdzenia
+            workbook_session (WorkbookSession): Sesja, w której plik zostaje otwarty
+                do dalszego użycia (bez sesji plik jest otwierany i zamykany)
 
         Returns:
             bool: True jeśli plik jest poprawny, False w przeciwnym razie
         """
-        print("DEBUG: *** wywołano metodę ===validate_file_path=== z DataValidator")
         try:
             path = Path(file_path)
 
@@ -94,9 +134,12 @@ class DataValidator:
                 return False
 
             # sprawdzenie liczby arkuszy
-            wb = openpyxl.load_workbook(file_path, read_only=True)
-            sheet_count = len(wb.sheetnames)
-            wb.close()
+            if workbook_session is not None:
+                sheet_count = len(workbook_session.get(path).sheetnames)
+            else:
+                wb = openpyxl.load_workbook(file_path, read_only=True)
+                sheet_count = len(wb.sheetnames)
+                wb.close()
 
             if not (self.MIN_SHEETS <= sheet_count <= self.MAX_SHEETS):
                 self.validation_errors.append(
@@ -121,8 +164,6 @@ class DataValidator:
         Returns:
             bool: True jesli zakres jest poporawny, False w przeciwnym razie
         """
-        print("DEBUG: *** validate_cell_range *** was called from the DataValidator")
-
         try:
             start = cell_range["start"]
             end = cell_range["end"]
@@ -162,8 +203,6 @@ class DataValidator:
         Returns:
             bool: True jeśli kolumna jest poprawna, False w przeciwnym razie
         """
-        print("DEBUG: *** validate_price_column *** was called from the DataValidator")
-
         try:
             # Sprawdzenie czy kolumna jest pojedynczą literą A-Z (TODO: Zamienić na regular expressions ponieważ kolumny mogą być AA+)
             if not (len(price_column) == 1 and price_column.isalpha()):
@@ -179,25 +218,24 @@ class DataValidator:
             self.validation_errors.append(f"Błąd walidacji kolumny z cenami: {str(e)}")
             return False
 
-    def validate_matching_request(self, request_data: Dict) -> None:
+    def validate_matching_request(
+        self, request_data: Dict, workbook_session: Optional[WorkbookSession] = None
+    ) -> None:
         """Główna metoda walidująca całe żądanie porównania
 
         Args:
             request_data (Dict): Dane żądania do zwalidowania
+            workbook_session (WorkbookSession): Sesja skoroszytów zadania (opcjonalna)
 
         Raises:
             validationError: Jeśli występują błędy walidacji
         """
-        print(
-            "DEBUG: *** validate_matching_request *** was called from the DataValidator"
-        )
-
         # Reset lsity błędów
         self.validation_errors = []
 
         # Walidacja plików WF
         wf_config = request_data["working_file"]
-        self.validate_file_path(wf_config["file_path"])
+        self.validate_file_path(wf_config["file_path"], workbook_session)
         self.validate_cell_range(
             wf_config["description_range"], wf_config["description_column"]
         )
@@ -206,7 +244,7 @@ class DataValidator:
         )
         # Walidacja plików REF
         ref_config = request_data["reference_file"]
-        self.validate_file_path(ref_config["file_path"])
+        self.validate_file_path(ref_config["file_path"], workbook_session)
         self.validate_cell_range(
             ref_config["description_range"], ref_config["description_column"]
         )
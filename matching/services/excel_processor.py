@@ -1,9 +1,12 @@
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
-from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Optional
+from decimal import Decimal, InvalidOperation
 import openpyxl
+from django.conf import settings
 from openpyxl.utils import get_column_letter, column_index_from_string
+from openpyxl.worksheet.formula import ArrayFormula
 from matching.exceptions import ExcelProcessingError
+from matching.services.workbook_session import WorkbookSession
 
 
 class ExcelProcessor:
@@ -12,59 +15,198 @@ class ExcelProcessor:
     Implementuje wzorzec Singleton, aby zapewnić jeden punkt dostępu do otwartych plików.
     """
 
-    def __init__(self):
-        # Słownik przechowujący otwarte skoroszyty {ścieżka: workbook}
-        self.workbooks: Dict[str, openpyxl.Workbook] = {}
+    def __init__(self, read_only: bool = True):
+        """
+        Args:
+            read_only: Tryb strumieniowy - arkusze czytane są jednym przejściem
+                w trybie tylko do odczytu, bez budowy pełnego modelu komórek.
+                Pamięć nie rośnie wtedy razem z rozmiarem skoroszytu.
+        """
+        self.read_only = read_only
+        # Sesja skoroszytów bieżącego zadania (każdy plik parsowany raz)
+        self.session = WorkbookSession(read_only=read_only)
 
         # Maksymalne limity dla bezpieczeństwa
-        self.MAX_FILE_SIZE_MB = 10
-        self.MAX_SHEETS = 10
+        self.MAX_FILE_SIZE_MB = settings.EXCEL_MAX_FILE_SIZE_MB
+        self.MAX_SHEETS = settings.EXCEL_MAX_SHEETS
 
-    def load_files(self, working_file: Path, reference_file: Path) -> None:
+    @property
+    def workbooks(self) -> Dict[str, openpyxl.Workbook]:
+        """Otwarte skoroszyty bieżącej sesji {ścieżka: workbook}"""
+        return self.session.workbooks
+
+    def begin_session(self, writable_files: Iterable[Path] = ()) -> WorkbookSession:
+        """
+        Zamyka pliki poprzedniego zadania i rozpoczyna nową sesję skoroszytów.
+
+        Args:
+            writable_files: Pliki, do których zadanie będzie zapisywać (np. WF) -
+                wczytywane od razu w pełnym trybie, żeby nie parsować ich dwa razy
+
+        Returns:
+            WorkbookSession: Sesja współdzielona z walidacją i zapisem wyników
+        """
+        self.close_all_workbooks()
+        self.session = WorkbookSession(
+            read_only=self.read_only, writable_files=writable_files
+        )
+        return self.session
+
+    def load_files(
+        self, working_file: Path, reference_file: Optional[Path] = None
+    ) -> None:
         """
         Wczytuje pliki Excel do pamięci.
 
         Args:
             working_file: Ścieżka do pliku roboczego (WF)
-            reference_file: Ścieżka do pliku referencyjnego (REF)
+            reference_file: Ścieżka do pliku referencyjnego (REF), pomijany gdy
+                katalog jest już zaindeksowany
 
         Raises:
             ExcelProcessingError: Gdy wystąpi problem z wczytaniem plików
         """
-        print("DEBUG: *** load_files *** was called from the ExcelProcessor")
+        # Wczytaj pliki (otwarte już w bieżącej sesji nie są parsowane ponownie)
+        for file_path in [working_file, reference_file]:
+            if file_path is not None:
+                self.load_file(file_path)
 
+    def load_file(self, file_path: Path) -> None:
+        """
+        Wczytuje pojedynczy plik Excel do sesji, nie zamykając pozostałych.
+
+        Args:
+            file_path: Ścieżka do pliku Excel
+
+        Raises:
+            ExcelProcessingError: Gdy wystąpi problem z wczytaniem pliku
+        """
         try:
-            # Zamknij poprzednio otwarte pliki
-            self.close_all_workbooks()
-
-            # Wczytaj nowe pliki
-            for file_path in [working_file, reference_file]:
-                if not file_path.exists():
-                    raise ExcelProcessingError(f"Plik nie istnieje: {file_path}")
-
-                # Sprawdź rozmiar pliku
-                file_size_mb = file_path.stat().st_size / (1024 * 1024)
-                if file_size_mb > self.MAX_FILE_SIZE_MB:
-                    raise ExcelProcessingError(
-                        f"Plik {file_path} przekracza maksymalny rozmiar {self.MAX_FILE_SIZE_MB}MB"
-                    )
+            if not file_path.exists():
+                raise ExcelProcessingError(f"Plik nie istnieje: {file_path}")
 
-                # Wczytaj plik
-                workbook = openpyxl.load_workbook(file_path, data_only=True)
+            # Sprawdź rozmiar pliku
+            file_size_mb = file_path.stat().st_size / (1024 * 1024)
+            if file_size_mb > self.MAX_FILE_SIZE_MB:
+                raise ExcelProcessingError(
+                    f"Plik {file_path} przekracza maksymalny rozmiar {self.MAX_FILE_SIZE_MB}MB"
+                )
 
-                # Sprawdź liczbę arkuszy
-                if len(workbook.sheetnames) > self.MAX_SHEETS:
-                    raise ExcelProcessingError(
-                        f"Plik {file_path} ma zbyt wiele arkuszy (max: {self.MAX_SHEETS})"
-                    )
+            # Wczytaj plik (lub weź skoroszyt sparsowany już w sesji)
+            workbook = self.session.get(file_path)
 
-                self.workbooks[str(file_path)] = workbook
+            # Sprawdź liczbę arkuszy
+            if len(workbook.sheetnames) > self.MAX_SHEETS:
+                raise ExcelProcessingError(
+                    f"Plik {file_path} ma zbyt wiele arkuszy (max: {self.MAX_SHEETS})"
+                )
 
         except Exception as e:
             raise ExcelProcessingError(f"Błąd podczas wczytywania plików: {str(e)}")
 
+    @staticmethod
+    def _row_bounds(sheet, row_range: Dict[str, str]) -> Tuple[int, int]:
+        """
+        Zwraca zakres wierszy ograniczony do rzeczywistych wymiarów arkusza.
+
+        W trybie tylko do odczytu wymiary zapisane w pliku bywają niepoprawne,
+        ale iteracja i tak kończy się na ostatnim zapisanym wierszu arkusza.
+        """
+        start_row = int(row_range["start"])
+        end_row = int(row_range["end"])
+
+        if not getattr(sheet.parent, "read_only", False) and sheet.max_row:
+            end_row = min(end_row, sheet.max_row)
+
+        return start_row, end_row
+
+    @staticmethod
+    def get_sheet(workbook: openpyxl.Workbook, sheet: Optional[str] = None):
+        """Zwraca arkusz o podanej nazwie (None - aktywny arkusz)"""
+        if sheet is None:
+            return workbook.active
+        if sheet not in workbook.sheetnames:
+            raise ExcelProcessingError(f"Arkusz {sheet} nie istnieje w pliku")
+        return workbook[sheet]
+
+    def iter_column_values(
+        self,
+        file_path: Path,
+        columns: List[str],
+        row_range: Dict[str, str],
+        sheet: Optional[str] = None,
+    ) -> Iterator[Tuple[int, List[Any]]]:
+        """
+        Czyta wartości wskazanych kolumn jednym przejściem po wierszach zakresu.
+
+        Args:
+            file_path: Ścieżka do pliku Excel
+            columns: Litery kolumn (np. ['C', 'E'])
+            row_range: Słownik z kluczami 'start' i 'end' określającymi zakres
+            sheet: Nazwa arkusza (None - aktywny arkusz)
+
+        Yields:
+            (numer_wiersza, [wartości kolumn w kolejności columns])
+        """
+        if file_path not in self.session:
+            raise ExcelProcessingError(f"Plik nie został wczytany: {file_path}")
+
+        column_indexes = [column_index_from_string(column) for column in columns]
+        min_col, max_col = min(column_indexes), max(column_indexes)
+        offsets = [index - min_col for index in column_indexes]
+
+        start_row, rows = self._sheet_rows(
+            self.session.get(file_path), sheet, row_range, min_col, max_col
+        )
+        if self.session.is_writable(file_path):
+            # Skoroszyt do zapisu przechowuje formuły zamiast obliczonych wartości -
+            # tylko wtedy zakres czytany jest ponownie z wartościami
+            rows = list(rows)
+            if any(self._is_formula(value) for values in rows for value in values):
+                start_row, rows = self._sheet_rows(
+                    self.session.get_values(file_path),
+                    sheet,
+                    row_range,
+                    min_col,
+                    max_col,
+                )
+
+        for row_number, values in enumerate(rows, start=start_row):
+            yield row_number, [
+                values[offset] if offset < len(values) else None for offset in offsets
+            ]
+
+    def _sheet_rows(
+        self,
+        workbook: openpyxl.Workbook,
+        sheet_name: Optional[str],
+        row_range: Dict[str, str],
+        min_col: int,
+        max_col: int,
+    ) -> Tuple[int, Iterator[Tuple[Any, ...]]]:
+        """Zwraca (pierwszy wiersz, iterator wartości wierszy) arkusza"""
+        sheet = self.get_sheet(workbook, sheet_name)
+        start_row, end_row = self._row_bounds(sheet, row_range)
+        return start_row, sheet.iter_rows(
+            min_row=start_row,
+            max_row=end_row,
+            min_col=min_col,
+            max_col=max_col,
+            values_only=True,
+        )
+
+    @staticmethod
+    def _is_formula(value: Any) -> bool:
+        return isinstance(value, ArrayFormula) or (
+            isinstance(value, str) and value.startswith("=")
+        )
+
     def read_descriptions(
-        self, file_path: Path, column: str, cell_range: Dict[str, str]
+        self,
+        file_path: Path,
+        column: str,
+        cell_range: Dict[str, str],
+        sheet: Optional[str] = None,
     ) -> List[Tuple[str, str]]:
         """
         Czyta opisy z określonej kolumny i zakresu.
@@ -73,6 +215,7 @@ class ExcelProcessor:
             file_path: Ścieżka do pliku Excel
             column: Litera kolumny (np. 'A', 'B')
             cell_range: Słownik z kluczami 'start' i 'end' określającymi zakres
+            sheet: Nazwa arkusza (None - aktywny arkusz)
 
         Returns:
             Lista krotek (opis, adres_komórki)
@@ -80,24 +223,14 @@ class ExcelProcessor:
         Raises:
             ExcelProcessingError: Gdy wystąpi problem z odczytem danych
         """
-        print("DEBUG: *** read_descriptions *** was called from the ExcelProcessor")
-
         try:
-            workbook = self.workbooks[str(file_path)]
-            sheet = workbook.active
-
-            # Pobierz numery wierszy z zakresu
-            start_row = int(cell_range["start"])
-            end_row = int(cell_range["end"])
-
             descriptions = []
-            for row in range(start_row, end_row + 1):
-                cell_address = f"{column}{row}"
-                cell_value = sheet[cell_address].value
-
+            for row, (cell_value,) in self.iter_column_values(
+                file_path, [column], cell_range, sheet
+            ):
                 # Pomiń puste komórki
                 if cell_value is not None:
-                    descriptions.append((str(cell_value).strip(), cell_address))
+                    descriptions.append((str(cell_value).strip(), f"{column}{row}"))
 
             return descriptions
 
@@ -105,7 +238,11 @@ class ExcelProcessor:
             raise ExcelProcessingError(f"Błąd podczas odczytu opisów: {str(e)}")
 
     def read_prices(
-        self, file_path: Path, price_column: str, row_range: Dict[str, str]
+        self,
+        file_path: Path,
+        price_column: str,
+        row_range: Dict[str, str],
+        sheet: Optional[str] = None,
     ) -> Dict[str, Decimal]:
         """
         Czyta ceny z określonej kolumny i zakresu.
@@ -114,6 +251,7 @@ class ExcelProcessor:
             file_path: Ścieżka do pliku Excel
             price_column: Litera kolumny z cenami
             row_range: Słownik z kluczami 'start' i 'end' określającymi zakres
+            sheet: Nazwa arkusza (None - aktywny arkusz)
 
         Returns:
             Słownik {adres_komórki: cena}
@@ -121,38 +259,95 @@ class ExcelProcessor:
         Raises:
             ExcelProcessingError: Gdy wystąpi problem z odczytem lub konwersją cen
         """
-        print("DEBUG: *** read_prices *** was called from the ExcelProcessor")
-
         try:
-            workbook = self.workbooks[str(file_path)]
-            sheet = workbook.active
-
-            # Pobierz numery wierszy z zakresu
-            start_row = int(row_range["start"])
-            end_row = int(row_range["end"])
-
             prices = {}
-            for row in range(start_row, end_row + 1):
-                cell_address = f"{price_column}{row}"
-                cell_value = sheet[cell_address].value
-
+            for row, (cell_value,) in self.iter_column_values(
+                file_path, [price_column], row_range, sheet
+            ):
                 # Pomiń puste komórki
                 if cell_value is not None:
-                    try:
-                        # Konwersja na Decimal dla precyzji finansowej
-                        price = Decimal(str(cell_value))
-                        prices[cell_address] = price
-                    except (ValueError, TypeError, Decimal.InvalidOperation):
-                        raise ExcelProcessingError(
-                            f"Nieprawidłowa wartość ceny w komórce {cell_address}"
-                        )
+                    cell_address = f"{price_column}{row}"
+                    prices[cell_address] = self._parse_price(cell_value, cell_address)
 
             return prices
 
         except Exception as e:
             raise ExcelProcessingError(f"Błąd podczas odczytu cen: {str(e)}")
 
-    def write_price(self, file_path: str, cell_address: str, price: Decimal) -> None:
+    def read_descriptions_and_prices(
+        self,
+        file_path: Path,
+        description_column: str,
+        price_column: str,
+        row_range: Dict[str, str],
+        sheet: Optional[str] = None,
+    ) -> Tuple[List[Tuple[str, str]], Dict[str, Decimal]]:
+        """
+        Czyta opisy i ceny z pliku REF jednym przejściem po wierszach.
+
+        Args:
+            file_path: Ścieżka do pliku Excel
+            description_column: Litera kolumny z opisami
+            price_column: Litera kolumny z cenami
+            row_range: Słownik z kluczami 'start' i 'end' określającymi zakres
+            sheet: Nazwa arkusza (None - aktywny arkusz)
+
+        Returns:
+            (lista (opis, adres_komórki), słownik {adres_komórki: cena})
+
+        Raises:
+            ExcelProcessingError: Gdy wystąpi problem z odczytem danych
+        """
+        try:
+            descriptions = []
+            prices = {}
+            for row, (description, price) in self.iter_column_values(
+                file_path, [description_column, price_column], row_range, sheet
+            ):
+                # Pomiń puste komórki
+                if description is not None:
+                    descriptions.append(
+                        (str(description).strip(), f"{description_column}{row}")
+                    )
+                if price is not None:
+                    cell_address = f"{price_column}{row}"
+                    prices[cell_address] = self._parse_price(price, cell_address)
+
+            return descriptions, prices
+
+        except Exception as e:
+            raise ExcelProcessingError(f"Błąd podczas odczytu danych REF: {str(e)}")
+
+    @staticmethod
+    def _parse_price(cell_value, cell_address: str) -> Decimal:
+        """Konwersja wartości komórki na Decimal dla precyzji finansowej"""
+        try:
+            return Decimal(str(cell_value))
+        except (ValueError, TypeError, InvalidOperation):
+            raise ExcelProcessingError(
+                f"Nieprawidłowa wartość ceny w komórce {cell_address}"
+            )
+
+    def get_writable_workbook(self, file_path: str) -> openpyxl.Workbook:
+        """
+        Zwraca skoroszyt do zapisu - z formułami, które zostaną zachowane przy zapisie.
+        Plik zgłoszony w begin_session jako zapisywany nie jest parsowany ponownie.
+
+        Args:
+            file_path: Ścieżka do pliku Excel
+
+        Returns:
+            openpyxl.Workbook: Skoroszyt, który można modyfikować i zapisać
+        """
+        return self.session.get_writable(file_path)
+
+    def write_price(
+        self,
+        file_path: str,
+        cell_address: str,
+        price: Decimal,
+        sheet: Optional[str] = None,
+    ) -> None:
         """
         Zapisuje cenę do określonej komórki.
 
@@ -160,16 +355,15 @@ class ExcelProcessor:
             file_path: Ścieżka do pliku Excel
             cell_address: Adres komórki (np. 'F5')
             price: Cena do zapisania
+            sheet: Nazwa arkusza (None - aktywny arkusz)
 
         Raises:
             ExcelProcessingError: Gdy wystąpi problem z zapisem
         """
-        print("DEBUG: *** write_price *** was called from the ExcelProcessor")
-
         try:
-            workbook = self.workbooks[file_path]
-            sheet = workbook.active
-            sheet[cell_address] = float(price)  # Konwersja na float dla Excel
+            workbook = self.get_writable_workbook(file_path)
+            worksheet = self.get_sheet(workbook, sheet)
+            worksheet[cell_address] = float(price)  # Konwersja na float dla Excel
 
         except Exception as e:
             raise ExcelProcessingError(f"Błąd podczas zapisu ceny: {str(e)}")
@@ -178,11 +372,7 @@ class ExcelProcessor:
         """
         Zamyka wszystkie otwarte pliki Excel.
         """
-        print("*** close_all_workbooks *** was called from the ExcelProcessor")
-
-        for workbook in self.workbooks.values():
-            workbook.close()
-        self.workbooks.clear()
+        self.session.close()
 
     def __del__(self):
         """
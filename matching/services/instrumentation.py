@@ -0,0 +1,138 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger("matching.trace")
+
+# Ślad bieżącego zadania - serwisy zliczają zdarzenia bez przekazywania go w argumentach
+_current_trace: ContextVar[Optional["JobTrace"]] = ContextVar(
+    "matching_job_trace", default=None
+)
+
+
+class JobTrace:
+    """
+    Pomiary jednego zadania dopasowania: identyfikator śladu (trace id),
+    czasy etapów (validate, load, extract, index, match, write, persist) i liczniki.
+
+    Liczniki i czasy zbierane są zawsze (kilka operacji na etap lub blok wierszy),
+    a logi zapisywane tylko wtedy, gdy dany poziom logowania jest włączony.
+    """
+
+    def __init__(self, trace_id: Optional[str] = None, **fields: Any):
+        """
+        Args:
+            trace_id: Identyfikator śladu (domyślnie losowy)
+            fields: Pola dołączane do każdego logu (np. session_id)
+        """
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.fields = fields
+        self.spans: Dict[str, float] = defaultdict(float)
+        self.counters: Dict[str, int] = defaultdict(int)
+        # Arkusze WF dopasowywane są w osobnych wątkach tego samego zadania
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self) -> Iterator["JobTrace"]:
+        """Ustawia ślad jako bieżący (current_trace) na czas bloku"""
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **fields: Any) -> Iterator[None]:
+        """Mierzy czas etapu; czas kolejnych wywołań etapu o tej nazwie jest sumowany"""
+        self.log(logging.DEBUG, "span.start", span=name, **fields)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.spans[name] += elapsed
+            self.log(
+                logging.INFO,
+                "span.end",
+                span=name,
+                duration_ms=round(elapsed * 1000, 3),
+                **fields,
+            )
+
+    def incr(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def log(self, level: int, event: str, **fields: Any) -> None:
+        """Log strukturalny (pola w rekordzie jako "fields"), pomijany przy wyłączonym poziomie"""
+        if not logger.isEnabledFor(level):
+            return
+        logger.log(
+            level,
+            event,
+            extra={
+                "trace_id": self.trace_id,
+                "fields": {**self.fields, **fields},
+            },
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        """Czasy etapów (w sekundach) i liczniki zadania"""
+        with self._lock:
+            return {
+                "trace_id": self.trace_id,
+                "spans": {
+                    name: round(seconds, 6) for name, seconds in self.spans.items()
+                },
+                "counters": dict(self.counters),
+            }
+
+
+def current_trace() -> Optional[JobTrace]:
+    return _current_trace.get()
+
+
+def incr(name: str, value: int = 1) -> None:
+    """Zwiększa licznik bieżącego zadania (poza zadaniem nic nie robi)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.incr(name, value)
+
+
+@contextmanager
+def span(name: str, **fields: Any) -> Iterator[None]:
+    """Mierzy etap w bieżącym zadaniu (poza zadaniem nic nie robi)"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name, **fields):
+        yield
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formatuje rekordy logów jako jedną linię JSON (wraz z trace_id i polami śladu)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id is None and current_trace() is not None:
+            trace_id = current_trace().trace_id
+        if trace_id is not None:
+            entry["trace_id"] = trace_id
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
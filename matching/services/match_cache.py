@@ -0,0 +1,180 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from matching.exceptions import MatchingError
+
+# Dopasowania opisu WF: (wiersz REF, wynik) od najlepszego; pusta lista - brak dopasowania
+RowMatches = List[Tuple[int, float]]
+# Zakres ważności wpisów: (klucz katalogu REF, sygnatura scorera, próg, top_k)
+CacheScope = Tuple[str, str, float, int]
+
+
+class MatchCache:
+    """
+    Pamięć podręczna wyników dopasowania opisów WF współdzielona między zadaniami.
+
+    Klucz wpisu to (znormalizowany opis WF, klucz katalogu REF, sygnatura scorera,
+    próg, top_k). Klucz katalogu zawiera hash zawartości pliku REF, więc zmiana
+    katalogu unieważnia jego wpisy - nie są już odczytywane i z czasem są usuwane.
+
+    Wpisy trzymane są w pamięci procesu (LRU) i opcjonalnie w lokalnej bazie SQLite
+    współdzielonej przez procesy robocze.
+    """
+
+    SQLITE_BATCH_SIZE = 500
+
+    # LRU współdzielone w obrębie procesu {klucz: dopasowania}
+    _memory: "OrderedDict[str, RowMatches]" = OrderedDict()
+    _memory_lock = threading.Lock()
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        sqlite_path: Optional[str] = None,
+        sqlite_max_entries: Optional[int] = None,
+    ):
+        """
+        Args:
+            max_entries: Limit wpisów w pamięci (domyślnie settings.MATCH_CACHE_MAX_ENTRIES)
+            sqlite_path: Plik bazy SQLite (domyślnie settings.MATCH_CACHE_SQLITE_PATH,
+                None - tylko pamięć)
+            sqlite_max_entries: Limit wpisów w bazie - najdawniej używane są usuwane
+        """
+        self.max_entries = max_entries or settings.MATCH_CACHE_MAX_ENTRIES
+        self.sqlite_path = (
+            sqlite_path if sqlite_path is not None else settings.MATCH_CACHE_SQLITE_PATH
+        )
+        self.sqlite_max_entries = (
+            sqlite_max_entries or settings.MATCH_CACHE_SQLITE_MAX_ENTRIES
+        )
+        if self.sqlite_path:
+            self._create_table()
+
+    @staticmethod
+    def entry_key(scope: CacheScope, text: str) -> str:
+        return hashlib.sha256(
+            json.dumps([*scope, text], ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+    def get_many(self, scope: CacheScope, texts: Iterable[str]) -> Dict[str, RowMatches]:
+        """Zwraca zapamiętane dopasowania dla opisów (pomija nieznane)"""
+        keys = {self.entry_key(scope, text): text for text in set(texts)}
+        found: Dict[str, RowMatches] = {}
+
+        with self._memory_lock:
+            for key, text in keys.items():
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[text] = self._memory[key]
+
+        missing = [key for key, text in keys.items() if text not in found]
+        if self.sqlite_path and missing:
+            stored = self._sqlite_get(missing)
+            self._remember(stored)
+            for key, matches in stored.items():
+                found[keys[key]] = matches
+        return found
+
+    def set_many(self, scope: CacheScope, matches: Dict[str, RowMatches]) -> None:
+        entries = {
+            self.entry_key(scope, text): row_matches
+            for text, row_matches in matches.items()
+        }
+        self._remember(entries)
+        if self.sqlite_path and entries:
+            self._sqlite_set(entries)
+
+    def _remember(self, entries: Dict[str, RowMatches]) -> None:
+        with self._memory_lock:
+            for key, row_matches in entries.items():
+                self._memory[key] = row_matches
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    @classmethod
+    def clear_memory(cls) -> None:
+        with cls._memory_lock:
+            cls._memory.clear()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Baza współdzielona przez procesy robocze - zapisy czekają na zwolnienie blokady
+        return sqlite3.connect(self.sqlite_path, timeout=30)
+
+    def _create_table(self) -> None:
+        try:
+            Path(self.sqlite_path).parent.mkdir(parents=True, exist_ok=True)
+            with self._connect() as connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS match_cache ("
+                    "key TEXT PRIMARY KEY, matches TEXT NOT NULL, used_at REAL NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS match_cache_used_at "
+                    "ON match_cache (used_at)"
+                )
+        except (OSError, sqlite3.Error) as e:
+            raise MatchingError(f"Błąd bazy pamięci dopasowań: {str(e)}")
+
+    def _sqlite_get(self, keys: List[str]) -> Dict[str, RowMatches]:
+        found = {}
+        try:
+            with self._connect() as connection:
+                for start in range(0, len(keys), self.SQLITE_BATCH_SIZE):
+                    batch = keys[start : start + self.SQLITE_BATCH_SIZE]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = connection.execute(
+                        "SELECT key, matches FROM match_cache "
+                        f"WHERE key IN ({placeholders})",
+                        batch,
+                    ).fetchall()
+                    for key, matches in rows:
+                        found[key] = [tuple(match) for match in json.loads(matches)]
+                    if rows:
+                        connection.execute(
+                            f"UPDATE match_cache SET used_at = ? "
+                            f"WHERE key IN ({','.join('?' * len(rows))})",
+                            [time.time(), *(key for key, _ in rows)],
+                        )
+        except sqlite3.Error as e:
+            raise MatchingError(f"Błąd odczytu pamięci dopasowań: {str(e)}")
+        return found
+
+    def _sqlite_set(self, entries: Dict[str, RowMatches]) -> None:
+        now = time.time()
+        try:
+            with self._connect() as connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO match_cache (key, matches, used_at) "
+                    "VALUES (?, ?, ?)",
+                    [
+                        (key, json.dumps(row_matches), now)
+                        for key, row_matches in entries.items()
+                    ],
+                )
+        except sqlite3.Error as e:
+            raise MatchingError(f"Błąd zapisu pamięci dopasowań: {str(e)}")
+
+    def prune(self) -> None:
+        """Usuwa z bazy najdawniej używane wpisy ponad limit (wywoływane raz na zadanie)"""
+        if not self.sqlite_path:
+            return
+        try:
+            with self._connect() as connection:
+                connection.execute(
+                    "DELETE FROM match_cache WHERE used_at <= ("
+                    "SELECT used_at FROM match_cache ORDER BY used_at DESC "
+                    "LIMIT 1 OFFSET ?)",
+                    [self.sqlite_max_entries],
+                )
+        except sqlite3.Error as e:
+            raise MatchingError(f"Błąd zapisu pamięci dopasowań: {str(e)}")
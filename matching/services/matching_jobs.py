@@ -0,0 +1,323 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from matching.exceptions import MatchingError
+from matching.models import MatchingSession
+from matching.services import metrics
+from matching.services.data_validator import DataValidator
+from matching.services.excel_processor import ExcelProcessor
+from matching.services.instrumentation import JobTrace
+from matching.services.match_cache import MatchCache
+from matching.services.matching_orchestrator import MatchingConfig, MatchingOrchestrator
+from matching.services.matching_service import MatchingService, matching_rates
+from matching.services.matching_worker import init_worker, run_in_worker
+from matching.services.profiling import JobProfiler
+from matching.services.progress_events import ProgressEventLog
+from matching.services.reference_index import ReferenceIndexStore
+from matching.services.result_writer import ResultWriter
+from matching.services.tfidf_matching_service import TfidfMatchingService
+
+logger = logging.getLogger(__name__)
+
+
+def create_matching_orchestrator(
+    reference_index_store: Optional[ReferenceIndexStore] = None,
+    match_cache: Optional[MatchCache] = None,
+) -> MatchingOrchestrator:
+    """Buduje orchestrator z kompletem serwisów (jeden ExcelProcessor dla odczytu i zapisu)"""
+    excel_processor = ExcelProcessor()
+    match_cache = match_cache or MatchCache()
+
+    return MatchingOrchestrator(
+        excel_processor=excel_processor,
+        data_validator=DataValidator(),
+        matching_service=MatchingService(match_cache=match_cache),
+        result_writer=ResultWriter(excel_processor=excel_processor),
+        reference_index_store=reference_index_store,
+        matching_engines={
+            TfidfMatchingService.ENGINE_NAME: TfidfMatchingService(match_cache=match_cache),
+        },
+    )
+
+
+class SessionHeartbeatLog(ProgressEventLog):
+    """
+    Zdarzenia postępu zadania, które odnawiają też sygnał życia sesji (heartbeat_at).
+    Zapis w bazie najwyżej raz na MATCHING_JOB_HEARTBEAT_SECONDS.
+    """
+
+    def __init__(self, session_id: int, events_dir: Optional[Path] = None):
+        super().__init__(session_id, events_dir)
+        self.session_id = session_id
+        self._last_beat = time.monotonic()
+
+    def emit(self, event_type: str, **data: Any) -> None:
+        super().emit(event_type, **data)
+        now = time.monotonic()
+        if now - self._last_beat >= settings.MATCHING_JOB_HEARTBEAT_SECONDS:
+            self._last_beat = now
+            MatchingSession.objects.filter(
+                pk=self.session_id, status=MatchingSession.STATUS_RUNNING
+            ).update(heartbeat_at=timezone.now())
+
+
+def stale_jobs_filter() -> Q:
+    """
+    Zadania osierocone: RUNNING bez sygnału życia dłużej niż MATCHING_JOB_STALE_MINUTES
+    oraz PENDING czekające dłużej niż MATCHING_JOB_PENDING_TIMEOUT_MINUTES.
+    """
+    now = timezone.now()
+    return Q(
+        status=MatchingSession.STATUS_RUNNING,
+        last_alive__lt=now - timedelta(minutes=settings.MATCHING_JOB_STALE_MINUTES),
+    ) | Q(
+        status=MatchingSession.STATUS_PENDING,
+        created_at__lt=now
+        - timedelta(minutes=settings.MATCHING_JOB_PENDING_TIMEOUT_MINUTES),
+    )
+
+
+def recover_stale_jobs() -> int:
+    """
+    Oznacza zadania osierocone (np. po restarcie lub awarii procesu serwera, który je
+    zlecił) jako błędne - klient dostaje status końcowy, a zadania zwalniają miejsce
+    w kolejce (MATCHING_JOB_MAX_QUEUED).
+
+    Returns:
+        int: Liczba oznaczonych sesji
+    """
+    stale_ids = list(
+        MatchingSession.objects.annotate(
+            last_alive=Coalesce("heartbeat_at", "started_at", "created_at")
+        )
+        .filter(stale_jobs_filter())
+        .values_list("pk", flat=True)
+    )
+    if not stale_ids:
+        return 0
+
+    recovered = MatchingSession.objects.filter(
+        pk__in=stale_ids,
+        status__in=[MatchingSession.STATUS_PENDING, MatchingSession.STATUS_RUNNING],
+    ).update(
+        status=MatchingSession.STATUS_ERROR,
+        error_message="Zadanie przerwane - proces wykonujący zadanie nie odpowiada",
+        finished_at=timezone.now(),
+    )
+    logger.warning("Oznaczono %s osieroconych zadań dopasowania jako błędne", recovered)
+    return recovered
+
+
+def run_matching_job(session_id: int) -> str:
+    """
+    Wykonuje zadanie dopasowania zapisane w MatchingSession.
+
+    Zadanie przejmowane jest atomowo (PENDING -> RUNNING), więc nie zostanie
+    wykonane dwa razy. Wynik lub błąd zapisywany jest w sesji, a postęp
+    publikowany jako zdarzenia NDJSON (ProgressEventLog). Zdarzenie końcowe
+    zawiera pomiary zadania (trace id, czasy etapów, liczniki) oraz udziały wierszy
+    WF dopasowanych bez porównania (rates), zapisywane też w sesji. Sesja z włączonym
+    profilowaniem wykonywana jest pod profilerem, a ścieżka profilu zapisywana w sesji.
+
+    Args:
+        session_id: Identyfikator MatchingSession
+
+    Returns:
+        str: Końcowy status sesji
+    """
+    claimed = MatchingSession.objects.filter(
+        pk=session_id, status=MatchingSession.STATUS_PENDING
+    ).update(
+        status=MatchingSession.STATUS_RUNNING,
+        started_at=timezone.now(),
+        heartbeat_at=timezone.now(),
+    )
+    if not claimed:
+        return MatchingSession.objects.get(pk=session_id).status
+
+    session = MatchingSession.objects.get(pk=session_id)
+    progress = SessionHeartbeatLog(session_id)
+    trace = JobTrace(session_id=session_id)
+    profiler = JobProfiler() if session.profile_enabled else None
+    engine = session.config.get("engine", "")
+    try:
+        config = MatchingConfig.from_dict(session.config)
+        with profiler or nullcontext():
+            report_path = create_matching_orchestrator().process_matching_request(
+                config, progress=progress, session_id=session_id, trace=trace
+            )
+    except Exception as e:
+        MatchingSession.objects.filter(pk=session_id).update(
+            status=MatchingSession.STATUS_ERROR,
+            error_message=str(e),
+            finished_at=timezone.now(),
+            profile_path=_save_profile(profiler, session),
+        )
+        progress.finish(
+            MatchingSession.STATUS_ERROR, error_message=str(e), **trace.summary()
+        )
+        metrics.record_job(
+            trace.summary(), engine, MatchingSession.STATUS_ERROR, exception=e
+        )
+        return MatchingSession.STATUS_ERROR
+
+    output_file_path = ResultWriter.output_file_path(
+        MatchingOrchestrator.output_directory(session_id), config.working_file_path
+    )
+    rates = matching_rates(trace.summary()["counters"])
+    MatchingSession.objects.filter(pk=session_id).update(
+        status=MatchingSession.STATUS_COMPLETED,
+        report_path=report_path,
+        output_file_path=str(output_file_path),
+        finished_at=timezone.now(),
+        profile_path=_save_profile(profiler, session),
+        **rates,
+    )
+    progress.finish(
+        MatchingSession.STATUS_COMPLETED,
+        report_path=report_path,
+        output_file_path=str(output_file_path),
+        rates=rates,
+        **trace.summary(),
+    )
+    metrics.record_job(trace.summary(), engine, MatchingSession.STATUS_COMPLETED)
+    return MatchingSession.STATUS_COMPLETED
+
+
+def _save_profile(
+    profiler: Optional[JobProfiler], session: MatchingSession
+) -> Optional[str]:
+    """Zapisuje profil zadania w katalogu profili (MATCHING_PROFILE_DIR)"""
+    if profiler is None:
+        return None
+    try:
+        return profiler.save(
+            Path(settings.MATCHING_PROFILE_DIR),
+            f"matching_profile_{session.pk}_{timezone.now():%Y%m%d_%H%M%S}",
+        )
+    except OSError:
+        # Brak profilu nie zmienia wyniku zadania
+        logger.warning("Nie udało się zapisać profilu sesji %s", session.pk, exc_info=True)
+        return None
+
+
+class MatchingJobRunner:
+    """
+    Kolejka zadań dopasowania wykonywanych w ograniczonej puli procesów.
+    Widok tylko tworzy sesję i zleca zadanie - status odczytywany jest z MatchingSession.
+    """
+
+    # Pula współdzielona w obrębie procesu serwera
+    _executor: Optional[ProcessPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    def __init__(
+        self, max_workers: Optional[int] = None, max_queued: Optional[int] = None
+    ):
+        """
+        Args:
+            max_workers: Liczba procesów roboczych (0 = wykonanie w bieżącym wątku)
+            max_queued: Maksymalna liczba zadań oczekujących i wykonywanych
+        """
+        self.max_workers = (
+            settings.MATCHING_JOB_WORKERS if max_workers is None else max_workers
+        )
+        self.max_queued = (
+            settings.MATCHING_JOB_MAX_QUEUED if max_queued is None else max_queued
+        )
+
+    def active_job_count(self) -> int:
+        """Liczba zadań oczekujących i wykonywanych (bez zadań osieroconych)"""
+        return (
+            MatchingSession.objects.filter(
+                status__in=[
+                    MatchingSession.STATUS_PENDING,
+                    MatchingSession.STATUS_RUNNING,
+                ]
+            )
+            .annotate(last_alive=Coalesce("heartbeat_at", "started_at", "created_at"))
+            .exclude(stale_jobs_filter())
+            .count()
+        )
+
+    def check_capacity(self) -> None:
+        """
+        Zadania osierocone oznaczane są najpierw jako błędne (recover_stale_jobs).
+
+        Raises:
+            MatchingError: Gdy kolejka zadań jest pełna
+        """
+        recover_stale_jobs()
+        if self.active_job_count() >= self.max_queued:
+            raise MatchingError(
+                "Zbyt wiele zadań dopasowania w kolejce. Spróbuj ponownie później."
+            )
+
+    def submit(self, session: MatchingSession) -> None:
+        """Zleca wykonanie zadania dla sesji (status PENDING)"""
+        if self.max_workers <= 0:
+            run_matching_job(session.pk)
+            return
+
+        try:
+            future = self._get_executor().submit(run_in_worker, session.pk)
+        except BrokenProcessPool:
+            # Proces roboczy zakończył się awaryjnie - pula tworzona jest od nowa
+            self._reset_executor()
+            future = self._get_executor().submit(run_in_worker, session.pk)
+
+        future.add_done_callback(
+            lambda done: self._mark_failed_job(session.pk, done)
+        )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if MatchingJobRunner._executor is None:
+                MatchingJobRunner._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    # Nowe procesy zamiast fork - serwer bywa wielowątkowy
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                )
+            return MatchingJobRunner._executor
+
+    def _reset_executor(self) -> None:
+        with self._executor_lock:
+            if MatchingJobRunner._executor is not None:
+                MatchingJobRunner._executor.shutdown(wait=False, cancel_futures=True)
+            MatchingJobRunner._executor = None
+
+    @staticmethod
+    def _mark_failed_job(session_id: int, future: Future) -> None:
+        """Sesja przerwana awarią procesu roboczego nie może zostać w statusie RUNNING"""
+        if future.cancelled():
+            error = "Zadanie zostało anulowane"
+        elif future.exception() is not None:
+            error = f"Awaria procesu roboczego: {future.exception()!r}"
+            metrics.record_failure(future.exception(), phase="job")
+        else:
+            return
+
+        MatchingSession.objects.filter(
+            pk=session_id,
+            status__in=[MatchingSession.STATUS_PENDING, MatchingSession.STATUS_RUNNING],
+        ).update(
+            status=MatchingSession.STATUS_ERROR,
+            error_message=error,
+            finished_at=timezone.now(),
+        )
+        connections.close_all()
@@ -1,8 +1,24 @@
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
-from typing import List, Dict, Tuple
-from dataclasses import dataclass
+from typing import Any, List, Dict, Optional, Tuple
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
 
+from django.conf import settings
+
+from matching.exceptions import MatchingError
+from matching.services import instrumentation, profiling
+from matching.services.instrumentation import JobTrace
+from matching.models import MatchingSession
+from matching.services.progress_events import MatchingProgress
+from matching.services.reference_catalog import ReferenceCatalog
+from matching.services.reference_index import ReferenceIndex, ReferenceIndexStore
+from matching.services.result_store import MatchingResultStore
+from matching.services.sheet_config import SheetConfig
+
 
 @dataclass
 class MatchingConfig:
@@ -22,6 +38,83 @@ class MatchingConfig:
     ref_description_column: str
     ref_description_range: Dict[str, str]
     ref_price_source_column: str
+    # Liczba kandydatów REF na opis WF (kolejni trafiają do raportu jako alternatywy)
+    top_k: int = 1
+    # Silnik dopasowania (klucz w MatchingOrchestrator.matching_engines)
+    engine: str = "rapidfuzz"
+    # Arkusze z własnymi kolumnami i zakresami (puste - tylko aktywny arkusz
+    # z kolumnami i zakresem powyżej)
+    wf_sheets: List[SheetConfig] = field(default_factory=list)
+    ref_sheets: List[SheetConfig] = field(default_factory=list)
+    # Premia punktowa katalogu reference_file_path (ReferenceCatalog.score_bias)
+    ref_score_bias: float = 0.0
+    # Kolejne katalogi REF przeszukiwane razem z reference_file_path
+    # (przy równym wyniku wygrywa katalog podany wcześniej)
+    additional_catalogs: List[ReferenceCatalog] = field(default_factory=list)
+
+    def working_sheets(self) -> List[SheetConfig]:
+        """Arkusze WF do dopasowania (kolumna cen to kolumna docelowa)"""
+        return self.wf_sheets or [
+            SheetConfig(
+                sheet=None,
+                description_column=self.wf_description_column,
+                description_range=self.wf_description_range,
+                price_column=self.wf_price_target_column,
+            )
+        ]
+
+    def reference_sheets(self) -> List[SheetConfig]:
+        """Arkusze katalogu REF (kolumna cen to kolumna źródłowa)"""
+        return self.ref_sheets or [
+            SheetConfig(
+                sheet=None,
+                description_column=self.ref_description_column,
+                description_range=self.ref_description_range,
+                price_column=self.ref_price_source_column,
+            )
+        ]
+
+    def reference_catalogs(self) -> List[ReferenceCatalog]:
+        """Katalogi REF w kolejności priorytetu (reference_file_path pierwszy)"""
+        return [
+            ReferenceCatalog(
+                file_path=self.reference_file_path,
+                sheets=self.reference_sheets(),
+                score_bias=self.ref_score_bias,
+            ),
+            *self.additional_catalogs,
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Postać JSON konfiguracji (zapisywana w MatchingSession.config)"""
+        data = asdict(self)
+        data["working_file_path"] = str(self.working_file_path)
+        data["reference_file_path"] = str(self.reference_file_path)
+        data["additional_catalogs"] = [
+            catalog.to_dict() for catalog in self.additional_catalogs
+        ]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MatchingConfig":
+        """Odtwarza konfigurację zapisaną przez to_dict"""
+        return cls(
+            **{
+                **data,
+                "working_file_path": Path(data["working_file_path"]),
+                "reference_file_path": Path(data["reference_file_path"]),
+                "wf_sheets": [
+                    SheetConfig.from_dict(sheet) for sheet in data.get("wf_sheets", [])
+                ],
+                "ref_sheets": [
+                    SheetConfig.from_dict(sheet) for sheet in data.get("ref_sheets", [])
+                ],
+                "additional_catalogs": [
+                    ReferenceCatalog.from_dict(catalog)
+                    for catalog in data.get("additional_catalogs", [])
+                ],
+            }
+        )
 
 
 class MatchingOrchestrator:
@@ -30,12 +123,18 @@ class MatchingOrchestrator:
     Odpowiada za kolejność i koordynację wykonywania operacji przez pozostałe serwisy.
     """
 
+    # Maksymalna liczba arkuszy WF dopasowywanych jednocześnie
+    MAX_SHEET_WORKERS = 4
+
     def __init__(
         self,
         excel_processor,  # wstrzykiwanie zależności przez konstruktor
         data_validator,  # ułatwia testowanie i rozszerzanie
         matching_service,
         result_writer,
+        reference_index_store: Optional[ReferenceIndexStore] = None,
+        matching_engines: Optional[Dict[str, object]] = None,
+        result_store: Optional[MatchingResultStore] = None,
     ):
         """
         Inicjalizacja orchestratora z wszystkimi wymaganymi serwisami.
@@ -44,22 +143,35 @@ class MatchingOrchestrator:
         self.excel_processor = excel_processor
         self.data_validator = data_validator
         self.matching_service = matching_service
+        # Dostępne silniki dopasowania {nazwa: serwis}, domyślny to matching_service
+        self.matching_engines = {"rapidfuzz": matching_service, **(matching_engines or {})}
+        self.reference_index_store = reference_index_store or ReferenceIndexStore()
+        self.result_store = result_store or MatchingResultStore()
 
         # Przekazujemy excel_processor do result_writer
         if not hasattr(result_writer, "excel_processor"):
             result_writer.excel_processor = excel_processor
         self.result_writer = result_writer
 
-        # Status dla każdego zadania
-        self._processing_status: Dict[str, str] = {}
-
-    def process_matching_request(self, config: MatchingConfig) -> str:
+    def process_matching_request(
+        self,
+        config: MatchingConfig,
+        progress: Optional[MatchingProgress] = None,
+        session_id: Optional[int] = None,
+        trace: Optional[JobTrace] = None,
+        output_directory: Optional[Path] = None,
+    ) -> str:
         """
         Główna metoda koordynująca cały proces dopasowania.
         Zwraca ścieżkę do pliku raportu.
 
         Args:
             config: Pełna konfiguracja procesu dopasowania
+            progress: Odbiorca zdarzeń postępu (etapy, postęp i paczki wyników)
+            session_id: MatchingSession, w której zapisywane są wyniki (MatchingResult)
+            trace: Pomiary zadania - czasy etapów i liczniki (domyślnie nowy ślad)
+            output_directory: Katalog kopii WF z cenami i raportu (domyślnie
+                katalog sesji w MATCHING_OUTPUT_DIR)
 
         Returns:
             str: Ścieżka do wygenerowanego pliku raportu
@@ -67,133 +179,296 @@ class MatchingOrchestrator:
         Raises:
             Exception: W przypadku błędów w trakcie przetwarzania
         """
-        print(
-            "DEBUG: *** process_matching_request *** was called from the MatchingOrchestrator"
-        )
-
-        try:
-            # 1. Walidacja danych wejściowych
-            self.data_validator.validate_files(
-                config.working_file_path, config.reference_file_path
-            )
+        progress = progress or MatchingProgress()
+        trace = trace or JobTrace(session_id=session_id)
+
+        with trace.activate():
+            try:
+                report_path = self._run_stages(
+                    config,
+                    progress,
+                    session_id,
+                    trace,
+                    output_directory or self.output_directory(session_id),
+                )
+            except Exception as e:
+                # Centralne miejsce obsługi błędów
+                self._handle_error(e, trace)
+                raise
+            finally:
+                # Upewnij się, że pliki są zamknięte także w przypadku błędu
+                self.excel_processor.close_all_workbooks()
+
+            trace.log(logging.INFO, "job.completed", **trace.summary())
+            return report_path
 
-            # 2. Wczytanie plików Excel
-            self.excel_processor.load_files(
-                working_file=config.working_file_path,
-                reference_file=config.reference_file_path,
-            )
+    @staticmethod
+    def output_directory(session_id: Optional[int]) -> Optional[Path]:
+        """
+        Katalog wyników zadania (kopia WF z cenami i raport) - osobny dla każdej
+        sesji; None dla zadań bez sesji (ResultWriter tworzy wtedy nowy katalog).
+        """
+        if session_id is None:
+            return None
+        return Path(settings.MATCHING_OUTPUT_DIR) / f"session_{session_id}"
 
-            # 3. Pobieramy dane z plików Excel za pomocą metody extract_excel_data
-            wf_descriptions, ref_descriptions, ref_prices, ref_price_column = (
-                self._extract_excel_data(config)
-            )
+    def _run_stages(
+        self,
+        config: MatchingConfig,
+        progress: MatchingProgress,
+        session_id: Optional[int],
+        trace: JobTrace,
+        output_directory: Optional[Path] = None,
+    ) -> str:
+        """Kolejne etapy dopasowania; każdy etap mierzony jest jako span śladu"""
+        # 1. Sesja skoroszytów zadania - każdy plik parsowany jest raz i współdzielony
+        # przez walidację, odczyt i zapis (WF od razu w trybie do zapisu; zmieniony
+        # skoroszyt zapisywany jest jako kopia w katalogu wyników zadania)
+        workbook_session = self.excel_processor.begin_session(
+            writable_files=[config.working_file_path]
+        )
 
-            # 4. Wykonanie dopasowania
-            matching_results = self.matching_service.process_descriptions(
-                wf_descriptions=wf_descriptions,
-                ref_descriptions=ref_descriptions,
-                ref_prices=ref_prices,
-                ref_price_column=ref_price_column,
-                threshold=config.matching_threshold,
+        # 2. Walidacja danych wejściowych
+        progress.stage("validate")
+        with trace.span("validate"):
+            self.data_validator.validate_files(
+                config.working_file_path,
+                config.reference_file_path,
+                workbook_session=workbook_session,
+                additional_reference_file_paths=[
+                    catalog.file_path for catalog in config.additional_catalogs
+                ],
             )
 
-            print(
-                f"DEBUG: BEFORE saving: matching_results: {matching_results} \n wf_price_target_column: {config.wf_price_target_column} \n *** process_matching_request *** at matching_orchestrator"
+        # 3. Wczytanie pliku WF (plik REF wczytywany tylko przy budowie indeksu)
+        progress.stage("load")
+        with trace.span("load"):
+            self.excel_processor.load_files(working_file=config.working_file_path)
+
+        # 4. Pobieramy opisy arkuszy WF oraz wspólny indeks katalogów REF
+        progress.stage("extract")
+        with trace.span("extract"):
+            working_sheets = self._extract_working_data(config)
+        wf_rows = sum(len(descriptions) for _, descriptions in working_sheets)
+        trace.incr("wf_rows_read", wf_rows)
+
+        progress.stage("index", wf_rows=wf_rows)
+        with trace.span("index"):
+            reference_index = self._load_reference_index(config)
+        trace.incr("ref_rows_indexed", len(reference_index))
+
+        # 5. Wykonanie dopasowania wybranym silnikiem (arkusze WF równolegle)
+        matching_service = self._get_matching_service(config.engine)
+        progress.stage("match", wf_rows=wf_rows, ref_rows=len(reference_index))
+        with trace.span("match", engine=config.engine):
+            matching_results = self._match_sheets(
+                matching_service, working_sheets, reference_index, config, progress
             )
 
-            # 5. Zapis wyników - ResultWriter został już zaktualizowany do korzystania z ExcelProcessor
+        # 6. Zapis wyników do kopii WF - ResultWriter korzysta z sesji ExcelProcessor
+        progress.stage("write", matches=len(matching_results))
+        with trace.span("write"):
             report_path = self.result_writer.write_results(
                 matching_results,
                 config.working_file_path,
                 config.wf_price_target_column,
+                sheet_price_columns={
+                    sheet.label: sheet.price_column
+                    for sheet in config.working_sheets()
+                },
+                show_catalogs=bool(config.additional_catalogs),
+                output_directory=output_directory,
             )
 
-            # 6. Zamknięcie plików po zakończeniu
-            self.excel_processor.close_all_workbooks()
+        # 7. Zapis wyników w bazie (tylko dla zadań z sesją)
+        if session_id is not None:
+            progress.stage("persist", matches=len(matching_results))
+            with trace.span("persist"):
+                self.result_store.save_results(
+                    session_id, matching_results, ref_file_name=reference_index.file_name
+                )
 
-            return report_path
+        return report_path
 
-        except Exception as e:
-            # Centralne miejsce obsługi błędów
-            self._handle_error(str(e))
-            # Upewnij się, że pliki są zamknięte nawet w przypadku błędu
-            self.excel_processor.close_all_workbooks()
-            raise
+    def _get_matching_service(self, engine: str):
+        """
+        Zwraca serwis dopasowania dla wybranego silnika.
 
-    def _extract_excel_data(
+        Raises:
+            MatchingError: Gdy silnik nie jest skonfigurowany
+        """
+        if engine not in self.matching_engines:
+            raise MatchingError(
+                f"Nieznany silnik dopasowania: {engine}. "
+                f"Dostępne: {', '.join(self.matching_engines)}"
+            )
+        return self.matching_engines[engine]
+
+    def _extract_working_data(
         self, config: MatchingConfig
-    ) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]], Dict[str, Decimal], str]:
+    ) -> List[Tuple[SheetConfig, List[Tuple[str, str]]]]:
         """
-        Pobiera dane z plików Excel potrzebne do procesu dopasowania.
+        Pobiera opisy kolejnych arkuszy z pliku WF (skoroszyt wczytany raz w sesji).
 
         Args:
             config: Konfiguracja zawierająca ścieżki i zakresy
 
         Returns:
-            Tuple zawierająca:
-            - Lista krotek (opis, adres_komórki) z pliku WF
-            - Lista krotek (opis, adres_komórki) z pliku REF
-            - Słownik {adres_komórki: cena} z pliku REF
+            Lista (arkusz, lista krotek (opis, adres_komórki)) w kolejności arkuszy
         """
-        print(
-            "DEBUG: *** _extract_excel_data *** was called from the MatchingOrchestrator"
-        )
+        return [
+            (
+                sheet,
+                self.excel_processor.read_descriptions(
+                    file_path=config.working_file_path,
+                    column=sheet.description_column,
+                    cell_range=sheet.description_range,
+                    sheet=sheet.sheet,
+                ),
+            )
+            for sheet in config.working_sheets()
+        ]
 
-        # Pobierz opisy z pliku WF
-        wf_descriptions = self.excel_processor.read_descriptions(
-            file_path=config.working_file_path,
-            column=config.wf_description_column,
-            cell_range=config.wf_description_range,
-        )
+    def _match_sheets(
+        self,
+        matching_service,
+        working_sheets: List[Tuple[SheetConfig, List[Tuple[str, str]]]],
+        reference_index: ReferenceIndex,
+        config: MatchingConfig,
+        progress: MatchingProgress,
+    ) -> List[Dict]:
+        """
+        Dopasowuje arkusze WF do indeksu REF - kilka arkuszy równolegle w wątkach
+        (każdy z kopią kontekstu, więc liczniki trafiają do śladu zadania).
 
-        # Pobierz opisy z pliku REF
-        ref_descriptions = self.excel_processor.read_descriptions(
-            file_path=config.reference_file_path,
-            column=config.ref_description_column,
-            cell_range=config.ref_description_range,
-        )
-        print(
-            f"DEBUG: matching_orchestrator: column taken from REF ***{config.ref_description_column}***"
-        )
-        print(
-            f"DEBUG: matching_orchestrator: cell_range taken from REF ***{config.ref_description_range}***"
-        )
+        Returns:
+            Wyniki wszystkich arkuszy w kolejności arkuszy, z nazwą arkusza "wf_sheet"
+        """
+        rows_total = sum(len(descriptions) for _, descriptions in working_sheets)
+        rows_done = [0] * len(working_sheets)
+        progress_lock = threading.Lock()
+
+        def match_sheet(
+            position: int, sheet: SheetConfig, descriptions: List[Tuple[str, str]]
+        ) -> List[Dict]:
+            def on_batch(sheet_rows_done: int, _: int, results: List[Dict]) -> None:
+                # Każdy wynik przechodzi przez on_batch dokładnie raz
+                for result in results:
+                    result["wf_sheet"] = sheet.label
+                with progress_lock:
+                    rows_done[position] = sheet_rows_done
+                    progress.matches(sum(rows_done), rows_total, results)
+
+            return matching_service.match_reference_index(
+                wf_descriptions=descriptions,
+                reference_index=reference_index,
+                threshold=config.matching_threshold,
+                top_k=config.top_k,
+                on_batch=on_batch,
+                catalog_bias={
+                    catalog.name: catalog.score_bias
+                    for catalog in config.reference_catalogs()
+                },
+            )
 
-        # Pobierz ceny z pliku REF
-        ref_prices = self.excel_processor.read_prices(
-            file_path=config.reference_file_path,
-            price_column=config.ref_price_source_column,
-            row_range=config.ref_description_range,  # używamy tego samego zakresu wierszy co dla opisów
-        )
-        print(
-            f"DEBUG: matching_orchestrator: read_prices taken from REF ***{config.ref_price_source_column}***"
-        )
+        if len(working_sheets) == 1:
+            sheet_results = [match_sheet(0, *working_sheets[0])]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(len(working_sheets), self.MAX_SHEET_WORKERS),
+                thread_name_prefix="matching-sheet",
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        profiling.run_profiled,
+                        match_sheet,
+                        position,
+                        sheet,
+                        descriptions,
+                    )
+                    for position, (sheet, descriptions) in enumerate(working_sheets)
+                ]
+                sheet_results = [future.result() for future in futures]
+
+        return [result for results in sheet_results for result in results]
+
+    def _load_reference_index(self, config: MatchingConfig) -> ReferenceIndex:
+        """
+        Zwraca wspólny indeks katalogów REF - z dysku, jeśli pliki i konfiguracja
+        się nie zmieniły, w przeciwnym razie odczytuje pliki REF i buduje indeks.
+
+        Args:
+            config: Konfiguracja zawierająca ścieżki i zakresy
 
-        return (
-            wf_descriptions,
-            ref_descriptions,
-            ref_prices,
-            config.ref_price_source_column,
+        Returns:
+            ReferenceIndex: Indeks katalogów REF
+        """
+        return self.reference_index_store.get_or_build(
+            catalogs=config.reference_catalogs(),
+            builder=self._extract_reference_data,
         )
 
-    def _handle_error(self, error_message: str) -> None:
+    def _extract_reference_data(
+        self, catalog: ReferenceCatalog
+    ) -> List[Tuple[List[Tuple[str, str]], Dict[str, Decimal]]]:
         """
-        Centralna obsługa błędów - w przyszłości można dodać:
-        - Logowanie do pliku/systemu
-        - Powiadomienia (email, Slack)
-        - Metryki błędów
+        Pobiera dane arkuszy katalogu REF potrzebne do budowy indeksu.
+
+        Args:
+            catalog: Plik REF i konfiguracja jego arkuszy
+
+        Returns:
+            Dla każdego arkusza REF (w kolejności konfiguracji) krotka:
+            - Lista krotek (opis, adres_komórki) z arkusza
+            - Słownik {adres_komórki: cena} z arkusza
         """
-        # TODO: Implementacja logowania błędów
-        pass
+        self.excel_processor.load_file(catalog.file_path)
+
+        sheets_data = []
+        for sheet in catalog.sheets:
+            # Pobierz opisy i ceny arkusza jednym przejściem
+            # (ceny z tego samego zakresu wierszy co opisy)
+            ref_descriptions, ref_prices = (
+                self.excel_processor.read_descriptions_and_prices(
+                    file_path=catalog.file_path,
+                    description_column=sheet.description_column,
+                    price_column=sheet.price_column,
+                    row_range=sheet.description_range,
+                    sheet=sheet.sheet,
+                )
+            )
+            instrumentation.incr("ref_rows_read", len(ref_descriptions))
+            sheets_data.append((ref_descriptions, ref_prices))
+
+        return sheets_data
+
+    def _handle_error(self, error: Exception, trace: JobTrace) -> None:
+        """
+        Centralna obsługa błędów - błąd logowany jest razem z pomiarami zadania
+        (etapy wykonane przed błędem i liczniki)
+        """
+        trace.log(
+            logging.ERROR,
+            "job.failed",
+            error_type=type(error).__name__,
+            error=str(error),
+            **trace.summary(),
+        )
 
     def get_processing_status(self, job_id: str) -> str:
         """
         Zwraca status przetwarzania dla danego zadania
 
         Args:
-            job_id: Identyfikator zadania
+            job_id: Identyfikator zadania (id MatchingSession)
 
         Returns:
             str: Status przetwarzania
         """
-        return self._processing_status.get(job_id, "UNKNOWN")
+        status = (
+            MatchingSession.objects.filter(pk=job_id)
+            .values_list("status", flat=True)
+            .first()
+        )
+        return status or "UNKNOWN"
@@ -1,9 +1,38 @@
+import hashlib
+import heapq
+import inspect
+import json
+import logging
+import marshal
+import math
+import os
+import pickle
+import threading
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
 from decimal import Decimal
-from typing import Dict, List, Optional, Tuple
-from rapidfuzz import fuzz
+from itertools import repeat
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from rapidfuzz import fuzz, process
 
 from matching.exceptions import MatchingError
+from matching.services import instrumentation
+from matching.services.match_cache import CacheScope, MatchCache, RowMatches
+from matching.services.sharding import (
+    available_cpu_count,
+    match_shard,
+    shard_pool,
+)
+from matching.services.text_normalizer import TextNormalizer
+from matching.services.reference_index import (
+    ReferenceIndex,
+    price_cell_for,
+)
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -14,18 +43,515 @@ class MatchingCandidate:
     cell_address: str
     price: Decimal
     match_score: float = 0.00
+    # Arkusz REF ("" - aktywny arkusz)
+    sheet: str = ""
+    # Katalog REF (nazwa pliku)
+    catalog: str = ""
+
+
+class PairwiseScorer:
+    """
+    Adapter dla własnych funkcji porównujących postaci f(opis_wf, opis_ref).
+    process.cdist przekazuje do scorera argumenty nazwane (processor, score_cutoff),
+    których zwykła funkcja Pythona nie przyjmuje. Próg score_cutoff stosowany jest
+    tak jak w RapidFuzz - wynik poniżej progu zwracany jest jako 0.
+    """
+
+    def __init__(self, matching_function: Callable[[str, str], float]):
+        self.matching_function = matching_function
+
+    def __call__(
+        self, s1: str, s2: str, score_cutoff: Optional[float] = None, **kwargs
+    ) -> float:
+        score = self.matching_function(s1, s2)
+        if score_cutoff is not None and score < score_cutoff:
+            return 0
+        return score
+
+
+def matching_rates(counters: Dict[str, int]) -> Dict[str, float]:
+    """
+    Udziały wierszy WF rozstrzygniętych bez porównania z katalogiem, liczone
+    z liczników zadania względem wszystkich wczytanych wierszy WF (wf_rows_read).
+
+    Returns:
+        exact_match_rate - opis identyczny z opisem REF (słownik zamiast scorera),
+        dedup_ratio - powtórzenie wcześniejszego opisu WF (wynik skopiowany)
+    """
+    wf_rows = counters.get("wf_rows_read", 0)
+    if not wf_rows:
+        return {"exact_match_rate": 0.0, "dedup_ratio": 0.0}
+    return {
+        "exact_match_rate": round(counters.get("exact_matches", 0) / wf_rows, 4),
+        "dedup_ratio": round(counters.get("wf_duplicate_rows", 0) / wf_rows, 4),
+    }
 
 
 class MatchingService:
     """Serwis odpowiedzialny za porównanie opisów i znajdowanie najlepszych dopasowań"""
 
-    def __init__(self, matching_function=fuzz.ratio):
+    # Wynik opisu WF identycznego z opisem REF (dopasowanie bez porównywania katalogu)
+    EXACT_MATCH_SCORE = 100.0
+
+    # Maksymalna liczba komórek macierzy wyników liczonej w jednym kroku (float64 -> ~64 MB)
+    MAX_MATRIX_CELLS = 8_000_000
+    # Od tej liczby wierszy REF porównywani są tylko kandydaci z indeksu n-gramów
+    BLOCKING_MIN_REF_ROWS = 5000
+    # Liczba wierszy WF, dla których n-gramy wyznaczane są jednocześnie
+    BLOCKING_CHUNK_SIZE = 1000
+    # Liczba bloków wierszy WF na proces przy podziale między procesy (sharding) -
+    # kilka bloków na proces wyrównuje obciążenie przy nierównym czasie bloków
+    SHARD_CHUNKS_PER_WORKER = 4
+
+    # Jedno dopasowanie w puli procesów (shard_pool) naraz w obrębie procesu - arkusze
+    # dopasowywane w wątkach czekają na swoją kolej zamiast mnożyć procesy ponad
+    # liczbę rdzeni
+    _shard_lock = threading.Lock()
+
+    def __init__(
+        self,
+        matching_function=fuzz.ratio,
+        workers: int = -1,
+        candidate_limit: Optional[int] = 200,
+        min_gram_overlap: float = 0.3,
+        max_gram_frequency: float = 0.2,
+        match_cache: Optional[MatchCache] = None,
+        normalizer: Optional[TextNormalizer] = None,
+        shard_workers: Optional[int] = None,
+    ):
         """Inicjalizacja serwisu
 
         Args:
             matching_function: Funkcja porównująca z RapidFuzz (domyślnie ratio)
+            workers: Liczba wątków dla obliczeń macierzowych (-1 = wszystkie rdzenie)
+            candidate_limit: Maksymalna liczba kandydatów REF na wiersz WF przy
+                dużych katalogach (None = zawsze porównanie ze wszystkimi wierszami)
+            min_gram_overlap: Minimalny udział wspólnych n-gramów kandydata (0-1)
+            max_gram_frequency: Udział wierszy REF, powyżej którego n-gram jest
+                zbyt częsty, aby wskazywać kandydatów
+            match_cache: Pamięć wyników dopasowania między zadaniami (None - bez pamięci)
+            normalizer: Normalizacja opisów dla find_best_match i process_descriptions
+                (domyślnie z ustawień; match_reference_index stosuje normalizację indeksu)
+            shard_workers: Liczba procesów, między które dzielone są wiersze WF dla
+                scorerów napisanych w Pythonie (domyślnie z ustawień
+                MATCHING_SHARD_WORKERS, None - dostępne rdzenie, 0 - bez podziału).
+                Scorery RapidFuzz liczą wielowątkowo bez GIL i nie są dzielone
+                między procesy.
         """
         self.matching_function = matching_function
+        self.workers = workers
+        self.candidate_limit = candidate_limit
+        self.min_gram_overlap = min_gram_overlap
+        self.max_gram_frequency = max_gram_frequency
+        self.match_cache = match_cache
+        self.normalizer = normalizer or TextNormalizer.from_settings()
+        self.shard_workers = (
+            settings.MATCHING_SHARD_WORKERS if shard_workers is None else shard_workers
+        )
+        self._batch_scorer = (
+            matching_function
+            if self._accepts_keyword_arguments(matching_function)
+            else PairwiseScorer(matching_function)
+        )
+        # Ostatnio znormalizowany katalog find_best_match: (opisy REF, opisy
+        # znormalizowane, słownik {opis znormalizowany: pierwszy wiersz REF})
+        self._normalized_references: Optional[
+            Tuple[Tuple[str, ...], List[str], Dict[str, int]]
+        ] = None
+
+    @staticmethod
+    def _accepts_keyword_arguments(matching_function) -> bool:
+        """Sprawdza, czy funkcja przyjmuje argumenty processor/score_cutoff jak scorery RapidFuzz"""
+        try:
+            parameters = inspect.signature(matching_function).parameters
+        except (TypeError, ValueError):
+            # Funkcje bez sygnatury (np. skompilowane) traktujemy jak scorery RapidFuzz
+            return True
+
+        return "score_cutoff" in parameters or any(
+            parameter.kind == inspect.Parameter.VAR_KEYWORD
+            for parameter in parameters.values()
+        )
+
+    def scorer_signature(self) -> Optional[str]:
+        """
+        Opis scorera i parametrów wpływających na wyniki (część klucza MatchCache).
+
+        Funkcje Pythona są rozpoznawane po module, nazwie i hashu kodu - zmiana
+        treści funkcji unieważnia zapamiętane wyniki. Scorery bez stałej tożsamości
+        (lambda, funkcja lokalna lub z domknięciem, functools.partial) zwracają
+        None - ich wyniki nie są zapamiętywane.
+        """
+        function_name = getattr(self.matching_function, "__qualname__", None)
+        if (
+            function_name is None
+            or "<lambda>" in function_name
+            or "<locals>" in function_name
+            or getattr(self.matching_function, "__closure__", None)
+        ):
+            return None
+
+        code = getattr(self.matching_function, "__code__", None)
+        code_hash = (
+            hashlib.sha256(
+                marshal.dumps((code.co_code, code.co_consts, code.co_names))
+            ).hexdigest()[:16]
+            if code is not None
+            else ""
+        )
+        return (
+            f"{type(self).__name__}:"
+            f"{getattr(self.matching_function, '__module__', '')}.{function_name}:"
+            f"{code_hash}:"
+            f"{self.candidate_limit}:{self.min_gram_overlap}:{self.max_gram_frequency}"
+        )
+
+    def _cache_scope(
+        self,
+        reference_index: ReferenceIndex,
+        threshold: float,
+        top_k: int,
+        row_bias: Optional[np.ndarray] = None,
+        catalog_bias: Optional[Dict[str, float]] = None,
+    ) -> Optional[CacheScope]:
+        """
+        Zakres wpisów MatchCache (None - indeks tymczasowy bez hasha pliku REF
+        lub scorer bez stałej tożsamości)
+        """
+        if self.match_cache is None or reference_index.key is None:
+            return None
+        scorer_signature = self.scorer_signature()
+        if scorer_signature is None:
+            return None
+        if row_bias is not None:
+            # Premie katalogów zmieniają kolejność kandydatów
+            scorer_signature += ":bias=" + json.dumps(catalog_bias, sort_keys=True)
+        return reference_index.key, scorer_signature, float(threshold), top_k
+
+    def score_matrix(
+        self, wf_texts: List[str], ref_texts: List[str], threshold: float = 0
+    ) -> np.ndarray:
+        """Liczy macierz podobieństw wszystkich opisów WF względem wszystkich opisów REF
+
+        Opisy trafiają do scorera bez zmian - powinny być już znormalizowane
+        (TextNormalizer), tak jak normalized_descriptions indeksu REF.
+
+        Args:
+            wf_texts: opisy z pliku WF (wiersze macierzy)
+            ref_texts: opisy z pliku REF (kolumny macierzy)
+            threshold: wyniki poniżej progu są zerowane (RapidFuzz przerywa ich liczenie)
+
+        Returns:
+            Macierz float64 o wymiarach (len(wf_texts), len(ref_texts))
+        """
+        try:
+            return process.cdist(
+                wf_texts,
+                ref_texts,
+                scorer=self._batch_scorer,
+                dtype=np.float64,
+                workers=self.workers,
+                score_cutoff=threshold or None,
+            )
+        except Exception as e:
+            raise MatchingError(f"Błąd podczas porównywania opisów: {str(e)}")
+
+    def _use_blocking(self, reference_index: ReferenceIndex) -> bool:
+        """Czy porównywać tylko kandydatów z indeksu n-gramów zamiast całego katalogu"""
+        return (
+            self.candidate_limit is not None
+            and len(reference_index) >= self.BLOCKING_MIN_REF_ROWS
+        )
+
+    def _iter_best_matches(
+        self,
+        wf_texts: List[str],
+        reference_index: ReferenceIndex,
+        threshold: float,
+        top_k: int = 1,
+        use_blocking: Optional[bool] = None,
+        row_bias: Optional[np.ndarray] = None,
+    ) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """Zwraca najlepsze dopasowania dla kolejnych bloków wierszy WF
+
+        Premia wierszy REF (row_bias) zmienia tylko kolejność kandydatów -
+        zwracane wyniki to podobieństwo bez premii.
+
+        Yields:
+            (indeks pierwszego wiersza bloku, indeksy najlepszych REF [n x top_k],
+            wyniki [n x top_k]) - kandydaci od najlepszego, brakujący z wynikiem 0
+        """
+        if use_blocking is None:
+            use_blocking = self._use_blocking(reference_index)
+
+        shard_workers = self._shard_worker_count(len(wf_texts))
+        if shard_workers:
+            yield from self._iter_sharded_matches(
+                wf_texts,
+                reference_index,
+                threshold,
+                top_k,
+                use_blocking,
+                row_bias,
+                shard_workers,
+            )
+        elif use_blocking:
+            yield from self._iter_blocked_matches(
+                wf_texts, reference_index, threshold, top_k, row_bias
+            )
+        else:
+            yield from self._iter_matrix_matches(
+                wf_texts, reference_index, threshold, top_k, row_bias
+            )
+
+    def _shard_worker_count(self, rows: int) -> int:
+        """Liczba procesów dla opisów WF (0 - dopasowanie w bieżącym procesie)"""
+        # Scorery RapidFuzz (C++) mają atrybut _RF_Scorer i nie potrzebują procesów
+        if hasattr(self.matching_function, "_RF_Scorer"):
+            return 0
+        if rows < settings.MATCHING_SHARD_MIN_ROWS:
+            return 0
+
+        workers = self.shard_workers
+        if workers is None:
+            workers = available_cpu_count()
+        if workers <= 1:
+            return 0
+
+        try:
+            # Procesy otrzymują scorer w postaci zserializowanej
+            pickle.dumps(self.matching_function)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            logger.warning(
+                "Scorer %r nie może zostać przekazany do procesów - dopasowanie "
+                "w bieżącym procesie",
+                self.matching_function,
+            )
+            return 0
+        return workers
+
+    def _iter_sharded_matches(
+        self,
+        wf_texts: List[str],
+        reference_index: ReferenceIndex,
+        threshold: float,
+        top_k: int,
+        use_blocking: bool,
+        row_bias: Optional[np.ndarray],
+        workers: int,
+    ) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """Dopasowanie bloków wierszy WF w długo żyjącej puli procesów (shard_pool)
+
+        Indeks REF zapisywany jest dla procesów raz na klucz, a parametry
+        dopasowania raz na wywołanie - zadania niosą tylko bloki opisów WF i
+        nazwy plików. Wyniki bloków zwracane są w kolejności wierszy WF,
+        a liczniki procesów doliczane do bieżącego zadania.
+        """
+        chunk_size = math.ceil(
+            len(wf_texts) / (workers * self.SHARD_CHUNKS_PER_WORKER)
+        )
+        starts = range(0, len(wf_texts), chunk_size)
+
+        with self._shard_lock:
+            index_key, index_path = shard_pool.publish_index(reference_index)
+            context_path = shard_pool.publish_context(
+                (self, threshold, top_k, use_blocking, row_bias)
+            )
+            try:
+                shards = shard_pool.executor(workers).map(
+                    match_shard,
+                    repeat(index_key),
+                    repeat(index_path),
+                    repeat(context_path),
+                    [wf_texts[start : start + chunk_size] for start in starts],
+                )
+                for start, (best_indices, best_scores, counters) in zip(
+                    starts, shards
+                ):
+                    for name, value in counters.items():
+                        instrumentation.incr(name, value)
+                    yield start, best_indices, best_scores
+            except BrokenProcessPool as e:
+                shard_pool.reset()
+                raise MatchingError(
+                    f"Awaria procesu dopasowania opisów: {str(e) or repr(e)}"
+                )
+            finally:
+                os.remove(context_path)
+                shard_pool.release_index(index_key, index_path)
+
+    def _score_block(
+        self, wf_texts: List[str], reference_index: ReferenceIndex, threshold: float
+    ) -> np.ndarray:
+        """Macierz wyników bloku wierszy WF względem całego katalogu REF"""
+        return self.score_matrix(
+            wf_texts, reference_index.normalized_descriptions, threshold
+        )
+
+    def _map_blocks(
+        self, score_block: Callable[[List[str]], np.ndarray], blocks: List[List[str]]
+    ) -> Iterator[np.ndarray]:
+        """Liczy macierze kolejnych bloków WF (cdist sam korzysta z wielu rdzeni)"""
+        return map(score_block, blocks)
+
+    def _iter_matrix_matches(
+        self,
+        wf_texts: List[str],
+        reference_index: ReferenceIndex,
+        threshold: float,
+        top_k: int,
+        row_bias: Optional[np.ndarray] = None,
+    ) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """Porównanie ze wszystkimi wierszami REF
+
+        Macierz liczona jest blokami wierszy WF, tak aby jej rozmiar nie przekraczał
+        MAX_MATRIX_CELLS - pamięć nie rośnie razem z liczbą wierszy WF.
+        """
+        chunk_size = max(1, self.MAX_MATRIX_CELLS // max(1, len(reference_index)))
+        top_k = min(top_k, len(reference_index))
+        starts = range(0, len(wf_texts), chunk_size)
+
+        block_scores = self._map_blocks(
+            lambda block: self._score_block(block, reference_index, threshold),
+            [wf_texts[start : start + chunk_size] for start in starts],
+        )
+        if row_bias is not None:
+            # Premie przesunięte do wartości nieujemnych - wyniki poniżej progu (0)
+            # pozostają najgorsze
+            row_bias = row_bias - row_bias.min()
+
+        for start, scores in zip(starts, block_scores):
+            instrumentation.incr("comparisons", scores.size)
+            ranking = scores
+            if row_bias is not None:
+                ranking = np.where(scores > 0, scores + row_bias, 0)
+            if top_k == 1:
+                # argmax zwraca pierwsze maksimum - tak samo jak pętla w find_best_match
+                best_indices = ranking.argmax(axis=1)[:, None]
+            else:
+                best_indices = self._top_k_indices(ranking, top_k)
+
+            best_scores = np.take_along_axis(scores, best_indices, axis=1)
+            best_scores[best_indices < 0] = 0
+            yield start, best_indices, best_scores
+
+    @staticmethod
+    def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """Indeksy top_k najlepszych wyników w każdym wierszu macierzy
+
+        Wiersze nie są sortowane w całości - sortowani są tylko kandydaci nie gorsi
+        od k-tego wyniku. Przy remisie wygrywa wcześniejszy wiersz REF.
+        Brakujący kandydaci oznaczani są indeksem -1.
+        """
+        best_indices = np.full((len(scores), top_k), -1, dtype=np.int64)
+        kth_scores = np.partition(scores, -top_k, axis=1)[:, -top_k]
+        # Wyniki 0 (poniżej progu) nigdy nie trafiają do wyników
+        kth_scores = np.maximum(kth_scores, np.nextafter(0, 1))
+
+        for row, (row_scores, kth_score) in enumerate(zip(scores, kth_scores)):
+            candidates = np.flatnonzero(row_scores >= kth_score)
+            order = np.lexsort((candidates, -row_scores[candidates]))[:top_k]
+            best_indices[row, : len(order)] = candidates[order]
+
+        return best_indices
+
+    def _iter_blocked_matches(
+        self,
+        wf_texts: List[str],
+        reference_index: ReferenceIndex,
+        threshold: float,
+        top_k: int,
+        row_bias: Optional[np.ndarray] = None,
+    ) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """Porównanie tylko z kandydatami wskazanymi przez indeks n-gramów REF"""
+        candidate_index = reference_index.get_candidate_index()
+        ref_texts = reference_index.normalized_descriptions
+
+        for start in range(0, len(wf_texts), self.BLOCKING_CHUNK_SIZE):
+            chunk = wf_texts[start : start + self.BLOCKING_CHUNK_SIZE]
+            best_indices = np.zeros((len(chunk), top_k), dtype=np.int64)
+            best_scores = np.zeros((len(chunk), top_k), dtype=np.float64)
+
+            for offset, query_keys in enumerate(candidate_index.query_grams(chunk)):
+                candidate_rows = candidate_index.candidates(
+                    query_keys,
+                    max_candidates=self.candidate_limit,
+                    min_overlap=self.min_gram_overlap,
+                    max_gram_frequency=self.max_gram_frequency,
+                )
+                if not len(candidate_rows):
+                    continue
+                instrumentation.incr("comparisons", len(candidate_rows))
+
+                try:
+                    # extract zwraca wyniki malejąco, przy remisie wg kolejności kandydatów
+                    matches = process.extract(
+                        chunk[offset],
+                        [ref_texts[row] for row in candidate_rows],
+                        scorer=self._batch_scorer,
+                        # Z premią katalogów kolejność ustalana jest po porównaniu
+                        limit=top_k if row_bias is None else None,
+                        score_cutoff=threshold or None,
+                    )
+                except Exception as e:
+                    raise MatchingError(f"Błąd podczas porównywania opisów: {str(e)}")
+
+                if row_bias is not None:
+                    matches = sorted(
+                        matches,
+                        key=lambda match: (
+                            -(match[1] + row_bias[candidate_rows[match[2]]]),
+                            match[2],
+                        ),
+                    )[:top_k]
+
+                for rank, (_, score, position) in enumerate(matches):
+                    best_indices[offset, rank] = candidate_rows[position]
+                    best_scores[offset, rank] = score
+
+            yield start, best_indices, best_scores
+
+    def measure_blocking_recall(
+        self,
+        wf_descriptions: List[Tuple[str, str]],
+        reference_index: ReferenceIndex,
+        threshold: int = 80,
+    ) -> Dict:
+        """
+        Porównuje wyniki z indeksem n-gramów z pełnym porównaniem (brute-force)
+
+        Args:
+            wf_descriptions: lista (opis, adres_komórki) z pliku WF
+            reference_index: indeks katalogu REF
+            threshold: próg podobieństwa
+
+        Returns:
+            Słownik z liczbą dopasowań obu metod i recall (udział dopasowań
+            brute-force odtworzonych z tym samym wynikiem)
+        """
+        wf_texts = reference_index.normalizer.normalize_many(
+            wf_desc for wf_desc, _ in wf_descriptions
+        )
+
+        def best_scores(use_blocking: bool) -> np.ndarray:
+            chunks = [
+                scores[:, 0]
+                for _, _, scores in self._iter_best_matches(
+                    wf_texts, reference_index, threshold, use_blocking=use_blocking
+                )
+            ]
+            return np.concatenate(chunks) if chunks else np.zeros(0)
+
+        exact_scores = best_scores(use_blocking=False)
+        blocked_scores = best_scores(use_blocking=True)
+
+        expected = exact_scores >= threshold
+        recovered = expected & np.isclose(blocked_scores, exact_scores)
+        return {
+            "brute_force_matches": int(expected.sum()),
+            "blocked_matches": int((blocked_scores >= threshold).sum()),
+            "recall": float(recovered.sum() / expected.sum()) if expected.any() else 1.0,
+        }
 
     def find_best_match(
         self,
@@ -34,75 +560,157 @@ class MatchingService:
         ref_prices: Dict[str, Decimal],
         ref_price_column: str,
         threshold: int,
+        top_k: int = 1,
     ) -> Optional[Dict]:
         """Znajduje najlepsze dopasowanie dla opisu z pliku WF
 
+        Próg oraz najsłabszy z dotychczas najlepszych wyników przekazywane są do scorera
+        jako score_cutoff - RapidFuzz przerywa liczenie kandydatów, którzy nie mają szans.
+        Katalog REF normalizowany jest raz - kolejne wywołania z tymi samymi opisami
+        REF korzystają z zapamiętanej postaci znormalizowanej (_normalized_ref_texts)
+        i słownika opisów identycznych (_exact_ref_lookup).
+
         Args:
             wf_description: (opis, adres_komórki) z pliku WF
             ref_descriptions: lista (opis, adres_komórki) z pliku REF
             ref_prices: słownik {adres_komórki: cena} z pliku REF
             threshold: próg podobieństwa (0-100)
+            top_k: liczba zwracanych kandydatów (kolejni trafiają do "alternatives")
 
         Returns:
             Dict z informacjami o najlepszym dopasowaniu lub None jeśli nie znaleziono
         """
-        print("DEBUG: *** find_best_match *** was called from the MatchingService")
-
         wf_desc, wf_cell = wf_description
-        best_match = None
-        best_score = -1
-
-        # Debugowanie - sprawdź co otrzymaliśmy
-        print(f"DEBUG: ref_price_column = {ref_price_column}")
-        print(
-            f"DEBUG: ref_prices keys = {list(ref_prices.keys())[:5]}"
-        )  # Pierwsze 5 kluczy
+        wf_text = self.normalizer.normalize(wf_desc)
+        ref_texts = self._normalized_ref_texts(ref_descriptions)
+        # Kopiec ograniczony do top_k elementów: (wynik, -pozycja, kandydat);
+        # na szczycie najsłabszy z zachowanych kandydatów
+        best_candidates: List[Tuple[float, int, MatchingCandidate]] = []
+
+        if top_k == 1 and wf_text:
+            # Opis skopiowany wprost z katalogu - bez liczenia wyników pozostałych opisów
+            exact_row = self._exact_ref_lookup(ref_descriptions).get(wf_text)
+            if exact_row is not None:
+                ref_desc, ref_cell = ref_descriptions[exact_row]
+                candidate = MatchingCandidate(
+                    description=ref_desc,
+                    cell_address=ref_cell,
+                    price=ref_prices.get(
+                        price_cell_for(ref_cell, ref_price_column), Decimal("0")
+                    ),
+                    match_score=self.EXACT_MATCH_SCORE,
+                )
+                return {
+                    **self._build_result(wf_desc, wf_cell, [candidate]),
+                    "exact_match": True,
+                }
 
         # szukamy najlepszego dopasowania
-        for ref_desc, ref_cell in ref_descriptions:
+        for position, (ref_desc, ref_cell) in enumerate(ref_descriptions):
             try:
-                # Obliczanie podobieństwa za pomocą RapidFuzz
-                score = self.matching_function(wf_desc, ref_desc)
-
-                # Wyciągamy numer wiersza z adresu komórki (np. '4' z 'C4')
-                # TODO: Zamienić na regular expressions ponieważ kolumny mogą być AA+
-                ref_row = ref_cell[1:]
+                # Kandydat musi przekroczyć próg i najsłabszy zachowany wynik
+                is_full = len(best_candidates) >= top_k
+                score_cutoff = (
+                    max(threshold, best_candidates[0][0]) if is_full else threshold
+                )
 
-                # Tworzymy adres komórki z ceną (np. 'E4')
-                price_cell = f"{ref_price_column}{ref_row}"
-
-                # Debugowanie - sprawdź konkretny klucz
-                if ref_desc == ref_descriptions[0][0]:  # tylko dla pierwszego elementu
-                    print(f"DEBUG: price_cell = {price_cell}")
-                    print(
-                        f"DEBUG: price_cell exists in ref_prices: {price_cell in ref_prices}"
-                    )
-
-                # Aktualizacja najlepszego dopasowania
-                if score > best_score:
-                    best_score = score
-                    best_match = MatchingCandidate(
-                        description=ref_desc,
-                        cell_address=ref_cell,
-                        # ref_prices: Dict[str, Decimal]
-                        price=ref_prices.get(price_cell, Decimal("0")),
-                        match_score=score,
-                    )
+                # Obliczanie podobieństwa za pomocą RapidFuzz
+                score = self._batch_scorer(
+                    wf_text, ref_texts[position], score_cutoff=score_cutoff
+                )
+
+                # Przy remisie wygrywa wcześniejszy wiersz REF
+                if score < threshold or (is_full and score <= best_candidates[0][0]):
+                    continue
+
+                # Tworzymy adres komórki z ceną (np. 'E4' dla 'C4')
+                price_cell = price_cell_for(ref_cell, ref_price_column)
+
+                candidate = MatchingCandidate(
+                    description=ref_desc,
+                    cell_address=ref_cell,
+                    # ref_prices: Dict[str, Decimal]
+                    price=ref_prices.get(price_cell, Decimal("0")),
+                    match_score=score,
+                )
+
+                # Aktualizacja najlepszych dopasowań
+                if is_full:
+                    heapq.heapreplace(best_candidates, (score, -position, candidate))
+                else:
+                    heapq.heappush(best_candidates, (score, -position, candidate))
 
             except Exception as e:
                 raise MatchingError(f"Błąd podczas porównywania opisów: {str(e)}")
 
-        if best_match and best_match.match_score >= threshold:
-            return {
-                "wf_description": wf_desc,
-                "wf_cell": wf_cell,
-                "ref_description": best_match.description,
-                "ref_cell": best_match.cell_address,
-                "match_score": best_match.match_score,
-                "price": best_match.price,
-            }
+        if not best_candidates:
+            return None
 
-        return None
+        ranked = [
+            candidate
+            for _, _, candidate in sorted(best_candidates, reverse=True)
+        ]
+        return self._build_result(wf_desc, wf_cell, ranked)
+
+    def _normalized_ref_texts(self, ref_descriptions: List[Tuple[str, str]]) -> List[str]:
+        """
+        Znormalizowane opisy REF dla find_best_match - liczone tylko przy zmianie
+        katalogu (porównanie krotek tych samych obiektów str kończy się na tożsamości)
+        """
+        return self._normalized_catalog(ref_descriptions)[1]
+
+    def _exact_ref_lookup(
+        self, ref_descriptions: List[Tuple[str, str]]
+    ) -> Dict[str, int]:
+        """Słownik {opis znormalizowany: pierwszy wiersz REF} dla find_best_match"""
+        return self._normalized_catalog(ref_descriptions)[2]
+
+    def _normalized_catalog(
+        self, ref_descriptions: List[Tuple[str, str]]
+    ) -> Tuple[Tuple[str, ...], List[str], Dict[str, int]]:
+        descriptions = tuple(desc for desc, _ in ref_descriptions)
+        cached = self._normalized_references
+        if cached is None or cached[0] != descriptions:
+            ref_texts = self.normalizer.normalize_many(descriptions)
+            exact_lookup: Dict[str, int] = {}
+            for row, text in enumerate(ref_texts):
+                if text:
+                    exact_lookup.setdefault(text, row)
+            cached = (descriptions, ref_texts, exact_lookup)
+            self._normalized_references = cached
+        return cached
+
+    @staticmethod
+    def _build_result(
+        wf_desc: str, wf_cell: str, candidates: List[MatchingCandidate]
+    ) -> Dict:
+        """Buduje słownik wyniku dla opisu WF z kandydatów uszeregowanych od najlepszego"""
+        best_match = candidates[0]
+        result = {
+            "wf_description": wf_desc,
+            "wf_cell": wf_cell,
+            "ref_description": best_match.description,
+            "ref_cell": best_match.cell_address,
+            "ref_sheet": best_match.sheet,
+            "ref_file_name": best_match.catalog,
+            "match_score": best_match.match_score,
+            "price": best_match.price,
+        }
+
+        if len(candidates) > 1:
+            result["alternatives"] = [
+                {
+                    "ref_description": candidate.description,
+                    "ref_cell": candidate.cell_address,
+                    "ref_sheet": candidate.sheet,
+                    "ref_file_name": candidate.catalog,
+                    "match_score": candidate.match_score,
+                    "price": candidate.price,
+                }
+                for candidate in candidates[1:]
+            ]
+
+        return result
 
     def process_descriptions(
         self,
@@ -111,6 +719,7 @@ class MatchingService:
         ref_prices: Dict[str, Decimal],
         ref_price_column: str,
         threshold: int = 80,
+        top_k: int = 1,
     ) -> List[Dict]:
         """
         Przetwarza wszystkie opisy i znajduje najlepsze dopasowania
@@ -121,39 +730,202 @@ class MatchingService:
             ref_prices: słownik {adres_komórki: cena} z pliku REF
             ref_price_column: kolumna, z której pochodzą ceny
             threshold: próg podobieństwa (domyślnie 80)
+            top_k: liczba kandydatów na wiersz WF (kolejni trafiają do "alternatives")
 
         Returns:
             Lista słowników z informacjami o dopasowaniach
         """
-        print("DEBUG: *** process_descriptions *** was called from the MatchingService")
+        reference_index = ReferenceIndex.from_excel_data(
+            ref_descriptions, ref_prices, ref_price_column, normalizer=self.normalizer
+        )
+        return self.match_reference_index(
+            wf_descriptions, reference_index, threshold, top_k
+        )
 
+    def match_reference_index(
+        self,
+        wf_descriptions: List[Tuple[str, str]],
+        reference_index: ReferenceIndex,
+        threshold: int = 80,
+        top_k: int = 1,
+        on_batch: Optional[Callable[[int, int, List[Dict]], None]] = None,
+        catalog_bias: Optional[Dict[str, float]] = None,
+    ) -> List[Dict]:
+        """
+        Dopasowuje opisy WF do zbudowanego indeksu REF
+
+        Każdy unikalny opis WF (po normalizacji) porównywany jest raz.
+        Opisy identyczne (po normalizacji) z opisem REF dopasowywane są ze słownika
+        z wynikiem 100 i oznaczane "exact_match" (tylko dla top_k = 1 - przy większym
+        top_k potrzebne są także alternatywy). Opisy zapamiętane w MatchCache
+        (ten sam katalog, scorer i próg) nie są porównywane ponownie; wyniki
+        pozostałych trafiają do pamięci.
+
+        Indeks może łączyć kilka katalogów REF - premia katalogu (catalog_bias)
+        dodawana jest do podobieństwa przy wyborze kandydatów, a przy remisie
+        wygrywa wcześniejszy katalog. Opis identyczny z opisem REF dopasowywany
+        jest ze słownika tylko w katalogach z najwyższą premią.
+
+        Args:
+            wf_descriptions: lista (opis, adres_komórki) z pliku WF
+            reference_index: indeks katalogu REF (opisy, ceny wyrównane do wierszy)
+            threshold: próg podobieństwa (domyślnie 80)
+            top_k: liczba kandydatów na wiersz WF (kolejni trafiają do "alternatives")
+            on_batch: wywoływana po każdym bloku wierszy WF z argumentami
+                (liczba przetworzonych wierszy, liczba wszystkich wierszy, wyniki bloku)
+            catalog_bias: premia punktowa katalogów {nazwa pliku REF: punkty}
+
+        Returns:
+            Lista słowników z informacjami o dopasowaniach
+        """
         results = []
+        if not wf_descriptions or not len(reference_index):
+            return results
 
-        for wf_desc in wf_descriptions:
-            match = self.find_best_match(
-                wf_desc, ref_descriptions, ref_prices, ref_price_column, threshold
-            )
-            if match:
-                results.append(match)
+        # Normalizacja katalogu (zapisana w indeksie) stosowana jest także do opisów WF
+        wf_texts = reference_index.normalizer.normalize_many(
+            wf_desc for wf_desc, _ in wf_descriptions
+        )
 
-        print(
-            f"DEBUG: AFTER for+in: ref_descriptions: {ref_descriptions} / ref_prices: {ref_prices} *** process_descriptions *** in matching_service"
+        # Dopasowania kolejnych wierszy WF (None - jeszcze nie policzone)
+        row_matches: List[Optional[RowMatches]] = [None] * len(wf_texts)
+
+        catalog_bias = catalog_bias or {}
+        row_bias = reference_index.row_score_bias(catalog_bias)
+
+        exact_rows = set()
+        if top_k == 1:
+            exact_catalogs = None
+            if row_bias is not None:
+                # Dopasowanie z katalogu o niższej premii mogłoby przegrać z premią
+                # innego katalogu - takie opisy porównywane są z całym indeksem
+                top_bias = row_bias.max()
+                exact_catalogs = frozenset(
+                    catalog
+                    for catalog in set(reference_index.catalogs)
+                    if catalog_bias.get(catalog, 0.0) == top_bias
+                )
+            exact_lookup = reference_index.get_exact_lookup(exact_catalogs)
+            for row, text in enumerate(wf_texts):
+                ref_row = exact_lookup.get(text)
+                if ref_row is not None:
+                    row_matches[row] = [(ref_row, self.EXACT_MATCH_SCORE)]
+                    exact_rows.add(row)
+        instrumentation.incr("exact_matches", len(exact_rows))
+
+        scope = self._cache_scope(
+            reference_index, threshold, top_k, row_bias, catalog_bias
         )
+        if scope:
+            cached = self.match_cache.get_many(
+                scope,
+                (text for row, text in enumerate(wf_texts) if row not in exact_rows),
+            )
+            for row, text in enumerate(wf_texts):
+                if row not in exact_rows and text in cached:
+                    row_matches[row] = cached[text]
+        missing_rows = [row for row, matches in enumerate(row_matches) if matches is None]
+        if scope:
+            instrumentation.incr(
+                "match_cache_hits", len(wf_texts) - len(exact_rows) - len(missing_rows)
+            )
+            instrumentation.incr("match_cache_misses", len(missing_rows))
+
+        resolved = 0
+
+        def emit_resolved() -> None:
+            """Buduje wyniki wierszy WF rozstrzygniętych bez przerwy od początku pliku"""
+            nonlocal resolved
+            block_start, previously_resolved = len(results), resolved
+            while resolved < len(row_matches) and row_matches[resolved] is not None:
+                if row_matches[resolved]:
+                    wf_desc, wf_cell = wf_descriptions[resolved]
+                    result = self._build_result(
+                        wf_desc,
+                        wf_cell,
+                        self._candidates(reference_index, row_matches[resolved]),
+                    )
+                    if resolved in exact_rows:
+                        result["exact_match"] = True
+                    results.append(result)
+                resolved += 1
+
+            instrumentation.incr("matches_above_threshold", len(results) - block_start)
+            if on_batch is not None and resolved > previously_resolved:
+                on_batch(resolved, len(wf_descriptions), results[block_start:])
+
+        emit_resolved()
+        if not missing_rows:
+            return results
+
+        # Powtórzone opisy (np. te same pozycje w kolejnych działach przedmiaru)
+        # porównywane są raz, a wynik trafia do wszystkich ich wierszy
+        rows_by_text: Dict[str, List[int]] = {}
+        for row in missing_rows:
+            rows_by_text.setdefault(wf_texts[row], []).append(row)
+        unique_texts = list(rows_by_text)
+        instrumentation.incr("wf_duplicate_rows", len(missing_rows) - len(unique_texts))
+
+        # Opisy spoza pamięci porównywane są ze wszystkimi opisami REF jako macierz
+        for start, best_indices, best_scores in self._iter_best_matches(
+            unique_texts, reference_index, threshold, top_k, row_bias=row_bias
+        ):
+            computed = {}
+            for offset, (indices, scores) in enumerate(zip(best_indices, best_scores)):
+                text = unique_texts[start + offset]
+                computed[text] = [
+                    (int(ref_row), float(score))
+                    for ref_row, score in zip(indices, scores)
+                    if score >= threshold
+                ]
+                for row in rows_by_text[text]:
+                    row_matches[row] = computed[text]
+
+            if scope:
+                self.match_cache.set_many(scope, computed)
+            emit_resolved()
+
+        if scope:
+            self.match_cache.prune()
         return results
 
-    def get_matching_statistics(self, results: List[Dict]) -> Dict:
+    @staticmethod
+    def _candidates(
+        reference_index: ReferenceIndex, matches: RowMatches
+    ) -> List[MatchingCandidate]:
+        return [
+            MatchingCandidate(
+                description=reference_index.descriptions[ref_row],
+                cell_address=reference_index.cells[ref_row],
+                price=reference_index.prices[ref_row],
+                match_score=score,
+                sheet=reference_index.sheets[ref_row],
+                catalog=reference_index.catalogs[ref_row],
+            )
+            for ref_row, score in matches
+        ]
+
+    def get_matching_statistics(
+        self, results: List[Dict], counters: Optional[Dict[str, int]] = None
+    ) -> Dict:
         """
         Oblicza statystyki dopasowań (przygotowane pod przyszłe rozszerzenia)
 
+        Udziały wierszy WF rozstrzygniętych bez porównania - opis identyczny z opisem
+        REF (exact_match_rate) oraz wynik skopiowany z wcześniejszego, identycznego
+        opisu WF (dedup_ratio) - liczone są z liczników zadania, zob. matching_rates.
+
         Args:
             results: Lista wyników dopasowania
+            counters: Liczniki zadania (domyślnie z bieżącego JobTrace)
 
         Returns:
             Słownik ze statystykami
         """
-        print(
-            "DEBUG: *** get_matching_statistics *** was called from the MatchingService"
-        )
+        if counters is None:
+            trace = instrumentation.current_trace()
+            counters = trace.summary()["counters"] if trace else {}
+        rates = matching_rates(counters)
 
         if not results:
             return {
@@ -161,6 +933,7 @@ class MatchingService:
                 "average_score": 0,
                 "min_score": 0,
                 "max_score": 0,
+                **rates,
             }
 
         scores = [r["match_score"] for r in results]
@@ -169,4 +942,5 @@ class MatchingService:
             "average_score": sum(scores) / len(scores),
             "min_score": min(scores),
             "max_score": max(scores),
+            **rates,
         }
@@ -0,0 +1,28 @@
+"""
+Punkty wejścia procesów roboczych puli zadań dopasowania.
+
+Moduł nie importuje modeli ani serwisów na poziomie modułu - proces uruchamiany
+metodą spawn importuje go przed django.setup().
+"""
+
+
+def init_worker() -> None:
+    """Inicjalizacja procesu roboczego - konfiguracja Django bez połączeń rodzica"""
+    import django
+    from django.db import connections
+
+    django.setup()
+    connections.close_all()
+
+
+def run_in_worker(session_id: int) -> str:
+    """Wykonuje zadanie dopasowania w procesie roboczym"""
+    from django.db import connections
+
+    from matching.services.matching_jobs import run_matching_job
+
+    try:
+        return run_matching_job(session_id)
+    finally:
+        # Proces roboczy żyje długo - nie trzyma połączenia z bazą między zadaniami
+        connections.close_all()
@@ -0,0 +1,360 @@
+import fcntl
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import uuid
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SIZE_BUCKETS = tuple(2**power for power in range(16, 29, 2))  # 64 KiB - 256 MiB
+
+logger = logging.getLogger(__name__)
+
+# Histogramy: nazwa -> (opis, granice przedziałów)
+HISTOGRAMS = {
+    "fastbidder_upload_size_bytes": ("Rozmiar przesłanych plików Excel", SIZE_BUCKETS),
+    "fastbidder_stage_duration_seconds": (
+        "Czas etapów zadania dopasowania (load - odczyt xlsx WF, "
+        "index - odczyt REF i budowa indeksu, writeback - zapis cen do WF, "
+        "report - raport)",
+        DURATION_BUCKETS,
+    ),
+    "fastbidder_match_seconds_per_1k_rows": (
+        "Czas dopasowania w przeliczeniu na 1000 wierszy WF",
+        DURATION_BUCKETS,
+    ),
+}
+# Liczniki: nazwa -> opis
+COUNTERS = {
+    "fastbidder_jobs_total": "Zakończone zadania dopasowania",
+    "fastbidder_failures_total": "Błędy dopasowania według typu wyjątku",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Suma migawek zakończonych procesów (liczniki Prometheus nie mogą maleć)
+RETIRED_SNAPSHOT = "retired.json"
+
+
+class MetricsRegistry:
+    """
+    Metryki procesu (histogramy i liczniki) z migawką w pliku JSON.
+
+    Każdy proces (serwer, procesy robocze puli zadań) zapisuje własną migawkę
+    w settings.MATCHING_METRICS_DIR, a endpoint /metrics sumuje migawki wszystkich
+    procesów. Nazwa pliku jest unikalna dla procesu, więc liczniki nie maleją
+    po ponownym użyciu numeru PID. Migawki zakończonych procesów są dołączane
+    do RETIRED_SNAPSHOT (collect), więc katalog nie rośnie z każdym procesem.
+    """
+
+    def __init__(self, metrics_dir: Optional[Path] = None):
+        self.metrics_dir = Path(metrics_dir or settings.MATCHING_METRICS_DIR)
+        self.pid = os.getpid()
+        self.snapshot_path = (
+            self.metrics_dir / f"{self.pid}-{uuid.uuid4().hex[:8]}.json"
+        )
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, Dict[LabelKey, Dict]] = {
+            name: {} for name in HISTOGRAMS
+        }
+        self.counters: Dict[str, Dict[LabelKey, float]] = {
+            name: {} for name in COUNTERS
+        }
+
+    @staticmethod
+    def _label_key(labels: Dict[str, str]) -> LabelKey:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        buckets = HISTOGRAMS[name][1]
+        with self._lock:
+            series = self.histograms[name].setdefault(
+                self._label_key(labels),
+                {"buckets": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0},
+            )
+            # Ostatni przedział to +Inf; liczniki przedziałów nie są skumulowane
+            series["buckets"][bisect_left(buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        with self._lock:
+            series = self.counters[name]
+            key = self._label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "histograms": {
+                    name: [[list(key), data] for key, data in series.items()]
+                    for name, series in self.histograms.items()
+                },
+                "counters": {
+                    name: [[list(key), value] for key, value in series.items()]
+                    for name, series in self.counters.items()
+                },
+            }
+
+    def merge(self, snapshot: Dict) -> None:
+        """Dodaje migawkę innego procesu do rejestru"""
+        for name, series in snapshot.get("histograms", {}).items():
+            if name not in self.histograms:
+                continue
+            for key, data in series:
+                target = self.histograms[name].setdefault(
+                    tuple(map(tuple, key)),
+                    {"buckets": [0] * len(data["buckets"]), "sum": 0.0, "count": 0},
+                )
+                target["buckets"] = [
+                    total + count
+                    for total, count in zip(target["buckets"], data["buckets"])
+                ]
+                target["sum"] += data["sum"]
+                target["count"] += data["count"]
+
+        for name, series in snapshot.get("counters", {}).items():
+            if name not in self.counters:
+                continue
+            for key, value in series:
+                label_key = tuple(map(tuple, key))
+                self.counters[name][label_key] = (
+                    self.counters[name].get(label_key, 0) + value
+                )
+
+    def flush(self) -> None:
+        """Zapisuje migawkę procesu (atomowo - czytelnik nie zobaczy niepełnego pliku)"""
+        try:
+            _write_snapshot(self.metrics_dir, self.snapshot_path, self.snapshot())
+        except OSError:
+            # Metryki nie mogą przerwać żądania ani zadania
+            logger.warning("Nie udało się zapisać migawki metryk", exc_info=True)
+
+
+def _write_snapshot(metrics_dir: Path, path: Path, snapshot: Dict) -> None:
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temp_path = tempfile.mkstemp(dir=metrics_dir, suffix=".tmp")
+    with os.fdopen(file_descriptor, "w") as destination:
+        json.dump(snapshot, destination)
+    os.replace(temp_path, path)
+
+
+def _read_snapshot(path: Path) -> Optional[Dict]:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        # Plik usunięty lub zapisywany w tej chwili - pominięty do kolejnego odczytu
+        return None
+
+
+def _snapshot_pid(path: Path) -> Optional[int]:
+    """PID procesu z nazwy migawki "<pid>-<token>.json" (None dla RETIRED_SNAPSHOT)"""
+    pid, separator, _ = path.stem.partition("-")
+    return int(pid) if separator and pid.isdigit() else None
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_registry: Optional[MetricsRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> MetricsRegistry:
+    """Rejestr bieżącego procesu (nowy po fork - proces potomny ma własną migawkę)"""
+    global _registry
+    with _registry_lock:
+        if _registry is None or _registry.pid != os.getpid():
+            _registry = MetricsRegistry()
+        return _registry
+
+
+def record_upload(size: int) -> None:
+    registry = get_registry()
+    registry.observe("fastbidder_upload_size_bytes", size)
+    registry.flush()
+
+
+def record_failure(exception: Exception, phase: str) -> None:
+    """
+    Args:
+        exception: Wyjątek, który przerwał żądanie lub zadanie
+        phase: "submit" (odrzucenie żądania) lub "job" (błąd zadania)
+    """
+    registry = get_registry()
+    registry.inc(
+        "fastbidder_failures_total",
+        exception_type=type(exception).__name__,
+        phase=phase,
+    )
+    registry.flush()
+
+
+def record_job(
+    summary: Dict, engine: str, status: str, exception: Optional[Exception] = None
+) -> None:
+    """
+    Zapisuje pomiary zakończonego zadania (JobTrace.summary).
+
+    Args:
+        summary: Czasy etapów i liczniki zadania
+        engine: Silnik dopasowania
+        status: Końcowy status sesji
+        exception: Wyjątek, który przerwał zadanie
+    """
+    registry = get_registry()
+    for stage, seconds in summary["spans"].items():
+        registry.observe(
+            "fastbidder_stage_duration_seconds", seconds, stage=stage, engine=engine
+        )
+
+    wf_rows = summary["counters"].get("wf_rows_read", 0)
+    if wf_rows and "match" in summary["spans"]:
+        registry.observe(
+            "fastbidder_match_seconds_per_1k_rows",
+            summary["spans"]["match"] * 1000 / wf_rows,
+            engine=engine,
+        )
+
+    registry.inc("fastbidder_jobs_total", engine=engine, status=status)
+    if exception is not None:
+        registry.inc(
+            "fastbidder_failures_total",
+            exception_type=type(exception).__name__,
+            phase="job",
+        )
+    registry.flush()
+
+
+def _retire_dead_snapshots(metrics_dir: Path) -> None:
+    """
+    Dołącza migawki zakończonych procesów do RETIRED_SNAPSHOT i usuwa ich pliki.
+
+    Nazwy dołączonych plików są zapisywane w sumie, więc przerwanie przed
+    usunięciem migawki nie doliczy jej drugi raz. Ponowne użycie PID przez inny
+    proces jedynie opóźnia dołączenie migawki.
+    """
+    retired_path = metrics_dir / RETIRED_SNAPSHOT
+    retired_snapshot = {"retired": []}
+    if retired_path.exists():
+        retired_snapshot = _read_snapshot(retired_path)
+        if retired_snapshot is None:
+            # Uszkodzona suma - migawki zostają na miejscu do wyjaśnienia
+            logger.warning("Nie udało się odczytać %s", retired_path)
+            return
+
+    already_retired = set(retired_snapshot.get("retired", []))
+    retired = MetricsRegistry(metrics_dir)
+    retired.merge(retired_snapshot)
+    folded = []
+    for path in sorted(metrics_dir.glob("*.json")):
+        pid = _snapshot_pid(path)
+        if pid is None or _process_alive(pid) or path.name in already_retired:
+            continue
+        snapshot = _read_snapshot(path)
+        if snapshot is not None:
+            retired.merge(snapshot)
+            folded.append(path)
+
+    existing = {path.name for path in metrics_dir.glob("*.json")}
+    names = sorted((already_retired & existing) | {path.name for path in folded})
+    if not folded and names == sorted(already_retired):
+        return
+    _write_snapshot(metrics_dir, retired_path, {**retired.snapshot(), "retired": names})
+    for path in folded:
+        path.unlink(missing_ok=True)
+
+
+def collect(metrics_dir: Optional[Path] = None) -> MetricsRegistry:
+    """
+    Sumuje migawki wszystkich procesów w jeden rejestr.
+
+    Migawki zakończonych procesów są najpierw dołączane do RETIRED_SNAPSHOT.
+    Blokada pliku chroni przed podwójnym dołączeniem przez równoległe odczyty
+    /metrics (kilka procesów serwera) i przed odczytem w trakcie dołączania.
+    """
+    merged = MetricsRegistry(metrics_dir)
+    merged.metrics_dir.mkdir(parents=True, exist_ok=True)
+    with open(merged.metrics_dir / f"{RETIRED_SNAPSHOT}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            _retire_dead_snapshots(merged.metrics_dir)
+        except OSError:
+            logger.warning("Nie udało się dołączyć migawek metryk", exc_info=True)
+
+        retired = set()
+        snapshots = sorted(merged.metrics_dir.glob("*.json"))
+        for path in snapshots:
+            if path.name == RETIRED_SNAPSHOT:
+                retired = set((_read_snapshot(path) or {}).get("retired", []))
+        for path in snapshots:
+            if path.name in retired:
+                continue
+            snapshot = _read_snapshot(path)
+            if snapshot is not None:
+                merged.merge(snapshot)
+    return merged
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in labels]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(
+    registry: MetricsRegistry, gauges: Dict[str, Tuple[str, float]]
+) -> str:
+    """
+    Format tekstowy Prometheus (text/plain; version=0.0.4).
+
+    Args:
+        registry: Zsumowane metryki procesów
+        gauges: Wartości chwilowe {nazwa: (opis, wartość)}, np. głębokość kolejki
+    """
+    lines: List[str] = []
+    for name, (description, value) in gauges.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} gauge"]
+        lines.append(f"{name} {_format_value(value)}")
+
+    for name, description in COUNTERS.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+        for key, value in sorted(registry.counters[name].items()):
+            lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+        for key, data in sorted(registry.histograms[name].items()):
+            cumulative = 0
+            for bound, count in zip((*buckets, math.inf), data["buckets"]):
+                cumulative += count
+                labels = _format_labels((*key, ("le", _format_value(float(bound)))))
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            labels = _format_labels(key)
+            lines.append(f"{name}_sum{labels} {_format_value(data['sum'])}")
+            lines.append(f"{name}_count{labels} {data['count']}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,150 @@
+import cProfile
+import contextvars
+import pstats
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, List, Optional
+
+from django.conf import settings
+
+
+class StackSampler:
+    """
+    Próbkuje stosy wywołań wątku zadania (oraz wątków uruchomionych w jego trakcie,
+    np. puli TF-IDF) i zlicza je w formacie "collapsed stacks" (flamegraph.pl, speedscope).
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._target_thread = threading.get_ident()
+        self._existing_threads = set(sys._current_frames()) - {self._target_thread}
+        self._thread = threading.Thread(
+            target=self._run, name="matching-stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        sampler_thread = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in self._existing_threads or thread_id == sampler_thread:
+                    continue
+                self.stacks[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{Path(code.co_filename).name}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def write(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as destination:
+            for stack, count in self.stacks.most_common():
+                destination.write(f"{stack} {count}\n")
+
+
+# Profiler bieżącego zadania - widoczny w wątkach uruchamianych z kopią kontekstu
+_current_profiler: contextvars.ContextVar[Optional["JobProfiler"]] = (
+    contextvars.ContextVar("matching_job_profiler", default=None)
+)
+
+
+class JobProfiler:
+    """
+    Profilowanie zadania dopasowania: cProfile (plik .pstats) oraz próbkowanie
+    stosów (plik .collapsed dla flamegraph). Używane jako context manager
+    wokół process_matching_request.
+
+    cProfile widzi tylko wątek, w którym go włączono - praca zlecana wątkom
+    (arkusze WF, bloki TF-IDF) uruchamiana jest przez run_profiled z osobnym
+    profilem wątku, a profile wątków dołączane są do pliku .pstats przy zapisie.
+    """
+
+    def __init__(self, sample_interval: Optional[float] = None):
+        """
+        Args:
+            sample_interval: Odstęp próbkowania stosów w sekundach
+                (domyślnie settings.MATCHING_PROFILE_SAMPLE_INTERVAL)
+        """
+        self.profile = cProfile.Profile()
+        self.sampler = StackSampler(
+            sample_interval or settings.MATCHING_PROFILE_SAMPLE_INTERVAL
+        )
+        self.thread_profiles: List[cProfile.Profile] = []
+        self._thread_profiles_lock = threading.Lock()
+        self._thread_id: Optional[int] = None
+
+    def __enter__(self) -> "JobProfiler":
+        self._thread_id = threading.get_ident()
+        self._token = _current_profiler.set(self)
+        self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.profile.disable()
+        self.sampler.stop()
+        _current_profiler.reset(self._token)
+
+    def run_in_thread(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Wywołuje funkcję pod osobnym profilem bieżącego wątku"""
+        if threading.get_ident() == self._thread_id:
+            # Wątek zadania profilowany jest już przez self.profile
+            return function(*args)
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return function(*args)
+        finally:
+            profile.disable()
+            with self._thread_profiles_lock:
+                self.thread_profiles.append(profile)
+
+    def save(self, directory: Path, name: str) -> str:
+        """
+        Zapisuje profil w katalogu (profil wątku zadania razem z profilami wątków).
+
+        Returns:
+            str: Ścieżka do pliku .pstats (plik .collapsed ma tę samą nazwę)
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        pstats_path = directory / f"{name}.pstats"
+        stats = pstats.Stats(self.profile)
+        for profile in self.thread_profiles:
+            stats.add(profile)
+        stats.dump_stats(pstats_path)
+        self.sampler.write(collapsed_path_for(pstats_path))
+        return str(pstats_path)
+
+
+def run_profiled(function: Callable[..., Any], *args: Any) -> Any:
+    """
+    Wywołuje funkcję w wątku puli - pod profilem wątku, jeśli zadanie jest
+    profilowane (wątek musi działać w kopii kontekstu zadania)
+    """
+    profiler = _current_profiler.get()
+    if profiler is None:
+        return function(*args)
+    return profiler.run_in_thread(function, *args)
+
+
+def collapsed_path_for(pstats_path) -> Path:
+    """Plik stosów zapisany obok pliku .pstats"""
+    return Path(pstats_path).with_suffix(".collapsed")
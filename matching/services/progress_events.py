@@ -0,0 +1,121 @@
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class MatchingProgress:
+    """
+    Odbiorca postępu zadania dopasowania. Domyślna implementacja nic nie robi -
+    orchestrator uruchomiony poza zadaniem w tle nie publikuje zdarzeń.
+    """
+
+    def stage(self, name: str, **details: Any) -> None:
+        """Rozpoczęcie etapu (validate, load, extract, index, match, write)"""
+
+    def matches(self, rows_done: int, rows_total: int, results: List[Dict]) -> None:
+        """Postęp dopasowania oraz paczka gotowych wyników"""
+
+    def finish(self, status: str, **details: Any) -> None:
+        """Zakończenie zadania (COMPLETED / ERROR)"""
+
+
+class ProgressEventLog(MatchingProgress):
+    """
+    Zdarzenia postępu zadania zapisywane jako NDJSON w pliku sesji.
+    Plik jest kanałem między procesem roboczym a widokiem strumieniującym zdarzenia -
+    każda linia to jedno zdarzenie z kolejnym numerem "seq".
+    """
+
+    TERMINAL_EVENT = "finished"
+
+    def __init__(self, session_id: int, events_dir: Optional[Path] = None):
+        self.path = self.path_for(session_id, events_dir)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Zadanie wykonywane jest raz - poprzednie zdarzenia sesji są nadpisywane
+        self.path.write_bytes(b"")
+        self.seq = 0
+
+    @staticmethod
+    def path_for(session_id: int, events_dir: Optional[Path] = None) -> Path:
+        return Path(events_dir or settings.MATCHING_EVENTS_DIR) / f"{session_id}.ndjson"
+
+    def emit(self, event_type: str, **data: Any) -> None:
+        """Dopisuje zdarzenie (cała linia jednym zapisem, od razu widoczna dla czytelników)"""
+        self.seq += 1
+        event = {"seq": self.seq, "type": event_type, "time": time.time(), **data}
+        line = json.dumps(event, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+        with open(self.path, "ab") as destination:
+            destination.write(line.encode("utf-8"))
+
+    def stage(self, name: str, **details: Any) -> None:
+        self.emit("stage", stage=name, **details)
+
+    def matches(self, rows_done: int, rows_total: int, results: List[Dict]) -> None:
+        self.emit(
+            "progress", stage="match", rows_done=rows_done, rows_total=rows_total
+        )
+        if results:
+            self.emit("matches", results=results)
+
+    def finish(self, status: str, **details: Any) -> None:
+        self.emit(self.TERMINAL_EVENT, status=status, **details)
+
+
+def follow_events(
+    session_id: int,
+    is_finished: Callable[[], bool],
+    after: int = 0,
+    poll_interval: Optional[float] = None,
+    timeout: Optional[float] = None,
+    events_dir: Optional[Path] = None,
+) -> Iterator[Optional[Dict]]:
+    """
+    Czyta zdarzenia sesji na bieżąco, dopóki zadanie się nie zakończy.
+
+    Args:
+        session_id: Identyfikator MatchingSession
+        is_finished: Sprawdza, czy zadanie zakończyło się (także awarią procesu)
+        after: Numer ostatniego odebranego zdarzenia (wznowienie strumienia)
+        poll_interval: Odstęp między sprawdzeniami pliku w sekundach
+        timeout: Maksymalny czas strumienia w sekundach
+        events_dir: Katalog zdarzeń (domyślnie settings.MATCHING_EVENTS_DIR)
+
+    Yields:
+        Zdarzenie lub None, gdy w danym odstępie nic nie przyszło (np. dla keep-alive)
+    """
+    poll_interval = poll_interval or settings.MATCHING_EVENTS_POLL_INTERVAL
+    deadline = time.monotonic() + (timeout or settings.MATCHING_EVENTS_STREAM_TIMEOUT)
+    path = ProgressEventLog.path_for(session_id, events_dir)
+    position = 0
+
+    while time.monotonic() < deadline:
+        # Status sprawdzany przed odczytem - zdarzenia zapisane przed końcem zadania nie przepadną
+        finished = is_finished()
+        received = False
+
+        if path.exists():
+            with open(path, "rb") as source:
+                source.seek(position)
+                chunk = source.read()
+            # Niedokończona ostatnia linia zostanie odczytana przy kolejnym sprawdzeniu
+            complete = chunk[: chunk.rfind(b"\n") + 1]
+            position += len(complete)
+
+            for line in complete.splitlines():
+                event = json.loads(line)
+                if event["seq"] <= after:
+                    continue
+                received = True
+                yield event
+                if event["type"] == ProgressEventLog.TERMINAL_EVENT:
+                    return
+
+        if finished:
+            return
+        if not received:
+            yield None
+        time.sleep(poll_interval)
@@ -0,0 +1,41 @@
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List
+
+from matching.services.sheet_config import SheetConfig
+
+
+@dataclass
+class ReferenceCatalog:
+    """
+    Katalog cen REF w zadaniu dopasowania - plik, jego arkusze i premia punktowa.
+
+    Premia (score_bias) dodawana jest do podobieństwa tylko przy wyborze najlepszych
+    kandydatów (np. +5 dla własnego cennika, -5 dla notowań rynkowych); próg
+    i raportowane podobieństwo dotyczą podobieństwa bez premii. Przy równym
+    wyniku wygrywa katalog podany wcześniej.
+    """
+
+    file_path: Path
+    sheets: List[SheetConfig]
+    score_bias: float = 0.0
+
+    @property
+    def name(self) -> str:
+        """Nazwa katalogu w wynikach (nazwa pliku REF)"""
+        return Path(self.file_path).name
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "file_path": str(self.file_path),
+            "sheets": [asdict(sheet) for sheet in self.sheets],
+            "score_bias": self.score_bias,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ReferenceCatalog":
+        return cls(
+            file_path=Path(data["file_path"]),
+            sheets=[SheetConfig.from_dict(sheet) for sheet in data["sheets"]],
+            score_bias=data.get("score_bias", 0.0),
+        )
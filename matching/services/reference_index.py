@@ -0,0 +1,463 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from matching.exceptions import MatchingError
+from matching.services.candidate_index import NgramCandidateIndex
+from matching.services.reference_catalog import ReferenceCatalog
+from matching.services.sheet_config import SheetConfig
+from matching.services.text_normalizer import TextNormalizer
+
+# Adres komórki w formacie "C4" / "AB12" -> (kolumna, wiersz)
+CELL_ADDRESS_PATTERN = re.compile(r"^([A-Z]+)(\d+)$")
+
+# Separator opisów w zapisie binarnym (znak NUL nie występuje w komórkach Excela)
+_STRING_SEPARATOR = "\0"
+
+# Dane arkusza REF: (nazwa arkusza, lista (opis, adres_komórki), ceny {adres: cena},
+# kolumna cen); nazwa "" oznacza aktywny arkusz
+SheetData = Tuple[str, List[Tuple[str, str]], Dict[str, Decimal], str]
+# Dane katalogu REF: (nazwa katalogu, dane kolejnych arkuszy)
+CatalogData = Tuple[str, List[SheetData]]
+
+
+def price_cell_for(ref_cell: str, ref_price_column: str) -> str:
+    """Zwraca adres komórki z ceną dla wiersza komórki REF (np. 'C4' -> 'E4')"""
+    match = CELL_ADDRESS_PATTERN.match(ref_cell)
+    ref_row = match.group(2) if match else ref_cell[1:]
+    return f"{ref_price_column}{ref_row}"
+
+
+@dataclass
+class ReferenceIndex:
+    """
+    Zbudowany katalog cen REF - opisy, ich postać znormalizowana, cechy dla scorera
+    oraz ceny, arkusze i katalogi wyrównane do wierszy (wiersz i -> prices[i],
+    sheets[i], catalogs[i]). Jeden indeks może łączyć kilka katalogów REF.
+    """
+
+    key: Optional[str]
+    file_name: str
+    descriptions: List[str]
+    cells: List[str]
+    normalized_descriptions: List[str]
+    prices: List[Decimal]
+    features: Dict[str, np.ndarray] = field(default_factory=dict)
+    # Arkusz każdego wiersza ("" - aktywny arkusz)
+    sheets: List[str] = field(default_factory=list)
+    # Katalog (nazwa pliku REF) każdego wiersza
+    catalogs: List[str] = field(default_factory=list)
+    # Normalizacja, którą zbudowano normalized_descriptions (stosowana też do opisów WF)
+    normalizer: TextNormalizer = field(
+        default_factory=TextNormalizer.from_settings, repr=False, compare=False
+    )
+    _candidate_index: Optional[NgramCandidateIndex] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    # Słowniki opisów identycznych {katalogi (None - wszystkie): słownik}
+    _exact_lookups: Dict[Optional[frozenset], Dict[str, int]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    # Modele silników dopasowania zbudowane dla tego katalogu (tylko w pamięci)
+    _engine_models: Dict[str, Any] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _engine_lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+
+    def __len__(self) -> int:
+        return len(self.descriptions)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Indeks przekazywany jest do procesów roboczych (sharding) bez blokady
+        # i struktur budowanych na żądanie - proces buduje je sam
+        state = self.__dict__.copy()
+        for name in (
+            "_candidate_index",
+            "_exact_lookups",
+            "_engine_models",
+            "_engine_lock",
+        ):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._candidate_index = None
+        self._exact_lookups = {}
+        self._engine_models = {}
+        self._engine_lock = threading.Lock()
+
+    def get_candidate_index(self) -> NgramCandidateIndex:
+        """Indeks n-gramów opisów REF (wczytany z cech indeksu lub zbudowany na żądanie)"""
+        # Arkusze WF dopasowywane są równolegle - indeks budowany jest raz
+        with self._engine_lock:
+            if self._candidate_index is None:
+                if "ngram_keys" in self.features:
+                    self._candidate_index = NgramCandidateIndex.from_features(
+                        self.features, len(self)
+                    )
+                else:
+                    self._candidate_index = NgramCandidateIndex.build(
+                        self.normalized_descriptions
+                    )
+                    self.features.update(self._candidate_index.to_features())
+            return self._candidate_index
+
+    def get_exact_lookup(self, catalogs: Optional[frozenset] = None) -> Dict[str, int]:
+        """Słownik {opis znormalizowany: pierwszy wiersz REF} (budowany na żądanie)
+
+        Args:
+            catalogs: tylko wiersze z tych katalogów (None - wszystkie wiersze)
+        """
+        with self._engine_lock:
+            if catalogs not in self._exact_lookups:
+                lookup: Dict[str, int] = {}
+                for row, text in enumerate(self.normalized_descriptions):
+                    if text and (catalogs is None or self.catalogs[row] in catalogs):
+                        lookup.setdefault(text, row)
+                self._exact_lookups[catalogs] = lookup
+            return self._exact_lookups[catalogs]
+
+    def row_score_bias(self, catalog_bias: Dict[str, float]) -> Optional[np.ndarray]:
+        """Premia punktowa kolejnych wierszy REF według premii ich katalogów
+
+        Returns:
+            Tablica float64 wyrównana do wierszy lub None, gdy premie są równe
+            (kolejność kandydatów się nie zmienia)
+        """
+        if len(set(catalog_bias.get(name, 0.0) for name in set(self.catalogs))) <= 1:
+            return None
+        return np.fromiter(
+            (catalog_bias.get(name, 0.0) for name in self.catalogs),
+            dtype=np.float64,
+            count=len(self.catalogs),
+        )
+
+    def get_engine_model(self, engine_name: str, builder: Callable[[], Any]) -> Any:
+        """Zwraca model silnika dopasowania dla katalogu, budując go przy pierwszym użyciu"""
+        with self._engine_lock:
+            if engine_name not in self._engine_models:
+                self._engine_models[engine_name] = builder()
+            return self._engine_models[engine_name]
+
+    @classmethod
+    def from_excel_data(
+        cls,
+        ref_descriptions: List[Tuple[str, str]],
+        ref_prices: Dict[str, Decimal],
+        ref_price_column: str,
+        key: Optional[str] = None,
+        file_name: str = "",
+        normalizer: Optional[TextNormalizer] = None,
+    ) -> "ReferenceIndex":
+        """Buduje indeks z danych odczytanych przez ExcelProcessor
+
+        Args:
+            ref_descriptions: lista (opis, adres_komórki) z pliku REF
+            ref_prices: słownik {adres_komórki: cena} z pliku REF
+            ref_price_column: kolumna, z której pochodzą ceny
+            key: klucz indeksu (hash pliku + konfiguracja), None dla indeksu tymczasowego
+            file_name: nazwa pliku REF
+            normalizer: normalizacja opisów (domyślnie z ustawień)
+        """
+        return cls.from_catalogs(
+            [(file_name, [("", ref_descriptions, ref_prices, ref_price_column)])],
+            key=key,
+            normalizer=normalizer,
+        )
+
+    @classmethod
+    def from_catalogs(
+        cls,
+        catalogs: List[CatalogData],
+        key: Optional[str] = None,
+        normalizer: Optional[TextNormalizer] = None,
+    ) -> "ReferenceIndex":
+        """Buduje jeden indeks z arkuszy jednego lub kilku katalogów REF
+        (wiersze kolejnych katalogów i arkuszy po sobie)
+
+        Args:
+            catalogs: dane kolejnych katalogów (CatalogData)
+            key: klucz indeksu (hash plików + konfiguracja), None dla indeksu tymczasowego
+            normalizer: normalizacja opisów (domyślnie z ustawień)
+        """
+        normalizer = normalizer or TextNormalizer.from_settings()
+        descriptions, cells, prices, sheet_names, catalog_names = [], [], [], [], []
+        for catalog, sheets in catalogs:
+            for sheet, ref_descriptions, ref_prices, ref_price_column in sheets:
+                for desc, cell in ref_descriptions:
+                    descriptions.append(desc)
+                    cells.append(cell)
+                    prices.append(
+                        ref_prices.get(
+                            price_cell_for(cell, ref_price_column), Decimal("0")
+                        )
+                    )
+                    sheet_names.append(sheet)
+                    catalog_names.append(catalog)
+
+        normalized = normalizer.normalize_many(descriptions)
+        candidate_index = NgramCandidateIndex.build(normalized)
+
+        return cls(
+            key=key,
+            file_name=", ".join(catalog for catalog, _ in catalogs),
+            descriptions=descriptions,
+            cells=cells,
+            normalized_descriptions=normalized,
+            prices=prices,
+            sheets=sheet_names,
+            catalogs=catalog_names,
+            features={
+                "lengths": np.fromiter(
+                    (len(desc) for desc in normalized), dtype=np.int32, count=len(normalized)
+                ),
+                **candidate_index.to_features(),
+            },
+            normalizer=normalizer,
+        )
+
+
+class ReferenceIndexStore:
+    """
+    Trwały magazyn indeksów REF na dysku (format .npz).
+    Klucz indeksu to hash zawartości pliku REF, konfiguracja kolumn i zakresu
+    oraz sygnatura normalizacji opisów, więc zmiana katalogu lub konfiguracji
+    automatycznie wymusza przebudowę. Indeks kilku katalogów ma klucz złożony
+    z kluczy katalogów (w kolejności zadania).
+    """
+
+    FORMAT_VERSION = 4
+    MAX_MEMORY_ENTRIES = 4
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    # Ostatnio używane indeksy współdzielone w obrębie procesu {klucz: indeks}
+    _memory_cache: "OrderedDict[str, ReferenceIndex]" = OrderedDict()
+    _memory_lock = threading.Lock()
+
+    def __init__(
+        self,
+        index_dir: Optional[Path] = None,
+        normalizer: Optional[TextNormalizer] = None,
+    ):
+        self.index_dir = Path(index_dir or settings.REFERENCE_INDEX_DIR)
+        self.normalizer = normalizer or TextNormalizer.from_settings()
+
+    @classmethod
+    def file_digest(cls, file_path: Path) -> str:
+        """Zwraca hash SHA-256 zawartości pliku"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as source:
+            for chunk in iter(lambda: source.read(cls.HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def build_key(
+        cls,
+        file_path: Path,
+        sheets: List[SheetConfig],
+        normalizer_signature: str = "",
+    ) -> str:
+        """Klucz indeksu: hash zawartości pliku REF + konfiguracja arkuszy (kolumny,
+        zakresy) i normalizacji opisów"""
+        config = json.dumps(
+            {
+                "format": cls.FORMAT_VERSION,
+                "normalizer": normalizer_signature,
+                "sheets": [
+                    {
+                        "sheet": sheet.sheet,
+                        "description_column": sheet.description_column,
+                        "description_range": [
+                            str(sheet.description_range["start"]),
+                            str(sheet.description_range["end"]),
+                        ],
+                        "price_column": sheet.price_column,
+                    }
+                    for sheet in sheets
+                ],
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(
+            f"{cls.file_digest(file_path)}:{config}".encode("utf-8")
+        ).hexdigest()
+
+    def build_catalogs_key(self, catalogs: List[ReferenceCatalog]) -> str:
+        """Klucz indeksu katalogów REF (dla jednego katalogu - klucz jego pliku)"""
+        keys = [
+            self.build_key(
+                catalog.file_path,
+                catalog.sheets,
+                normalizer_signature=self.normalizer.signature,
+            )
+            for catalog in catalogs
+        ]
+        if len(keys) == 1:
+            return keys[0]
+        return hashlib.sha256(":".join(keys).encode("utf-8")).hexdigest()
+
+    def get_or_build(
+        self,
+        catalogs: List[ReferenceCatalog],
+        builder: Callable[
+            [ReferenceCatalog], List[Tuple[List[Tuple[str, str]], Dict[str, Decimal]]]
+        ],
+    ) -> ReferenceIndex:
+        """Zwraca indeks z pamięci/dysku lub buduje go, wywołując builder
+
+        Args:
+            catalogs: Katalogi REF (pliki i konfiguracja arkuszy - kolumny opisów
+                i cen, zakresy) w kolejności zadania
+            builder: Funkcja zwracająca (opisy, ceny) kolejnych arkuszy katalogu
+
+        Returns:
+            ReferenceIndex: Gotowy indeks katalogów
+        """
+        key = self.build_catalogs_key(catalogs)
+
+        index = self.load(key)
+        if index is None:
+            index = ReferenceIndex.from_catalogs(
+                [
+                    (
+                        catalog.name,
+                        [
+                            (
+                                sheet.label,
+                                ref_descriptions,
+                                ref_prices,
+                                sheet.price_column,
+                            )
+                            for sheet, (ref_descriptions, ref_prices) in zip(
+                                catalog.sheets, builder(catalog)
+                            )
+                        ],
+                    )
+                    for catalog in catalogs
+                ],
+                key=key,
+                normalizer=self.normalizer,
+            )
+            self.save(index)
+
+        return index
+
+    def _index_path(self, key: str) -> Path:
+        return self.index_dir / f"{key}.npz"
+
+    def load(self, key: str) -> Optional[ReferenceIndex]:
+        """Wczytuje indeks o podanym kluczu lub zwraca None, gdy go nie ma"""
+        with self._memory_lock:
+            if key in self._memory_cache:
+                self._memory_cache.move_to_end(key)
+                return self._memory_cache[key]
+
+        index_path = self._index_path(key)
+        if not index_path.exists():
+            return None
+
+        try:
+            with np.load(index_path, allow_pickle=False) as data:
+                if int(data["format_version"]) != self.FORMAT_VERSION:
+                    return None
+
+                index = ReferenceIndex(
+                    key=key,
+                    file_name=str(data["file_name"]),
+                    descriptions=self._unpack_strings(data["descriptions"]),
+                    cells=self._unpack_strings(data["cells"]),
+                    normalized_descriptions=self._unpack_strings(
+                        data["normalized_descriptions"]
+                    ),
+                    prices=[
+                        Decimal(price) for price in self._unpack_strings(data["prices"])
+                    ],
+                    sheets=self._unpack_strings(data["sheets"]),
+                    catalogs=self._unpack_strings(data["catalogs"]),
+                    features={
+                        name[len("feature_") :]: data[name]
+                        for name in data.files
+                        if name.startswith("feature_")
+                    },
+                    normalizer=self.normalizer,
+                )
+        except (OSError, KeyError, ValueError):
+            # Uszkodzony plik indeksu - zostanie zbudowany ponownie
+            return None
+
+        self._remember(index)
+        return index
+
+    def save(self, index: ReferenceIndex) -> None:
+        """Zapisuje indeks na dysk (zapis atomowy przez plik tymczasowy)"""
+        if index.key is None:
+            raise MatchingError("Nie można zapisać indeksu REF bez klucza")
+
+        try:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            file_descriptor, temp_path = tempfile.mkstemp(
+                dir=self.index_dir, suffix=".npz.tmp"
+            )
+            with os.fdopen(file_descriptor, "wb") as destination:
+                np.savez(
+                    destination,
+                    format_version=np.int32(self.FORMAT_VERSION),
+                    file_name=np.str_(index.file_name),
+                    descriptions=self._pack_strings(index.descriptions),
+                    cells=self._pack_strings(index.cells),
+                    normalized_descriptions=self._pack_strings(
+                        index.normalized_descriptions
+                    ),
+                    prices=self._pack_strings([str(price) for price in index.prices]),
+                    sheets=self._pack_strings(index.sheets),
+                    catalogs=self._pack_strings(index.catalogs),
+                    **{
+                        f"feature_{name}": values
+                        for name, values in index.features.items()
+                    },
+                )
+            os.replace(temp_path, self._index_path(index.key))
+        except OSError as e:
+            raise MatchingError(f"Błąd podczas zapisu indeksu REF: {str(e)}")
+
+        self._remember(index)
+
+    def _remember(self, index: ReferenceIndex) -> None:
+        with self._memory_lock:
+            self._memory_cache[index.key] = index
+            self._memory_cache.move_to_end(index.key)
+            while len(self._memory_cache) > self.MAX_MEMORY_ENTRIES:
+                self._memory_cache.popitem(last=False)
+
+    @classmethod
+    def clear_memory_cache(cls) -> None:
+        """Usuwa indeksy z pamięci procesu (kolejny odczyt tylko z dysku lub przebudowa)"""
+        with cls._memory_lock:
+            cls._memory_cache.clear()
+
+    @staticmethod
+    def _pack_strings(values: List[str]) -> np.ndarray:
+        """Zapisuje listę napisów jako jeden blok bajtów UTF-8 (każdy zakończony separatorem)"""
+        packed = "".join(value + _STRING_SEPARATOR for value in values).encode("utf-8")
+        return np.frombuffer(packed, dtype=np.uint8)
+
+    @staticmethod
+    def _unpack_strings(packed: np.ndarray) -> List[str]:
+        if packed.size == 0:
+            return []
+        return packed.tobytes().decode("utf-8").split(_STRING_SEPARATOR)[:-1]
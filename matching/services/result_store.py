@@ -0,0 +1,85 @@
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import islice
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from matching.exceptions import MatchingError
+from matching.models import MatchingResult
+
+
+class MatchingResultStore:
+    """
+    Zapis wyników dopasowania w MatchingResult.
+    Wiersze wstawiane są paczkami (bulk_create) w jednej transakcji - sesja ma
+    komplet wyników albo nie ma żadnego.
+    """
+
+    # Dokładność pola MatchingResult.price
+    PRICE_QUANTUM = Decimal("0.01")
+
+    def __init__(self, batch_size: Optional[int] = None):
+        """
+        Args:
+            batch_size: Liczba wierszy w paczce bulk_create (domyślnie
+                settings.MATCHING_RESULTS_BATCH_SIZE); baza może dzielić paczkę
+                na mniejsze INSERT-y według limitu parametrów zapytania
+        """
+        self.batch_size = batch_size or settings.MATCHING_RESULTS_BATCH_SIZE
+
+    def save_results(
+        self, session_id: int, results: Iterable[Dict], ref_file_name: str = ""
+    ) -> int:
+        """
+        Zapisuje wyniki dopasowania sesji.
+
+        Args:
+            session_id: Identyfikator MatchingSession
+            results: Wyniki dopasowania (po zapisie do WF - z adresami komórek docelowych)
+            ref_file_name: Nazwa pliku REF, gdy wynik jej nie zawiera
+
+        Returns:
+            int: Liczba zapisanych wierszy
+
+        Raises:
+            MatchingError: Gdy wyników nie udało się zapisać
+        """
+        saved = 0
+        results = iter(results)
+
+        try:
+            with transaction.atomic():
+                # Obiekty modeli tworzone są paczkami - w pamięci jest najwyżej jedna paczka
+                while batch := [
+                    self._build_row(session_id, result, ref_file_name)
+                    for result in islice(results, self.batch_size)
+                ]:
+                    MatchingResult.objects.bulk_create(
+                        batch, batch_size=self.batch_size
+                    )
+                    saved += len(batch)
+        except Exception as e:
+            raise MatchingError(f"Błąd podczas zapisu wyników dopasowania: {str(e)}")
+
+        return saved
+
+    def _build_row(
+        self, session_id: int, result: Dict, ref_file_name: str
+    ) -> MatchingResult:
+        return MatchingResult(
+            session_id=session_id,
+            wf_description=result["wf_description"],
+            wf_cell=result["wf_cell"],
+            price_target_cell=result.get("price_target_cell", ""),
+            source_info_cell=result.get("source_info_cell", ""),
+            wf_sheet=result.get("wf_sheet", ""),
+            ref_description=result["ref_description"],
+            ref_cell=result["ref_cell"],
+            ref_sheet=result.get("ref_sheet", ""),
+            ref_file_name=result.get("ref_file_name") or ref_file_name,
+            match_score=float(result["match_score"]),
+            price=Decimal(result["price"]).quantize(
+                self.PRICE_QUANTUM, rounding=ROUND_HALF_UP
+            ),
+        )
@@ -1,10 +1,19 @@
-from typing import List, Dict
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from typing import Dict, Iterable, List, Optional
 from decimal import Decimal
 from pathlib import Path
 from datetime import datetime
 import openpyxl
+from django.conf import settings
 from openpyxl.styles import PatternFill
 from matching.exceptions import ExcelProcessingError
+from matching.services import instrumentation
+
+logger = logging.getLogger(__name__)
 
 
 class ResultWriter:
@@ -12,7 +21,8 @@ class ResultWriter:
 
     # Stałe do formatowania
     SOURCE_INFO_COLUMN_HEADER = "Źródło ceny"
-    REPORT_FILENAME_TEMPLATE = "matching_report_{timestamp}.xlsx"
+    # Znacznik losowy rozróżnia raporty zadań zakończonych w tej samej sekundzie
+    REPORT_FILENAME_TEMPLATE = "matching_report_{timestamp}_{token}.xlsx"
     HIGHLIGHT_FILL = PatternFill(
         start_color="E6E6FA", end_color="E6E6FA", fill_type="solid"
     )
@@ -21,13 +31,30 @@ class ResultWriter:
         self.excel_processor = excel_processor
 
     def write_results(
-        self, results: List[Dict], working_file_path: Path, price_target_column: str
+        self,
+        results: List[Dict],
+        working_file_path: Path,
+        price_target_column: str,
+        sheet_price_columns: Optional[Dict[str, str]] = None,
+        show_catalogs: bool = False,
+        output_directory: Optional[Path] = None,
     ) -> str:
-        """Zapisuje wyniki dopasowania do pliku WF i generuje raport
+        """Zapisuje wyniki dopasowania do kopii pliku WF i generuje raport
+
+        Przesłany plik WF nie jest modyfikowany (ten sam plik, przechowywany pod
+        hashem zawartości, czytają wszystkie zadania) - ceny trafiają do kopii
+        w katalogu wyników zadania (output_file_path), obok niej powstaje raport.
 
         Args:
             results (List[Dict]): Lista słowników z wynikami dopasowania
             working_file_path (Path): Ścieżka do pliku WF
+            price_target_column (str): Kolumna docelowa dla cen
+            sheet_price_columns (Dict[str, str]): Kolumny docelowe arkuszy WF
+                {arkusz: kolumna} - wyniki trafiają do arkusza "wf_sheet"
+            show_catalogs (bool): Komórki REF poprzedzone nazwą pliku katalogu
+                ("ref_file_name") - dla zadań z kilkoma katalogami REF
+            output_directory (Path): Katalog wyników zadania (domyślnie nowy
+                katalog w MATCHING_OUTPUT_DIR)
 
         Returns:
             str: Ścieżka do wygenerowanego pliku raportu
@@ -36,107 +63,165 @@ class ResultWriter:
             ExcelProcessingError: W przypadku błędów podczas zapisu do pliku
         """
 
-        print("DEBUG: *** write_results *** was called from the ResultWriter")
-
         try:
-            # DEBUG - sprawdź zawartość results
-            print(f"Liczba znalezionych dopasowań: {len(results)}")
-            for i, result in enumerate(results[:3]):
-                print(f"Dopasowanie {i+1}: {result}")
+            logger.debug("Liczba znalezionych dopasowań: %d", len(results))
 
             # Upewnij się, że plik istnieje
             if not working_file_path.exists():
                 raise ExcelProcessingError(f"Plik {working_file_path} nie istnieje")
 
-            # Zapisz wyniki do pliku roboczego
-            self._write_to_working_file(results, working_file_path, price_target_column)
-
-            # Wygeneruj raport
-            report_path = self._generate_report(
-                results, working_file_path, price_target_column
+            output_directory = Path(
+                output_directory
+                or Path(settings.MATCHING_OUTPUT_DIR) / uuid.uuid4().hex
             )
+            output_directory.mkdir(parents=True, exist_ok=True)
+
+            # Zapisz wyniki do kopii pliku roboczego
+            with instrumentation.span("writeback"):
+                self._write_to_working_file(
+                    results,
+                    working_file_path,
+                    self.output_file_path(output_directory, working_file_path),
+                    price_target_column,
+                    sheet_price_columns or {},
+                    show_catalogs,
+                )
+
+            # Wygeneruj raport (komórki docelowe ustalone przy zapisie do WF)
+            with instrumentation.span("report"):
+                report_path = self._generate_report(
+                    results, output_directory, show_catalogs
+                )
 
             return str(report_path)
 
         except Exception as e:
             raise ExcelProcessingError(f"Błąd podczas zapisywania wyników: {str(e)}")
 
+    @staticmethod
+    def output_file_path(output_directory: Path, working_file_path: Path) -> Path:
+        """Ścieżka kopii pliku WF z cenami w katalogu wyników zadania"""
+        return Path(output_directory) / Path(working_file_path).name
+
     def _write_to_working_file(
-        self, results: List[Dict], file_path: Path, price_target_column: str
+        self,
+        results: List[Dict],
+        file_path: Path,
+        output_path: Path,
+        price_target_column: str,
+        sheet_price_columns: Optional[Dict[str, str]] = None,
+        show_catalogs: bool = False,
     ) -> None:
-        """Zapisuje ceny i informacje o źródle do pliku WF
+        """Zapisuje ceny i informacje o źródle do kopii pliku WF
+
+        Skoroszyt WF wczytany w sesji zadania zapisywany jest pod output_path -
+        plik źródłowy pozostaje bez zmian. Adresy zapisanych komórek trafiają do wyników jako "price_target_cell"
+        i "source_info_cell" (zapisywane później w MatchingResult).
 
         Args:
             results (List[Dict]): Lista wyników dopasowania
             file_path (Path): Ścieżka do pliku roboczego
+            output_path (Path): Ścieżka kopii pliku WF z cenami
             price_target_column (str): Kolumna docelowa dla cen
+            sheet_price_columns (Dict[str, str]): Kolumny docelowe arkuszy
+                {arkusz: kolumna}; wynik bez "wf_sheet" trafia do aktywnego arkusza
+            show_catalogs (bool): Komórka REF poprzedzona nazwą pliku katalogu
         """
-        print("*** wywołano metodę ===_write_to_working_file=== z ResultWriter")
         file_path_str = str(file_path)  # Konwersja Path na string dla ExcelProcessor
+        sheet_price_columns = sheet_price_columns or {}
 
         try:
-            # Otwórz plik jeśli nie jest jeszcze otwarty przez ExcelProcessor
-            if file_path_str not in self.excel_processor.workbooks:
-                workbook = openpyxl.load_workbook(file_path_str)
-                self.excel_processor.workbooks[file_path_str] = workbook
-            else:
-                workbook = self.excel_processor.workbooks[file_path_str]
-
-            sheet = workbook.active
+            # Otwórz plik do zapisu (wczytany strumieniowo skoroszyt nie nadaje się do zapisu)
+            workbook = self.excel_processor.get_writable_workbook(file_path_str)
 
-            # Znajdź lub utwórz kolumnę na informacje o źródle
-            source_info_col = self._get_or_create_source_info_column(sheet)
+            # Arkusze i ich kolumny na informacje o źródle {arkusz: (arkusz, kolumna)}
+            sheets = {}
 
             # Zapisz wyniki
             for result in results:
                 # Pobierz dane z słownika wynikowego
                 wf_cell = result["wf_cell"]
                 price = result["price"]
-
-                # Określ komórkę docelową dla ceny używając price_target_column
+                sheet_name = result.get("wf_sheet", "")
+
+                if sheet_name not in sheets:
+                    sheet = self.excel_processor.get_sheet(workbook, sheet_name or None)
+                    # Znajdź lub utwórz kolumnę na informacje o źródle
+                    sheets[sheet_name] = (
+                        sheet,
+                        self._get_or_create_source_info_column(sheet),
+                    )
+                sheet, source_info_col = sheets[sheet_name]
+
+                # Określ komórkę docelową dla ceny używając kolumny docelowej arkusza
                 cell_row = wf_cell[1:]  # Pobierz numer wiersza z adresu komórki
-                price_target_cell = f"{price_target_column}{cell_row}"
+                price_target_cell = (
+                    f"{sheet_price_columns.get(sheet_name, price_target_column)}"
+                    f"{cell_row}"
+                )
 
                 # Zapis ceny bezpośrednio do arkusza
                 sheet[price_target_cell] = float(price) if price else 0.0
 
                 # Zapis informacji o źródle w kolumnie informacyjnej
                 source_cell = f"{source_info_col}{cell_row}"
-                source_info = f"REF:{result['ref_cell']}, Podobieństwo: {result['match_score']:.1f}%"
+                result["price_target_cell"] = price_target_cell
+                result["source_info_cell"] = source_cell
+                ref_cell = self._reference_cell(result, show_catalogs)
+                source_info = f"REF:{ref_cell}, Podobieństwo: {result['match_score']:.1f}%"
 
                 sheet[source_cell] = source_info
                 sheet[source_cell].fill = self.HIGHLIGHT_FILL
 
-            # Zapisz zmiany do pliku
-            workbook.save(file_path_str)
+            # Zapisz kopię z cenami - atomowo, żeby w katalogu wyników nie został
+            # niepełny plik po przerwanym zapisie
+            file_descriptor, temp_path = tempfile.mkstemp(
+                dir=output_path.parent, suffix=output_path.suffix
+            )
+            os.close(file_descriptor)
+            try:
+                workbook.save(temp_path)
+                shutil.copymode(file_path_str, temp_path)
+                os.replace(temp_path, output_path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
 
         except Exception as e:
             raise ExcelProcessingError(f"Błąd podczas zapisu do pliku: {str(e)}")
 
     def _generate_report(
-        self, results: List[Dict], working_file_path: Path, price_target_column: str
+        self,
+        results: Iterable[Dict],
+        output_directory: Path,
+        show_catalogs: bool = False,
     ) -> str:
         """Generuje szczegółowy raport dopasowań
 
+        Raport zapisywany jest strumieniowo (skoroszyt write-only) - wiersze trafiają
+        od razu do pliku, więc pamięć nie rośnie razem z liczbą dopasowań.
+        Komórki arkuszy innych niż aktywny podawane są z nazwą arkusza ('Arkusz'!B4),
+        a komórki REF w zadaniach z kilkoma katalogami także z nazwą pliku
+        ([cennik.xlsx]'Arkusz'!B4).
+
         Args:
-            results (List[Dict]): Lista wyników dopasowania
-            working_file_path (Path): Ścieżka do pliku roboczego
-            price_target_column (str): Kolumna docelowa dla cen
+            results (Iterable[Dict]): Wyniki dopasowania po zapisie do pliku WF
+                (z "price_target_cell")
+            output_directory (Path): Katalog wyników zadania
+            show_catalogs (bool): Komórki REF poprzedzone nazwą pliku katalogu
 
         Returns:
             str: Ścieżka do wygenerowanego raportu
         """
-        print("DEBUG: *** _generate_report *** was called from the ResultWriter")
-
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        report_path = working_file_path.parent / self.REPORT_FILENAME_TEMPLATE.format(
-            timestamp=timestamp
+        report_path = output_directory / self.REPORT_FILENAME_TEMPLATE.format(
+            timestamp=timestamp, token=uuid.uuid4().hex[:8]
         )
 
-        # Tworzymy nowy plik Excel na raport
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = "Raport dopasowań"
+        # Tworzymy nowy plik Excel na raport (tryb strumieniowy)
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet(title="Raport dopasowań")
 
         # Nagłówki
         headers = [
@@ -147,27 +232,55 @@ class ResultWriter:
             "Cena",
             "Podobieństwo (%)",
             "Komórka docelowa ceny",
+            "Alternatywy",
         ]
-        for col, header in enumerate(headers, 1):
-            sheet.cell(row=1, column=col, value=header)
-
-        # Wypełnienie danymi
-        for row, result in enumerate(results, 2):
-            # Określ komórkę docelową dla ceny używając price_target_column
-            cell_row = result["wf_cell"][1:]  # Pobierz numer wiersza z adresu komórki
-            price_target_cell = f"{price_target_column}{cell_row}"
-
-            sheet.cell(row=row, column=1, value=result["wf_description"])
-            sheet.cell(row=row, column=2, value=result["wf_cell"])
-            sheet.cell(row=row, column=3, value=result["ref_description"])
-            sheet.cell(row=row, column=4, value=result["ref_cell"])
-            sheet.cell(row=row, column=5, value=float(result["price"]))
-            sheet.cell(row=row, column=6, value=round(result["match_score"], 1))
-            sheet.cell(row=row, column=7, value=price_target_cell)
+        sheet.append(headers)
+
+        # Wypełnienie danymi - wiersz po wierszu
+        for result in results:
+            wf_sheet = result.get("wf_sheet", "")
+            sheet.append(
+                [
+                    result["wf_description"],
+                    self._qualified_cell(wf_sheet, result["wf_cell"]),
+                    result["ref_description"],
+                    self._reference_cell(result, show_catalogs),
+                    float(result["price"]),
+                    round(result["match_score"], 1),
+                    self._qualified_cell(wf_sheet, result["price_target_cell"]),
+                    self._format_alternatives(result, show_catalogs) or None,
+                ]
+            )
 
         workbook.save(report_path)
         return str(report_path)
 
+    @staticmethod
+    def _qualified_cell(sheet_name: str, cell: str) -> str:
+        """Adres komórki z nazwą arkusza (bez nazwy dla aktywnego arkusza)"""
+        if not sheet_name:
+            return cell
+        return "'{}'!{}".format(sheet_name.replace("'", "''"), cell)
+
+    @classmethod
+    def _reference_cell(cls, result: Dict, show_catalog: bool = False) -> str:
+        """Adres komórki REF wyniku lub alternatywy (z arkuszem i plikiem)"""
+        cell = cls._qualified_cell(result.get("ref_sheet", ""), result["ref_cell"])
+        if show_catalog and result.get("ref_file_name"):
+            return f"[{result['ref_file_name']}]{cell}"
+        return cell
+
+    @classmethod
+    def _format_alternatives(cls, result: Dict, show_catalogs: bool = False) -> str:
+        """Opis kolejnych kandydatów REF (np. 'C7: 120.00 (85.0%); C9: 99.50 (81.2%)')"""
+        alternatives = []
+        for alternative in result.get("alternatives", []):
+            ref_cell = cls._reference_cell(alternative, show_catalogs)
+            alternatives.append(
+                f"{ref_cell}: {alternative['price']} ({alternative['match_score']:.1f}%)"
+            )
+        return "; ".join(alternatives)
+
     def _get_or_create_source_info_column(self, sheet) -> str:
         """
         Znajduje istniejącą lub tworzy nową kolumnę na informacje o źródle
@@ -179,10 +292,6 @@ class ResultWriter:
             str: Litera kolumny (np. 'G')
         """
 
-        print(
-            "DEBUG: *** _get_or_create_source_info_column *** was called from the ResultWriter"
-        )
-
         # Szukaj istniejącej kolumny
         for cell in sheet[1]:
             if cell.value == self.SOURCE_INFO_COLUMN_HEADER:
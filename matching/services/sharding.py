@@ -0,0 +1,246 @@
+"""
+Podział wierszy WF między procesy dla scorerów napisanych w Pythonie.
+
+Funkcja match_shard jest punktem wejścia procesów puli (ShardPool) - moduł nie
+importuje Django ani serwisów na poziomie modułu (procesy uruchamiane metodą
+spawn importują go przed rozpakowaniem danych katalogu).
+"""
+
+import contextlib
+import math
+import multiprocessing
+import multiprocessing.util
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Limity CPU kontenera (cgroup v2 i v1)
+CGROUP_V2_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+CGROUP_V1_CPU_QUOTA = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+CGROUP_V1_CPU_PERIOD = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+
+# Stan procesu roboczego: ostatnio używane indeksy REF {klucz: indeks}
+# i parametry bieżącego wywołania (wczytywane z plików puli raz na proces)
+WORKER_CACHED_INDEXES = 2
+_worker_indexes: "OrderedDict[str, Any]" = OrderedDict()
+_worker_context: Dict[str, Any] = {}
+
+
+def available_cpu_count() -> int:
+    """
+    Liczba rdzeni dostępnych dla procesu: przypisanie CPU (affinity) ograniczone
+    limitem cgroup (cpu.max lub cfs_quota_us) - os.cpu_count() zwraca liczbę
+    rdzeni hosta także wtedy, gdy kontener może użyć tylko części z nich.
+    """
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Brak sched_getaffinity (np. macOS)
+        count = os.cpu_count() or 1
+
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        count = min(count, max(1, math.ceil(quota)))
+    return max(1, count)
+
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    """Limit CPU z cgroup w rdzeniach (None - brak limitu lub brak cgroup)"""
+    try:
+        quota, period = CGROUP_V2_CPU_MAX.read_text().split()[:2]
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        quota = int(CGROUP_V1_CPU_QUOTA.read_text())
+        period = int(CGROUP_V1_CPU_PERIOD.read_text())
+    except (OSError, ValueError):
+        return None
+    if quota <= 0 or period <= 0:
+        return None
+    return quota / period
+
+
+class ShardPool:
+    """
+    Długo żyjąca pula procesów (spawn) dzielona przez kolejne zadania i arkusze.
+
+    Procesy uruchamiane są raz - Django i serwisy importowane są przy pierwszym
+    bloku, a nie przy każdym dopasowaniu. Indeks REF zapisywany jest raz na klucz
+    w katalogu puli i wczytywany przez proces roboczy raz (procesy trzymają
+    ostatnie indeksy w pamięci). Parametry dopasowania (serwis, próg, premie
+    wierszy) zapisywane są raz na wywołanie i wczytywane raz na proces.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._workers = 0
+        self._directory: Optional[Path] = None
+        self._published_indexes: Set[str] = set()
+
+    def executor(self, workers: int) -> ProcessPoolExecutor:
+        """Pula o podanej liczbie procesów (tworzona ponownie po zmianie liczby)"""
+        with self._lock:
+            if self._executor is None or self._workers != workers:
+                if self._executor is not None:
+                    self._executor.shutdown(cancel_futures=True)
+                # Nowe procesy zamiast fork - arkusze WF dopasowywane są w wątkach
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+                )
+                self._workers = workers
+            return self._executor
+
+    def reset(self, wait: bool = False) -> None:
+        """Zamyka pulę (np. po awarii procesu) - kolejne wywołanie utworzy nową"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+            self._workers = 0
+
+    def shutdown(self) -> None:
+        """Zamyka pulę (czekając na zakończenie procesów) i usuwa pliki puli"""
+        self.reset(wait=True)
+        with self._lock:
+            if self._directory is not None:
+                shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+            self._published_indexes.clear()
+
+    def _ensure_directory(self) -> Path:
+        with self._lock:
+            if self._directory is None or not self._directory.exists():
+                self._directory = Path(tempfile.mkdtemp(prefix="fastbidder_shards_"))
+                self._published_indexes.clear()
+            return self._directory
+
+    def publish_index(self, reference_index) -> Tuple[str, str]:
+        """
+        Zapisuje indeks REF dla procesów roboczych (raz na klucz indeksu).
+
+        Returns:
+            (klucz indeksu w procesach, ścieżka pliku) - indeks bez klucza (tymczasowy)
+            otrzymuje klucz jednorazowy, a jego plik usuwa release_index
+        """
+        key = reference_index.key or f"tmp-{uuid.uuid4().hex}"
+        path = self._ensure_directory() / f"index-{key}.pickle"
+        with self._lock:
+            if key in self._published_indexes and path.exists():
+                return key, str(path)
+        self._dump(reference_index, path)
+        with self._lock:
+            self._published_indexes.add(key)
+        return key, str(path)
+
+    def release_index(self, key: str, path: str) -> None:
+        """Usuwa plik indeksu tymczasowego (indeksy z kluczem zostają dla kolejnych zadań)"""
+        if not key.startswith("tmp-"):
+            return
+        with self._lock:
+            self._published_indexes.discard(key)
+        with contextlib.suppress(OSError):
+            os.remove(path)
+
+    def publish_context(self, context: Tuple) -> str:
+        """Zapisuje parametry jednego wywołania; ścieżka jest też ich identyfikatorem"""
+        path = self._ensure_directory() / f"context-{uuid.uuid4().hex}.pickle"
+        self._dump(context, path)
+        return str(path)
+
+    @staticmethod
+    def _dump(value: Any, path: Path) -> None:
+        """Zapis atomowy - proces roboczy nie wczyta niepełnego pliku"""
+        temp_path = path.with_suffix(".tmp")
+        with open(temp_path, "wb") as destination:
+            pickle.dump(value, destination, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+
+# Pula procesu (serwera lub procesu roboczego zadań) zamykana przy jego zakończeniu -
+# finalizator multiprocessing działa także w procesach potomnych, które przed wyjściem
+# czekają na swoje procesy (atexit nie zdążyłby zamknąć puli). Priorytet wyższy niż
+# zamknięcie kolejek multiprocessing (10), aby procesy puli odebrały polecenie końca.
+shard_pool = ShardPool()
+multiprocessing.util.Finalize(None, shard_pool.shutdown, exitpriority=100)
+
+
+def match_shard(
+    index_key: str,
+    index_path: str,
+    context_path: str,
+    wf_texts: List[str],
+) -> Tuple[np.ndarray, np.ndarray, Dict[str, int]]:
+    """
+    Dopasowuje blok opisów WF w procesie roboczym.
+
+    Indeks REF i parametry wywołania wczytywane są z plików puli tylko wtedy,
+    gdy proces nie ma ich jeszcze w pamięci.
+
+    Returns:
+        (indeksy najlepszych REF [n x top_k], wyniki [n x top_k], liczniki bloku)
+    """
+    from matching.services.instrumentation import JobTrace
+
+    reference_index = _worker_indexes.get(index_key)
+    if reference_index is None:
+        reference_index = _load(index_path)
+        _worker_indexes[index_key] = reference_index
+        while len(_worker_indexes) > WORKER_CACHED_INDEXES:
+            _worker_indexes.popitem(last=False)
+    else:
+        _worker_indexes.move_to_end(index_key)
+
+    if _worker_context.get("path") != context_path:
+        matching_service, threshold, top_k, use_blocking, row_bias = _load(context_path)
+        # Proces roboczy liczy blok sam - bez własnej puli i wątków cdist
+        matching_service.shard_workers = 0
+        matching_service.workers = 1
+        matching_service.match_cache = None
+        _worker_context.clear()
+        _worker_context.update(
+            path=context_path,
+            matching_service=matching_service,
+            threshold=threshold,
+            top_k=top_k,
+            use_blocking=use_blocking,
+            row_bias=row_bias,
+        )
+
+    state = _worker_context
+    trace = JobTrace()
+    with trace.activate():
+        blocks = list(
+            state["matching_service"]._iter_best_matches(
+                wf_texts,
+                reference_index,
+                state["threshold"],
+                state["top_k"],
+                use_blocking=state["use_blocking"],
+                row_bias=state["row_bias"],
+            )
+        )
+
+    return (
+        np.concatenate([indices for _, indices, _ in blocks]),
+        np.concatenate([scores for _, _, scores in blocks]),
+        dict(trace.counters),
+    )
+
+
+def _load(path: str) -> Any:
+    with open(path, "rb") as source:
+        return pickle.load(source)
@@ -0,0 +1,25 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class SheetConfig:
+    """
+    Konfiguracja jednego arkusza pliku WF lub REF - kolumna opisów, zakres wierszy
+    i kolumna cen (docelowa w WF, źródłowa w REF).
+    """
+
+    # Nazwa arkusza (None - aktywny arkusz skoroszytu)
+    sheet: Optional[str]
+    description_column: str
+    description_range: Dict[str, str]
+    price_column: str
+
+    @property
+    def label(self) -> str:
+        """Nazwa arkusza w wynikach ("" dla aktywnego arkusza)"""
+        return self.sheet or ""
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SheetConfig":
+        return cls(**data)
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+
+# Wersja reguł - zmiana reguł unieważnia indeksy REF i pamięć dopasowań
+NORMALIZER_VERSION = 2
+
+# Litery bez rozkładu Unicode na literę bazową i znak diakrytyczny
+_UNDECOMPOSABLE_LETTERS = str.maketrans({"ł": "l", "Ł": "L"})
+
+_LETTER_DIGIT_BOUNDARY = re.compile(r"(?<=[^\W\d_])(?=\d)|(?<=\d)(?=[^\W\d_])")
+_DECIMAL_COMMA = re.compile(r"(?<=\d),(?=\d)")
+# Końcowe zera części dziesiętnej (bez numerów wersji i dat, np. 1.0.0, 01.10.2024)
+_TRAILING_ZEROS = re.compile(r"(?<![\d.])(\d+)\.(\d*?)0+(?!\.?\d)")
+# Wykładnik dołączony do jednostki (m2, m^2, m² po NFKC) - nie jest oddzielany od litery
+_UNIT_EXPONENT = re.compile(r"(?<![^\W\d_])m\^?([23])(?!\w)")
+# Kropki i przecinki poza liczbami oraz pozostała interpunkcja (poza "/" w wymiarach)
+_PUNCTUATION = re.compile(r"(?:(?<!\d)[.,]|[.,](?!\d)|[^\w\s.,/])")
+
+# Jednostki i skróty zapisywane na różne sposoby -> postać kanoniczna
+# (stosowane po zamianie na małe litery i rozdzieleniu liter od cyfr)
+_UNIT_PATTERNS = [
+    (re.compile(r"\bm\.\s*b\b\.?"), "mb"),
+    (re.compile(r"\bm\^?([23])\b"), r"m\1"),
+    (re.compile(r"\bm\s*kw\b\.?"), "m2"),
+    (re.compile(r"\bm\s*szesc\b\.?"), "m3"),
+]
+_UNIT_ALIASES = {
+    "sztuk": "szt",
+    "sztuka": "szt",
+    "sztuki": "szt",
+    "kompl": "kpl",
+    "komplet": "kpl",
+    "komplety": "kpl",
+    "godz": "h",
+    "godzin": "h",
+    "ø": "fi",
+    "φ": "fi",
+}
+
+
+class TextNormalizer:
+    """
+    Normalizacja opisów przed dopasowaniem - wykonywana raz na opis przy odczycie
+    (postać znormalizowana zapisywana jest w indeksie REF obok oryginału).
+    Scorery porównują wyłącznie opisy znormalizowane, wyniki pokazują oryginały.
+
+    Etapy (każdy można wyłączyć): zamiana na małe litery, usunięcie polskich
+    znaków, ujednolicenie jednostek i skrótów (m² / m2 / m kw, szt. / sztuk),
+    ujednolicenie liczb (0,50 -> 0.5, DN110 -> dn 110). Białe znaki
+    są zawsze ujednolicane.
+    """
+
+    def __init__(
+        self,
+        casefold: bool = True,
+        fold_diacritics: bool = True,
+        canonical_units: bool = True,
+        normalize_numbers: bool = True,
+    ):
+        """
+        Args:
+            casefold: Zamiana na małe litery
+            fold_diacritics: Usunięcie znaków diakrytycznych (ą -> a, ł -> l)
+            canonical_units: Ujednolicenie jednostek, skrótów i interpunkcji
+            normalize_numbers: Ujednolicenie zapisu liczb (przecinek dziesiętny,
+                końcowe zera, odstęp między literami i cyframi)
+        """
+        self.casefold = casefold
+        self.fold_diacritics = fold_diacritics
+        self.canonical_units = canonical_units
+        self.normalize_numbers = normalize_numbers
+
+    @classmethod
+    def from_settings(cls) -> "TextNormalizer":
+        """Normalizacja skonfigurowana w settings.MATCHING_TEXT_NORMALIZATION"""
+        return cls(**settings.MATCHING_TEXT_NORMALIZATION)
+
+    @property
+    def signature(self) -> str:
+        """Skrót wersji reguł i ustawień (część klucza indeksu REF)"""
+        options = json.dumps(
+            {
+                "version": NORMALIZER_VERSION,
+                "casefold": self.casefold,
+                "fold_diacritics": self.fold_diacritics,
+                "canonical_units": self.canonical_units,
+                "normalize_numbers": self.normalize_numbers,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(options.encode("utf-8")).hexdigest()[:16]
+
+    def normalize(self, text: str) -> str:
+        # NFKC zamienia m² na m2 i ujednolica odmiany znaków (np. spacje, ligatury)
+        text = unicodedata.normalize("NFKC", text)
+        if self.casefold:
+            text = text.casefold()
+        if self.fold_diacritics:
+            text = self._fold_diacritics(text)
+        if self.normalize_numbers:
+            text = self._normalize_numbers(text)
+        if self.canonical_units:
+            text = self._canonical_units(text)
+        return " ".join(text.split())
+
+    def normalize_many(self, texts: Iterable[str]) -> List[str]:
+        """Normalizuje opisy, licząc każdy powtórzony opis tylko raz"""
+        texts = list(texts)
+        normalized: Dict[str, str] = {
+            text: self.normalize(text) for text in dict.fromkeys(texts)
+        }
+        return [normalized[text] for text in texts]
+
+    @staticmethod
+    def _fold_diacritics(text: str) -> str:
+        decomposed = unicodedata.normalize("NFD", text.translate(_UNDECOMPOSABLE_LETTERS))
+        return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+    def _normalize_numbers(self, text: str) -> str:
+        """
+        Przecinek dziesiętny, odstęp między literami i cyframi, a dopiero potem
+        końcowe zera (także w liczbach sklejonych z literami, np. DN110,0).
+        Wykładnik jednostki zostaje przy literze, gdy ujednolicane są jednostki.
+        """
+        text = _DECIMAL_COMMA.sub(".", text)
+        if not self.canonical_units:
+            return self._split_numbers(text)
+
+        # split z grupą zwraca na zmianę tekst i wykładnik: [tekst, "2", tekst, ...]
+        pieces = _UNIT_EXPONENT.split(text)
+        return " ".join(
+            self._split_numbers(piece) if position % 2 == 0 else f"m{piece}"
+            for position, piece in enumerate(pieces)
+        )
+
+    @classmethod
+    def _split_numbers(cls, text: str) -> str:
+        text = _LETTER_DIGIT_BOUNDARY.sub(" ", text)
+        return _TRAILING_ZEROS.sub(cls._strip_zeros, text)
+
+    @staticmethod
+    def _strip_zeros(match: re.Match) -> str:
+        integer, fraction = match.group(1), match.group(2)
+        return f"{integer}.{fraction}" if fraction else integer
+
+    @staticmethod
+    def _canonical_units(text: str) -> str:
+        for pattern, replacement in _UNIT_PATTERNS:
+            text = pattern.sub(replacement, text)
+        text = _PUNCTUATION.sub(" ", text)
+        return " ".join(_UNIT_ALIASES.get(word, word) for word in text.split())
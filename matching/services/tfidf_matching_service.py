@@ -0,0 +1,243 @@
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from matching.exceptions import MatchingError
+from matching.services import instrumentation, profiling
+from matching.services.matching_service import MatchingService
+from matching.services.reference_index import ReferenceIndex
+from matching.services.sharding import available_cpu_count
+
+
+class TfidfMatchingService(MatchingService):
+    """
+    Serwis dopasowania oparty o podobieństwo cosinusowe wektorów TF-IDF n-gramów znakowych.
+
+    Opisy REF wektoryzowane są raz na katalog (model trzymany przy ReferenceIndex),
+    opisy WF transformowane blokami, a wyniki liczone iloczynem macierzy rzadkich
+    (bloki liczone równolegle w wątkach - SciPy zwalnia GIL przy mnożeniu).
+    Wynik to podobieństwo cosinusowe w skali 0-100, porównywalne z progiem RapidFuzz.
+    find_best_match pozostaje porównaniem parowym funkcją matching_function.
+    """
+
+    ENGINE_NAME = "tfidf"
+    # N-gram obecny w mniejszej liczbie opisów REF nigdy nie jest pomijany jako zbyt częsty
+    MIN_PRUNED_DOCUMENT_COUNT = 100
+
+    def __init__(
+        self,
+        ngram_range: Tuple[int, int] = (2, 4),
+        max_document_frequency: float = 0.2,
+        sublinear_tf: bool = True,
+        **kwargs,
+    ):
+        """Inicjalizacja serwisu
+
+        Args:
+            ngram_range: Zakres długości n-gramów znakowych (w obrębie słów)
+            max_document_frequency: N-gramy obecne w większym udziale opisów REF są
+                pomijane - niosą mało informacji, a zagęszczają iloczyn macierzy
+                (dotyczy tylko n-gramów z co najmniej MIN_PRUNED_DOCUMENT_COUNT opisów)
+            sublinear_tf: Logarytmiczne ważenie częstości n-gramów
+            **kwargs: Parametry MatchingService (np. matching_function dla find_best_match)
+        """
+        super().__init__(**kwargs)
+        self.ngram_range = ngram_range
+        self.max_document_frequency = max_document_frequency
+        self.sublinear_tf = sublinear_tf
+
+    def _use_blocking(self, reference_index: ReferenceIndex) -> bool:
+        # Iloczyn macierzy rzadkich pomija wiersze bez wspólnych n-gramów sam z siebie
+        return False
+
+    def _shard_worker_count(self, rows: int) -> int:
+        # Bloki macierzy liczone są w wątkach (scipy zwalnia GIL), a matching_function
+        # służy tylko find_best_match
+        return 0
+
+    def _map_blocks(
+        self, score_block: Callable[[List[str]], Any], blocks: List[List[str]]
+    ) -> Iterator[Any]:
+        """
+        Liczy bloki równolegle - najwyżej jeden blok w obliczeniach na wątek,
+        kolejne zlecane dopiero po odebraniu wyniku najstarszego
+        """
+        workers = available_cpu_count() if self.workers == -1 else max(1, self.workers)
+        if workers == 1 or len(blocks) <= 1:
+            yield from map(score_block, blocks)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for block in blocks:
+                pending.append(
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        profiling.run_profiled,
+                        score_block,
+                        block,
+                    )
+                )
+                if len(pending) >= workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    @property
+    def model_name(self) -> str:
+        return (
+            f"{self.ENGINE_NAME}:{self.ngram_range}:"
+            f"{self.max_document_frequency}:{self.sublinear_tf}"
+        )
+
+    def scorer_signature(self) -> Optional[str]:
+        signature = super().scorer_signature()
+        return signature and f"{signature}:{self.model_name}"
+
+    def _get_model(self, reference_index: ReferenceIndex):
+        """Zwraca (wektoryzator, transponowana macierz TF-IDF katalogu REF)"""
+        return reference_index.get_engine_model(
+            self.model_name, lambda: self._fit_model(reference_index)
+        )
+
+    def _fit_model(self, reference_index: ReferenceIndex):
+        try:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+        except ImportError:
+            raise MatchingError(
+                "Silnik TF-IDF wymaga pakietu scikit-learn (pip install scikit-learn)"
+            )
+
+        vectorizer = TfidfVectorizer(
+            analyzer="char_wb",
+            ngram_range=self.ngram_range,
+            max_df=max(
+                int(self.max_document_frequency * len(reference_index)),
+                self.MIN_PRUNED_DOCUMENT_COUNT,
+            ),
+            lowercase=True,
+            sublinear_tf=self.sublinear_tf,
+            dtype=np.float32,
+        )
+        try:
+            ref_matrix = vectorizer.fit_transform(reference_index.normalized_descriptions)
+        except ValueError as e:
+            # np. katalog złożony wyłącznie z pustych opisów
+            raise MatchingError(f"Błąd podczas budowy modelu TF-IDF: {str(e)}")
+
+        return vectorizer, ref_matrix.T.tocsr()
+
+    def _similarities(self, wf_texts: List[str], reference_index: ReferenceIndex):
+        """Rzadka macierz CSR podobieństw cosinusowych bloku opisów WF do katalogu REF
+
+        Wektory TF-IDF są znormalizowane (L2), więc iloczyn skalarny jest cosinusem.
+        Indeksy kolumn w wierszach są posortowane - przy remisie wygrywa
+        wcześniejszy wiersz REF.
+        """
+        vectorizer, ref_matrix_t = self._get_model(reference_index)
+        similarities = (vectorizer.transform(wf_texts) @ ref_matrix_t).tocsr()
+        similarities.sort_indices()
+        return similarities
+
+    def _best_block_matches(
+        self,
+        wf_texts: List[str],
+        reference_index: ReferenceIndex,
+        threshold: float,
+        top_k: int,
+        row_bias: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Najlepsze dopasowania bloku wierszy WF wybrane wprost z macierzy rzadkiej
+
+        Macierz bloku nie jest zamieniana na gęstą - dla top_k = 1 bez premii
+        wynik daje max/argmax wierszy CSR, w pozostałych przypadkach sortowane są
+        tylko niezerowe wartości wiersza (wycinek indptr).
+
+        Returns:
+            (indeksy najlepszych REF [n x top_k], wyniki 0-100 [n x top_k]) -
+            brakujący kandydaci z indeksem -1 i wynikiem 0
+        """
+        similarities = self._similarities(wf_texts, reference_index)
+        best_indices = np.full((len(wf_texts), top_k), -1, dtype=np.int64)
+        best_scores = np.zeros((len(wf_texts), top_k), dtype=np.float64)
+        # Wyniki 0 nigdy nie trafiają do wyników (tak jak przy macierzy gęstej)
+        min_score = max(threshold, np.nextafter(0, 1))
+
+        if top_k == 1 and row_bias is None:
+            row_scores = np.minimum(
+                similarities.max(axis=1).toarray().ravel().astype(np.float64) * 100,
+                100.0,
+            )
+            found = row_scores >= min_score
+            best_indices[found, 0] = np.asarray(similarities.argmax(axis=1)).ravel()[
+                found
+            ]
+            best_scores[found, 0] = row_scores[found]
+            return best_indices, best_scores
+
+        indptr, columns, values = (
+            similarities.indptr,
+            similarities.indices,
+            similarities.data,
+        )
+        for row in range(len(wf_texts)):
+            row_slice = slice(indptr[row], indptr[row + 1])
+            scores = np.minimum(values[row_slice].astype(np.float64) * 100, 100.0)
+            kept = scores >= min_score
+            row_columns, scores = columns[row_slice][kept], scores[kept]
+            ranking = scores if row_bias is None else scores + row_bias[row_columns]
+            order = np.lexsort((row_columns, -ranking))[:top_k]
+            best_indices[row, : len(order)] = row_columns[order]
+            best_scores[row, : len(order)] = scores[order]
+        return best_indices, best_scores
+
+    def _iter_matrix_matches(
+        self,
+        wf_texts: List[str],
+        reference_index: ReferenceIndex,
+        threshold: float,
+        top_k: int,
+        row_bias: Optional[np.ndarray] = None,
+    ) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """Porównanie ze wszystkimi wierszami REF iloczynem macierzy rzadkich
+
+        Bloki wierszy WF liczone są równolegle (_map_blocks) - w pamięci jest
+        najwyżej jedna macierz rzadka bloku na wątek, a z bloku zostają tylko
+        najlepsze dopasowania.
+        """
+        chunk_size = max(1, self.MAX_MATRIX_CELLS // max(1, len(reference_index)))
+        top_k = min(top_k, len(reference_index))
+        starts = range(0, len(wf_texts), chunk_size)
+
+        block_matches = self._map_blocks(
+            lambda block: self._best_block_matches(
+                block, reference_index, threshold, top_k, row_bias
+            ),
+            [wf_texts[start : start + chunk_size] for start in starts],
+        )
+        for start, (best_indices, best_scores) in zip(starts, block_matches):
+            instrumentation.incr("comparisons", len(best_indices) * len(reference_index))
+            yield start, best_indices, best_scores
+
+    def score_matrix(
+        self,
+        wf_texts: List[str],
+        ref_texts: List[str],
+        threshold: float = 0,
+        reference_index: Optional[ReferenceIndex] = None,
+    ) -> np.ndarray:
+        """Liczy macierz podobieństw TF-IDF opisów WF względem opisów REF
+
+        Bez zbudowanego indeksu model dopasowywany jest do ref_texts przy każdym wywołaniu.
+        """
+        if reference_index is None:
+            reference_index = ReferenceIndex.from_excel_data(
+                [(text, "") for text in ref_texts], {}, ""
+            )
+        similarities = self._similarities(wf_texts, reference_index).toarray()
+        scores = np.minimum(similarities.astype(np.float64) * 100, 100.0)
+        scores[scores < threshold] = 0
+        return scores
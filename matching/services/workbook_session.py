@@ -0,0 +1,99 @@
+from pathlib import Path
+from typing import Dict, Iterable, Set, Union
+
+import openpyxl
+
+
+class WorkbookSession:
+    """
+    Skoroszyty otwarte w ramach jednego zadania dopasowania.
+
+    Każdy plik parsowany jest co najwyżej raz i współdzielony przez walidację,
+    odczyt danych i zapis wyników. Pliki, do których zadanie zapisuje (WF),
+    wczytywane są od razu w pełnym trybie - z formułami zachowanymi przy zapisie.
+    Pozostałe otwierane są strumieniowo (tylko do odczytu, wartości obliczone).
+    """
+
+    def __init__(
+        self,
+        read_only: bool = True,
+        writable_files: Iterable[Union[str, Path]] = (),
+    ):
+        """
+        Args:
+            read_only: Tryb strumieniowy dla plików tylko do odczytu
+            writable_files: Pliki, do których zadanie będzie zapisywać
+        """
+        self.read_only = read_only
+        self.writable_files: Set[str] = {self._key(path) for path in writable_files}
+        # Sparsowane skoroszyty {ścieżka: workbook}
+        self.workbooks: Dict[str, openpyxl.Workbook] = {}
+        # Wartości obliczone formuł plików otwartych do zapisu (wczytywane tylko w razie potrzeby)
+        self.value_workbooks: Dict[str, openpyxl.Workbook] = {}
+        # Liczba parsowań plików w sesji
+        self.load_count = 0
+
+    @staticmethod
+    def _key(file_path: Union[str, Path]) -> str:
+        return str(Path(file_path))
+
+    def __enter__(self) -> "WorkbookSession":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __contains__(self, file_path: Union[str, Path]) -> bool:
+        return self._key(file_path) in self.workbooks
+
+    def is_writable(self, file_path: Union[str, Path]) -> bool:
+        return self._key(file_path) in self.writable_files
+
+    def get(self, file_path: Union[str, Path]) -> openpyxl.Workbook:
+        """Zwraca skoroszyt, parsując plik przy pierwszym użyciu"""
+        key = self._key(file_path)
+        if key not in self.workbooks:
+            if key in self.writable_files:
+                workbook = openpyxl.load_workbook(key)
+            else:
+                workbook = openpyxl.load_workbook(
+                    key, read_only=self.read_only, data_only=True
+                )
+            self.load_count += 1
+            self.workbooks[key] = workbook
+        return self.workbooks[key]
+
+    def get_writable(self, file_path: Union[str, Path]) -> openpyxl.Workbook:
+        """
+        Zwraca skoroszyt do zapisu. Plik nie zgłoszony wcześniej jako zapisywany,
+        a już otwarty strumieniowo, musi zostać wczytany ponownie w pełnym trybie.
+        """
+        key = self._key(file_path)
+        if key not in self.writable_files:
+            self.writable_files.add(key)
+            workbook = self.workbooks.pop(key, None)
+            if workbook is not None:
+                workbook.close()
+        return self.get(key)
+
+    def get_values(self, file_path: Union[str, Path]) -> openpyxl.Workbook:
+        """
+        Zwraca skoroszyt z wartościami obliczonymi formuł. Dla plików otwartych
+        do zapisu wymaga osobnego odczytu (strumieniowego) - tylko gdy zakres zawiera formuły.
+        """
+        key = self._key(file_path)
+        if key not in self.writable_files:
+            return self.get(key)
+        if key not in self.value_workbooks:
+            self.value_workbooks[key] = openpyxl.load_workbook(
+                key, read_only=True, data_only=True
+            )
+            self.load_count += 1
+        return self.value_workbooks[key]
+
+    def close(self) -> None:
+        """Zamyka wszystkie skoroszyty sesji"""
+        for workbook in [*self.workbooks.values(), *self.value_workbooks.values()]:
+            workbook.close()
+        self.workbooks.clear()
+        self.value_workbooks.clear()
@@ -0,0 +1,119 @@
+import random
+import shutil
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.test import override_settings
+
+from benchmarks.generators import BenchmarkFiles, WorkbookGenerator
+from matching.models import MatchingSession
+from matching.services import instrumentation, metrics
+from matching.services.match_cache import MatchCache
+from matching.services.matching_orchestrator import MatchingConfig
+from matching.services.matching_service import MatchingService
+from matching.services.reference_index import ReferenceIndex, ReferenceIndexStore
+
+# Układ kolumn jak w plikach przykładowych (opis REF w C, cena w E)
+REF_DESCRIPTION_COLUMN = "C"
+REF_PRICE_COLUMN = "E"
+FIRST_ROW = 4
+
+
+def generated_descriptions(
+    wf_rows: int, ref_rows: int, seed: int = 0, match_ratio: float = 0.8
+) -> Tuple[List[str], List[str]]:
+    """Opisy WF i REF z generatora benchmarków (bez zapisu plików)"""
+    generator = WorkbookGenerator(seed=seed, match_ratio=match_ratio)
+    rng = random.Random(seed)
+    catalog, unmatched = generator._descriptions(rng, ref_rows)
+    return generator._working_descriptions(rng, catalog, unmatched, wf_rows), catalog
+
+
+def wf_data(descriptions: List[str], column: str = "B") -> List[Tuple[str, str]]:
+    """Lista (opis, adres_komórki) jak z ExcelProcessor"""
+    return [
+        (description, f"{column}{row}")
+        for row, description in enumerate(descriptions, start=FIRST_ROW)
+    ]
+
+
+def ref_data(
+    descriptions: List[str],
+) -> Tuple[List[Tuple[str, str]], Dict[str, Decimal]]:
+    """Opisy REF (opis, adres_komórki) i ceny {adres_komórki: cena} (cena = numer wiersza)"""
+    ref_descriptions = wf_data(descriptions, REF_DESCRIPTION_COLUMN)
+    ref_prices = {
+        f"{REF_PRICE_COLUMN}{row}": Decimal(row)
+        for row in range(FIRST_ROW, FIRST_ROW + len(descriptions))
+    }
+    return ref_descriptions, ref_prices
+
+
+def reference_index(
+    descriptions: List[str], key: Optional[str] = None, file_name: str = "REF.xlsx"
+) -> ReferenceIndex:
+    ref_descriptions, ref_prices = ref_data(descriptions)
+    return ReferenceIndex.from_excel_data(
+        ref_descriptions, ref_prices, REF_PRICE_COLUMN, key=key, file_name=file_name
+    )
+
+
+def match_with_counters(
+    service: MatchingService,
+    wf: List[Tuple[str, str]],
+    index: ReferenceIndex,
+    **options: Any,
+) -> Tuple[List[Dict], Dict[str, int]]:
+    """Wyniki match_reference_index i liczniki zadania (JobTrace)"""
+    trace = instrumentation.JobTrace()
+    with trace.activate():
+        results = service.match_reference_index(wf, index, **options)
+    return results, trace.summary()["counters"]
+
+
+class TemporaryStorageMixin:
+    """
+    Katalogi zadań (zdarzenia, wyniki, indeksy REF, metryki, profile) w katalogu
+    tymczasowym testu; pamięć wyników dopasowania tylko w pamięci procesu
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.storage_dir = Path(tempfile.mkdtemp(prefix="fastbidder_test_"))
+        self.addCleanup(shutil.rmtree, self.storage_dir, ignore_errors=True)
+        storage = override_settings(
+            MATCHING_EVENTS_DIR=str(self.storage_dir / "events"),
+            MATCHING_OUTPUT_DIR=str(self.storage_dir / "output"),
+            REFERENCE_INDEX_DIR=str(self.storage_dir / "reference_index"),
+            MATCHING_METRICS_DIR=str(self.storage_dir / "metrics"),
+            MATCHING_PROFILE_DIR=str(self.storage_dir / "profiles"),
+            MATCH_CACHE_SQLITE_PATH=None,
+        )
+        storage.enable()
+        self.addCleanup(storage.disable)
+        MatchCache.clear_memory()
+        ReferenceIndexStore.clear_memory_cache()
+        # Rejestr metryk procesu zapisuje migawki w katalogu z chwili utworzenia
+        metrics._registry = None
+        self.addCleanup(setattr, metrics, "_registry", None)
+
+
+def benchmark_files(
+    directory: Path, wf_rows: int, ref_rows: int, seed: int = 0
+) -> BenchmarkFiles:
+    """Pliki WF i REF z generatora benchmarków"""
+    return WorkbookGenerator(seed=seed).generate(wf_rows, ref_rows, directory)
+
+
+def matching_session(files: BenchmarkFiles, **config) -> MatchingSession:
+    """Sesja PENDING z konfiguracją jak z MatchingView"""
+    config = MatchingConfig(
+        **{"matching_threshold": 80, **files.config_values(), **config}
+    )
+    return MatchingSession.objects.create(
+        working_file_path=str(config.working_file_path),
+        reference_file_path=str(config.reference_file_path),
+        config=config.to_dict(),
+    )
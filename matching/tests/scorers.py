@@ -0,0 +1,10 @@
+"""
+Scorery napisane w Pythonie dla testów podziału między procesy - moduł bez
+importów Django, procesy puli (spawn) importują go przed rozpakowaniem zadań.
+"""
+
+from difflib import SequenceMatcher
+
+
+def sequence_ratio(first: str, second: str) -> float:
+    return 100 * SequenceMatcher(None, first, second).ratio()
@@ -0,0 +1,65 @@
+from django.test import SimpleTestCase
+
+from matching.services.matching_service import MatchingService
+from matching.tests.factories import (
+    generated_descriptions,
+    match_with_counters,
+    reference_index,
+    wf_data,
+)
+
+
+class CandidateBlockingTests(SimpleTestCase):
+    """Porównanie tylko z kandydatami z indeksu n-gramów względem pełnego porównania"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        wf_descriptions, catalog = generated_descriptions(
+            wf_rows=300, ref_rows=2000, seed=3
+        )
+        cls.wf = wf_data(wf_descriptions)
+        cls.index = reference_index(catalog)
+
+    def test_blocking_recall_against_brute_force(self):
+        service = MatchingService()
+
+        for threshold in (60, 80, 90):
+            with self.subTest(threshold=threshold):
+                recall = service.measure_blocking_recall(
+                    self.wf, self.index, threshold=threshold
+                )
+                self.assertGreater(recall["brute_force_matches"], 0)
+                self.assertGreaterEqual(recall["recall"], 0.98)
+
+    def test_blocked_results_equal_brute_force_results(self):
+        brute_force = MatchingService(candidate_limit=None).match_reference_index(
+            self.wf, self.index, threshold=80
+        )
+        blocking = MatchingService()
+        blocking.BLOCKING_MIN_REF_ROWS = 100
+        blocked = blocking.match_reference_index(self.wf, self.index, threshold=80)
+
+        self.assertEqual(
+            [(r["wf_cell"], r["ref_cell"]) for r in blocked],
+            [(r["wf_cell"], r["ref_cell"]) for r in brute_force],
+        )
+
+    def test_blocking_compares_fewer_pairs(self):
+        service = MatchingService()
+        service.BLOCKING_MIN_REF_ROWS = 100
+
+        _, counters = match_with_counters(service, self.wf, self.index, threshold=80)
+
+        compared_rows = len(self.wf) - counters["exact_matches"]
+        self.assertLess(counters["comparisons"], compared_rows * len(self.index) / 10)
+
+    def test_blocking_only_for_large_catalogs(self):
+        service = MatchingService()
+        service.BLOCKING_MIN_REF_ROWS = 100
+        unlimited = MatchingService(candidate_limit=None)
+        unlimited.BLOCKING_MIN_REF_ROWS = 100
+
+        self.assertTrue(service._use_blocking(self.index))
+        self.assertFalse(service._use_blocking(reference_index(["rura pvc dn 110"])))
+        self.assertFalse(unlimited._use_blocking(self.index))
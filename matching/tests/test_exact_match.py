@@ -0,0 +1,131 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from matching.services.matching_service import MatchingService
+from matching.services.reference_index import ReferenceIndex
+from matching.tests.factories import (
+    match_with_counters,
+    ref_data,
+    reference_index,
+    wf_data,
+)
+
+
+class ExactMatchTests(SimpleTestCase):
+    """Opisy identyczne (po normalizacji) z opisem REF dopasowywane bez porównywania"""
+
+    CATALOG = ["Rura PVC DN 110", "Kabel YDY 3x2,5", "Rura PVC DN 110", "Farba"]
+
+    def setUp(self):
+        self.service = MatchingService()
+        self.index = reference_index(self.CATALOG)
+
+    def test_normalized_identical_description_is_exact_match(self):
+        results, counters = match_with_counters(
+            self.service,
+            wf_data(["kabel ydy 3x2.50", "rura pvc dn 110"]),
+            self.index,
+            threshold=80,
+        )
+
+        self.assertEqual(
+            [(r["ref_cell"], r["match_score"], r.get("exact_match")) for r in results],
+            [("C5", 100.0, True), ("C4", 100.0, True)],
+        )
+        self.assertEqual(results[0]["price"], Decimal(5))
+        self.assertEqual(counters["exact_matches"], 2)
+        self.assertNotIn("comparisons", counters)
+
+    def test_statistics_report_exact_match_rate(self):
+        counters = {"wf_rows_read": 4, "exact_matches": 1}
+
+        statistics = self.service.get_matching_statistics([], counters)
+
+        self.assertEqual(statistics["exact_match_rate"], 0.25)
+
+    def test_other_rows_are_still_compared(self):
+        results, counters = match_with_counters(
+            self.service,
+            wf_data(["Rura PVC DN 110", "rura pcv dn 110"]),
+            self.index,
+            threshold=80,
+        )
+
+        self.assertTrue(results[0]["exact_match"])
+        self.assertNotIn("exact_match", results[1])
+        self.assertEqual(counters["exact_matches"], 1)
+        self.assertEqual(counters["comparisons"], len(self.CATALOG))
+
+    def test_top_k_needs_alternatives_so_rows_are_compared(self):
+        results, counters = match_with_counters(
+            self.service,
+            wf_data(["Rura PVC DN 110"]),
+            self.index,
+            threshold=10,
+            top_k=2,
+        )
+
+        self.assertNotIn("exact_match", results[0])
+        self.assertEqual(results[0]["alternatives"][0]["ref_cell"], "C6")
+        self.assertEqual(counters["exact_matches"], 0)
+
+    def test_exact_match_only_in_catalogs_with_highest_bias(self):
+        ref_descriptions, ref_prices = ref_data(["Rura PVC DN 110"])
+        index = ReferenceIndex.from_catalogs(
+            [
+                ("A.xlsx", [("", ref_descriptions, ref_prices, "E")]),
+                ("B.xlsx", [("", [("Rura PVC DN 110 mm", "C9")], {"E9": 7}, "E")]),
+            ]
+        )
+
+        results, counters = match_with_counters(
+            self.service,
+            wf_data(["Rura PVC DN 110"]),
+            index,
+            threshold=80,
+            catalog_bias={"B.xlsx": 10},
+        )
+
+        # Wynik katalogu A (100) przegrywa z wynikiem katalogu B powiększonym o premię
+        self.assertEqual(results[0]["ref_file_name"], "B.xlsx")
+        self.assertEqual(counters["exact_matches"], 0)
+
+    def test_empty_description_is_not_exact_match(self):
+        index = reference_index(["", "Farba"])
+
+        results, counters = match_with_counters(
+            self.service, wf_data([""]), index, threshold=80
+        )
+
+        self.assertFalse(any(result.get("exact_match") for result in results))
+        self.assertEqual(counters["exact_matches"], 0)
+
+    def test_find_best_match_returns_first_identical_row(self):
+        ref_descriptions, ref_prices = ref_data(self.CATALOG)
+
+        result = self.service.find_best_match(
+            ("RURA pvc dn 110", "B4"), ref_descriptions, ref_prices, "E", 80
+        )
+
+        self.assertEqual(result["ref_cell"], "C4")
+        self.assertTrue(result["exact_match"])
+
+    def test_find_best_match_exact_hit_skips_scorer(self):
+        ref_descriptions, ref_prices = ref_data(self.CATALOG)
+
+        with mock.patch.object(self.service, "_batch_scorer") as scorer:
+            results = [
+                self.service.find_best_match(
+                    (description, "B4"), ref_descriptions, ref_prices, "E", 80
+                )
+                for description in ("Farba", "kabel ydy 3x2.5")
+            ]
+
+        scorer.assert_not_called()
+        self.assertEqual([r["ref_cell"] for r in results], ["C7", "C5"])
+        self.assertEqual(
+            self.service._exact_ref_lookup(ref_descriptions),
+            {"rura pvc dn 110": 0, "kabel ydy 3 x 2.5": 1, "farba": 3},
+        )
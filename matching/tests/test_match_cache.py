@@ -0,0 +1,132 @@
+from django.test import SimpleTestCase
+from rapidfuzz import fuzz
+
+from matching.services.match_cache import MatchCache
+from matching.services.matching_service import MatchingService
+from matching.tests.factories import (
+    TemporaryStorageMixin,
+    generated_descriptions,
+    match_with_counters,
+    reference_index,
+    wf_data,
+)
+
+
+def token_overlap(first, second, **kwargs):
+    first_words, second_words = set(first.split()), set(second.split())
+    return 100 * len(first_words & second_words) / len(first_words | second_words)
+
+
+class MatchCacheTests(TemporaryStorageMixin, SimpleTestCase):
+    """Wyniki zapamiętane między zadaniami - ten sam katalog, scorer i próg"""
+
+    def setUp(self):
+        super().setUp()
+        wf_descriptions, self.catalog = generated_descriptions(wf_rows=80, ref_rows=300)
+        self.wf = wf_data(wf_descriptions)
+        self.index = reference_index(self.catalog, key="ref-1")
+        self.cache = MatchCache()
+        self.service = MatchingService(match_cache=self.cache)
+
+    def test_second_job_is_served_from_cache(self):
+        first, first_counters = match_with_counters(
+            self.service, self.wf, self.index, threshold=70
+        )
+        second, counters = match_with_counters(
+            self.service, self.wf, self.index, threshold=70
+        )
+
+        self.assertEqual(second, first)
+        self.assertEqual(first_counters["match_cache_hits"], 0)
+        self.assertEqual(counters["match_cache_misses"], 0)
+        self.assertGreater(counters["match_cache_hits"], 0)
+        self.assertNotIn("comparisons", counters)
+
+    def test_scope_changes_miss(self):
+        match_with_counters(self.service, self.wf, self.index, threshold=70)
+        other_index = reference_index(self.catalog, key="ref-2")
+        wf_ratio = MatchingService(fuzz.WRatio, match_cache=self.cache)
+        blocking = MatchingService(candidate_limit=50, match_cache=self.cache)
+        variants = {
+            "threshold": (self.service, self.index, {"threshold": 75}),
+            "top_k": (self.service, self.index, {"threshold": 70, "top_k": 2}),
+            "reference": (self.service, other_index, {"threshold": 70}),
+            "scorer": (wf_ratio, self.index, {"threshold": 70}),
+            "blocking": (blocking, self.index, {"threshold": 70}),
+        }
+
+        for name, (service, index, options) in variants.items():
+            with self.subTest(scope=name):
+                _, counters = match_with_counters(service, self.wf, index, **options)
+                self.assertEqual(counters["match_cache_hits"], 0)
+
+    def test_catalog_bias_is_part_of_scope(self):
+        index = reference_index(self.catalog, key="ref-1")
+        index.catalogs = ["A.xlsx"] * 150 + ["B.xlsx"] * 150
+        match_with_counters(self.service, self.wf, index, threshold=70)
+
+        _, counters = match_with_counters(
+            self.service, self.wf, index, threshold=70, catalog_bias={"B.xlsx": 5}
+        )
+
+        self.assertEqual(counters["match_cache_hits"], 0)
+
+    def test_temporary_index_is_not_cached(self):
+        index = reference_index(self.catalog)
+
+        match_with_counters(self.service, self.wf, index, threshold=70)
+        _, counters = match_with_counters(self.service, self.wf, index, threshold=70)
+
+        self.assertNotIn("match_cache_hits", counters)
+        self.assertGreater(counters["comparisons"], 0)
+
+    def test_scorer_without_identity_is_not_cached(self):
+        def local_scorer(first, second, **kwargs):
+            return fuzz.ratio(first, second, **kwargs)
+
+        for scorer in (lambda first, second, **kwargs: 0.0, local_scorer):
+            with self.subTest(scorer=scorer.__qualname__):
+                service = MatchingService(
+                    scorer, match_cache=self.cache, shard_workers=0
+                )
+                self.assertIsNone(service.scorer_signature())
+                _, counters = match_with_counters(
+                    service, self.wf, self.index, threshold=70
+                )
+                self.assertNotIn("match_cache_hits", counters)
+
+    def test_scorer_code_is_part_of_signature(self):
+        def token_overlap(first, second, **kwargs):
+            return 0.0
+
+        token_overlap.__qualname__ = "token_overlap"
+        changed = MatchingService(token_overlap, shard_workers=0)
+        original = MatchingService(globals()["token_overlap"], shard_workers=0)
+
+        self.assertIsNotNone(original.scorer_signature())
+        self.assertNotEqual(changed.scorer_signature(), original.scorer_signature())
+
+    def test_entries_shared_through_sqlite(self):
+        sqlite_cache = MatchCache(sqlite_path=str(self.storage_dir / "cache.sqlite3"))
+        first, _ = match_with_counters(
+            MatchingService(match_cache=sqlite_cache), self.wf, self.index, threshold=70
+        )
+
+        # Nowy proces - pusta pamięć, wpisy tylko w bazie
+        MatchCache.clear_memory()
+        second, counters = match_with_counters(
+            MatchingService(match_cache=sqlite_cache), self.wf, self.index, threshold=70
+        )
+
+        self.assertEqual(second, first)
+        self.assertEqual(counters["match_cache_misses"], 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = MatchCache(max_entries=2)
+        scope = ("ref-1", "scorer", 70.0, 1)
+        cache.set_many(scope, {"a": [(0, 90.0)], "b": [(1, 80.0)]})
+        cache.get_many(scope, ["a"])
+
+        cache.set_many(scope, {"c": [(2, 75.0)]})
+
+        self.assertEqual(set(cache.get_many(scope, ["a", "b", "c"])), {"a", "c"})
@@ -0,0 +1,110 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from matching.exceptions import MatchingError
+from matching.models import MatchingSession
+from matching.services.matching_jobs import (
+    MatchingJobRunner,
+    SessionHeartbeatLog,
+    recover_stale_jobs,
+)
+from matching.tests.factories import TemporaryStorageMixin
+
+
+@override_settings(
+    MATCHING_JOB_STALE_MINUTES=30, MATCHING_JOB_PENDING_TIMEOUT_MINUTES=60
+)
+class StaleJobRecoveryTests(TemporaryStorageMixin, TestCase):
+    """Zadania osierocone po restarcie serwera oznaczane jako błędne"""
+
+    def create_session(self, status, minutes_ago=0, **fields):
+        session = MatchingSession.objects.create(
+            working_file_path="WF.xlsx", reference_file_path="REF.xlsx", status=status
+        )
+        # created_at ustawiane jest automatycznie - cofane osobną aktualizacją
+        MatchingSession.objects.filter(pk=session.pk).update(
+            created_at=timezone.now() - timedelta(minutes=minutes_ago), **fields
+        )
+        return session
+
+    def status_of(self, session):
+        return MatchingSession.objects.get(pk=session.pk).status
+
+    def test_only_orphaned_sessions_are_marked_as_error(self):
+        now = timezone.now()
+        silent = self.create_session(
+            MatchingSession.STATUS_RUNNING,
+            minutes_ago=120,
+            started_at=now - timedelta(minutes=100),
+            heartbeat_at=now - timedelta(minutes=45),
+        )
+        alive = self.create_session(
+            MatchingSession.STATUS_RUNNING,
+            minutes_ago=120,
+            started_at=now - timedelta(minutes=100),
+            heartbeat_at=now - timedelta(minutes=1),
+        )
+        old_pending = self.create_session(MatchingSession.STATUS_PENDING, 90)
+        queued = self.create_session(MatchingSession.STATUS_PENDING, 10)
+        completed = self.create_session(MatchingSession.STATUS_COMPLETED, 600)
+
+        self.assertEqual(recover_stale_jobs(), 2)
+
+        self.assertEqual(self.status_of(silent), MatchingSession.STATUS_ERROR)
+        self.assertEqual(self.status_of(old_pending), MatchingSession.STATUS_ERROR)
+        self.assertEqual(self.status_of(alive), MatchingSession.STATUS_RUNNING)
+        self.assertEqual(self.status_of(queued), MatchingSession.STATUS_PENDING)
+        self.assertEqual(self.status_of(completed), MatchingSession.STATUS_COMPLETED)
+        recovered = MatchingSession.objects.get(pk=silent.pk)
+        self.assertIsNotNone(recovered.finished_at)
+        self.assertTrue(recovered.error_message)
+
+    def test_running_session_without_heartbeat_uses_start_time(self):
+        session = self.create_session(
+            MatchingSession.STATUS_RUNNING,
+            minutes_ago=40,
+            started_at=timezone.now() - timedelta(minutes=40),
+        )
+
+        recover_stale_jobs()
+
+        self.assertEqual(self.status_of(session), MatchingSession.STATUS_ERROR)
+
+    def test_orphaned_sessions_do_not_fill_the_queue(self):
+        runner = MatchingJobRunner(max_workers=0, max_queued=2)
+        for _ in range(2):
+            self.create_session(MatchingSession.STATUS_PENDING, 90)
+
+        self.assertEqual(runner.active_job_count(), 0)
+        runner.check_capacity()
+
+        for _ in range(2):
+            self.create_session(MatchingSession.STATUS_PENDING)
+        with self.assertRaises(MatchingError):
+            runner.check_capacity()
+
+    def test_recover_command(self):
+        self.create_session(MatchingSession.STATUS_PENDING, 90)
+
+        output = StringIO()
+        call_command("recover_matching_jobs", stdout=output)
+
+        self.assertEqual(output.getvalue().strip(), "Oznaczone zadania osierocone: 1")
+
+    @override_settings(MATCHING_JOB_HEARTBEAT_SECONDS=0)
+    def test_progress_events_renew_heartbeat(self):
+        started = timezone.now() - timedelta(minutes=45)
+        session = self.create_session(
+            MatchingSession.STATUS_RUNNING, 45, started_at=started, heartbeat_at=started
+        )
+
+        SessionHeartbeatLog(session.pk).stage("match")
+        recover_stale_jobs()
+
+        session.refresh_from_db()
+        self.assertGreater(session.heartbeat_at, started)
+        self.assertEqual(session.status, MatchingSession.STATUS_RUNNING)
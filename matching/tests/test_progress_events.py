@@ -0,0 +1,128 @@
+import json
+
+from django.test import SimpleTestCase, TransactionTestCase
+
+from matching.models import MatchingResult, MatchingSession
+from matching.services.matching_jobs import run_matching_job
+from matching.services.progress_events import ProgressEventLog, follow_events
+from matching.tests.factories import (
+    TemporaryStorageMixin,
+    benchmark_files,
+    matching_session,
+)
+
+
+class FollowEventsTests(TemporaryStorageMixin, SimpleTestCase):
+    """Zapis zdarzeń NDJSON i odczyt strumienia (także wznowionego)"""
+
+    def follow(self, is_finished=lambda: True, after=0):
+        return list(
+            follow_events(1, is_finished, after=after, poll_interval=0.01, timeout=1)
+        )
+
+    def test_events_are_numbered_and_stream_ends_with_finish(self):
+        log = ProgressEventLog(1)
+        log.stage("load")
+        log.matches(5, 10, [{"wf_cell": "B4"}])
+        log.finish(MatchingSession.STATUS_COMPLETED)
+
+        events = self.follow(is_finished=lambda: False)
+
+        self.assertEqual(
+            [(event["seq"], event["type"]) for event in events],
+            [(1, "stage"), (2, "progress"), (3, "matches"), (4, "finished")],
+        )
+        self.assertEqual(events[1]["rows_done"], 5)
+        self.assertEqual(events[2]["results"], [{"wf_cell": "B4"}])
+
+    def test_progress_without_results_has_no_matches_event(self):
+        ProgressEventLog(1).matches(3, 10, [])
+
+        self.assertEqual([event["type"] for event in self.follow()], ["progress"])
+
+    def test_stream_resumes_after_last_received_event(self):
+        log = ProgressEventLog(1)
+        for stage in ("validate", "load", "extract"):
+            log.stage(stage)
+
+        events = self.follow(after=2)
+
+        self.assertEqual([event["stage"] for event in events], ["extract"])
+
+    def test_incomplete_line_is_not_read(self):
+        log = ProgressEventLog(1)
+        log.stage("load")
+        with open(log.path, "ab") as destination:
+            destination.write(b'{"seq": 2, "type": "sta')
+
+        self.assertEqual([event["seq"] for event in self.follow()], [1])
+
+    def test_idle_stream_yields_keep_alive(self):
+        ProgressEventLog(1)
+        polls = iter([False, True])
+
+        self.assertEqual(self.follow(is_finished=lambda: next(polls)), [None])
+
+
+class MatchingJobEventsTests(TemporaryStorageMixin, TransactionTestCase):
+    """Zdarzenia zadania dopasowania i ich strumień przez API"""
+
+    def setUp(self):
+        super().setUp()
+        files = benchmark_files(self.storage_dir / "files", wf_rows=60, ref_rows=200)
+        self.session = matching_session(files, matching_threshold=70)
+        run_matching_job(self.session.pk)
+        self.session.refresh_from_db()
+
+    def stream(self, **headers):
+        response = self.client.get(
+            f"/matching/sessions/{self.session.pk}/events/", **headers
+        )
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_job_events_describe_stages_progress_and_results(self):
+        events = [json.loads(line) for line in self.stream().splitlines()]
+
+        self.assertEqual(self.session.status, MatchingSession.STATUS_COMPLETED)
+        self.assertEqual(
+            [event["seq"] for event in events], list(range(1, len(events) + 1))
+        )
+        stages = [event["stage"] for event in events if event["type"] == "stage"]
+        self.assertEqual(stages[:2], ["validate", "load"])
+        self.assertIn("match", stages)
+
+        progress = [event for event in events if event["type"] == "progress"]
+        rows_done = [event["rows_done"] for event in progress]
+        self.assertEqual(rows_done, sorted(rows_done))
+        self.assertEqual(rows_done[-1], progress[-1]["rows_total"])
+        self.assertEqual(progress[-1]["rows_total"], 60)
+
+        streamed = sum(
+            len(event["results"]) for event in events if event["type"] == "matches"
+        )
+        self.assertEqual(
+            streamed, MatchingResult.objects.filter(session=self.session).count()
+        )
+
+        finished = events[-1]
+        self.assertEqual(finished["type"], "finished")
+        self.assertEqual(finished["status"], MatchingSession.STATUS_COMPLETED)
+        self.assertEqual(finished["counters"]["wf_rows_read"], 60)
+        self.assertIn("exact_match_rate", finished["rates"])
+        self.assertEqual(
+            {
+                "exact_match_rate": self.session.exact_match_rate,
+                "dedup_ratio": self.session.dedup_ratio,
+            },
+            finished["rates"],
+        )
+
+    def test_event_stream_format_and_resume(self):
+        last_seq = len(self.stream().splitlines())
+
+        body = self.stream(
+            HTTP_ACCEPT="text/event-stream", HTTP_LAST_EVENT_ID=str(last_seq - 1)
+        )
+
+        self.assertEqual(body.splitlines()[:2], [f"id: {last_seq}", "event: finished"])
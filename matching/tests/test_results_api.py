@@ -0,0 +1,135 @@
+import json
+from decimal import Decimal
+
+from django.test import TestCase
+
+from matching.models import MatchingResult, MatchingSession
+
+
+class SessionResultsApiTests(TestCase):
+    """Stronicowanie wyników po kluczu (match_score, id), ETag i eksport"""
+
+    # Wyniki z remisami - kolejność ustala id malejąco
+    SCORES = [95, 90, 90, 90, 85, 80, 80, 75]
+
+    def setUp(self):
+        self.session = MatchingSession.objects.create(
+            working_file_path="WF.xlsx",
+            reference_file_path="REF.xlsx",
+            status=MatchingSession.STATUS_COMPLETED,
+        )
+        for row, score in enumerate(self.SCORES, start=4):
+            self.add_result(row, score)
+        self.url = f"/matching/sessions/{self.session.pk}/results/"
+
+    def add_result(self, row, score):
+        return MatchingResult.objects.create(
+            session=self.session,
+            wf_description=f"opis {row}",
+            wf_cell=f"B{row}",
+            ref_description=f"katalog {row}",
+            ref_cell=f"C{row}",
+            ref_file_name="REF.xlsx",
+            match_score=score,
+            price=Decimal(row),
+        )
+
+    def expected_order(self):
+        return list(
+            MatchingResult.objects.filter(session=self.session)
+            .order_by("-match_score", "-id")
+            .values_list("id", flat=True)
+        )
+
+    def test_pages_follow_keyset_without_gaps_or_duplicates(self):
+        ids, cursor, pages = [], None, 0
+        while True:
+            params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 200)
+            ids += [result["id"] for result in response.json()["results"]]
+            pages += 1
+            cursor = response.json()["next_cursor"]
+            if cursor is None:
+                break
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(ids, self.expected_order())
+
+    def test_cursor_page_is_stable_when_rows_are_added_before_it(self):
+        first = self.client.get(self.url, {"limit": 3}).json()
+        self.add_result(20, 99)
+
+        second = self.client.get(self.url, {"limit": 3, "cursor": first["next_cursor"]})
+
+        self.assertEqual(
+            [result["id"] for result in second.json()["results"]],
+            self.expected_order()[4:7],
+        )
+
+    def test_score_range_filter(self):
+        response = self.client.get(self.url, {"min_score": 80, "max_score": 90})
+
+        self.assertEqual(
+            [result["match_score"] for result in response.json()["results"]],
+            [90, 90, 90, 85, 80, 80],
+        )
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {"cursor": "nie-kursor"})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_modified_with_matching_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertNotEqual(
+            self.client.get(self.url, {"limit": 2})["ETag"],
+            etag,
+            "ETag zależy od parametrów zapytania",
+        )
+
+    def test_etag_of_running_session_follows_new_results(self):
+        self.session.status = MatchingSession.STATUS_RUNNING
+        self.session.save()
+        first = self.client.get(self.url)
+        self.assertEqual(first["Cache-Control"], "no-store")
+
+        self.add_result(30, 70)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), len(self.SCORES) + 1)
+
+    def test_completed_session_results_may_be_cached(self):
+        response = self.client.get(self.url)
+
+        self.assertFalse(response.has_header("Cache-Control"))
+
+    def test_ndjson_export_streams_all_rows_in_order(self):
+        url = f"/matching/sessions/{self.session.pk}/results/export/ndjson/"
+
+        response = self.client.get(url)
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+
+        self.assertEqual([row["id"] for row in rows], self.expected_order())
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304
+        )
+
+    def test_csv_export_has_header_row(self):
+        response = self.client.get(
+            f"/matching/sessions/{self.session.pk}/results/export/csv/",
+            {"min_score": 90},
+        )
+        lines = b"".join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(lines[0].split(",")[:2], ["id", "wf_description"])
+        self.assertEqual(len(lines), 1 + 4)
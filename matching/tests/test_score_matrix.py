@@ -0,0 +1,96 @@
+import numpy as np
+from django.test import SimpleTestCase
+from rapidfuzz import fuzz
+
+from matching.services.matching_service import MatchingService
+from matching.tests.factories import (
+    generated_descriptions,
+    ref_data,
+    reference_index,
+    wf_data,
+)
+
+
+class ScoreMatrixTests(SimpleTestCase):
+    """Macierz wyników WF x REF i wybór najlepszego wiersza REF (argmax)"""
+
+    def setUp(self):
+        self.service = MatchingService(candidate_limit=None)
+        self.wf_texts = ["rura pcv dn 110", "kabel yky 3x2.5", "tynk gipsowy"]
+        self.ref_texts = ["rura pvc dn 110", "kabel ydy 3x2.5", "rura pe dn 110", "farba"]
+
+    def test_score_matrix_matches_pairwise_scorer(self):
+        scores = self.service.score_matrix(self.wf_texts, self.ref_texts)
+
+        expected = [
+            [fuzz.ratio(wf_text, ref_text) for ref_text in self.ref_texts]
+            for wf_text in self.wf_texts
+        ]
+        self.assertEqual(scores.shape, (3, 4))
+        np.testing.assert_allclose(scores, expected)
+
+    def test_score_matrix_zeroes_scores_below_threshold(self):
+        full = self.service.score_matrix(self.wf_texts, self.ref_texts)
+        cut = self.service.score_matrix(self.wf_texts, self.ref_texts, threshold=60)
+
+        np.testing.assert_allclose(cut, np.where(full >= 60, full, 0))
+
+    def test_best_match_equals_row_by_row_search(self):
+        wf_descriptions, catalog = generated_descriptions(wf_rows=60, ref_rows=150)
+        ref_descriptions, ref_prices = ref_data(catalog)
+        wf = wf_data(wf_descriptions)
+
+        results = self.service.match_reference_index(
+            wf, reference_index(catalog), threshold=70
+        )
+
+        expected = [
+            match
+            for match in (
+                self.service.find_best_match(
+                    description, ref_descriptions, ref_prices, "E", threshold=70
+                )
+                for description in wf
+            )
+            if match is not None
+        ]
+        self.assertEqual(
+            [(r["wf_cell"], r["ref_cell"], r["price"]) for r in results],
+            [(r["wf_cell"], r["ref_cell"], r["price"]) for r in expected],
+        )
+        for result, match in zip(results, expected):
+            self.assertAlmostEqual(result["match_score"], match["match_score"])
+
+    def test_tie_goes_to_first_reference_row(self):
+        results = self.service.match_reference_index(
+            wf_data(["rura pcv 110 mm"]),
+            reference_index(["farba", "rura pvc 110 mm", "rura pvc 110 mm"]),
+            threshold=50,
+        )
+
+        self.assertEqual(results[0]["ref_cell"], "C5")
+
+    def test_rows_below_threshold_have_no_result(self):
+        results = self.service.match_reference_index(
+            wf_data(["rura pcv dn 110", "zupełnie inny opis"]),
+            reference_index(["rura pvc dn 110", "farba"]),
+            threshold=80,
+        )
+
+        self.assertEqual([result["wf_cell"] for result in results], ["B4"])
+        self.assertGreaterEqual(results[0]["match_score"], 80)
+
+    def test_matrix_blocks_give_same_results_as_single_block(self):
+        wf_descriptions, catalog = generated_descriptions(wf_rows=40, ref_rows=50)
+        index = reference_index(catalog)
+        single_block = self.service.match_reference_index(
+            wf_data(wf_descriptions), index, threshold=60, top_k=3
+        )
+
+        # Kilka wierszy WF na blok zamiast całej macierzy naraz
+        self.service.MAX_MATRIX_CELLS = 3 * len(catalog)
+        blocks = self.service.match_reference_index(
+            wf_data(wf_descriptions), index, threshold=60, top_k=3
+        )
+
+        self.assertEqual(blocks, single_block)
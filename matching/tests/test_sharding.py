@@ -0,0 +1,108 @@
+import dataclasses
+import os
+
+from django.test import SimpleTestCase, override_settings
+from rapidfuzz import fuzz
+
+from matching.services.matching_service import MatchingService
+from matching.services.reference_index import ReferenceIndex
+from matching.services.sharding import shard_pool
+from matching.tests.factories import (
+    generated_descriptions,
+    match_with_counters,
+    ref_data,
+    wf_data,
+)
+from matching.tests.scorers import sequence_ratio
+
+
+@override_settings(MATCHING_SHARD_MIN_ROWS=10)
+class ShardedMatchingTests(SimpleTestCase):
+    """Podział wierszy WF między procesy - te same wyniki co w jednym procesie"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        wf_descriptions, catalog = generated_descriptions(
+            wf_rows=50, ref_rows=100, seed=5
+        )
+        # Powtórzone wiersze - wyniki kopiowane z wierszy liczonych w innym procesie
+        cls.wf = wf_data(wf_descriptions + wf_descriptions[:10])
+        first, second = ref_data(catalog[:50]), ref_data(catalog[50:])
+        cls.index = ReferenceIndex.from_catalogs(
+            [
+                ("A.xlsx", [("", first[0], first[1], "E")]),
+                ("B.xlsx", [("", second[0], second[1], "E")]),
+            ],
+            key="sharding-test",
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shard_pool.shutdown()
+        super().tearDownClass()
+
+    @staticmethod
+    def matching_service(shard_workers, blocking=False):
+        service = MatchingService(sequence_ratio, shard_workers=shard_workers)
+        if blocking:
+            service.BLOCKING_MIN_REF_ROWS = 1
+        return service
+
+    def test_sharded_results_equal_single_process_results(self):
+        variants = {
+            "top_1": (False, {}),
+            "top_3": (False, {"top_k": 3}),
+            "catalog_bias": (False, {"top_k": 2, "catalog_bias": {"B.xlsx": 5}}),
+            "blocking": (True, {"top_k": 2}),
+        }
+        for name, (blocking, options) in variants.items():
+            with self.subTest(variant=name):
+                single, single_counters = match_with_counters(
+                    self.matching_service(0, blocking),
+                    self.wf,
+                    self.index,
+                    threshold=50,
+                    **options,
+                )
+                sharded, sharded_counters = match_with_counters(
+                    self.matching_service(2, blocking),
+                    self.wf,
+                    self.index,
+                    threshold=50,
+                    **options,
+                )
+
+                self.assertGreater(len(single), 0)
+                self.assertEqual(sharded, single)
+                # Liczniki procesów roboczych doliczane są do zadania
+                self.assertEqual(
+                    sharded_counters["comparisons"], single_counters["comparisons"]
+                )
+
+    def test_pool_is_reused_and_temporary_index_removed(self):
+        match_with_counters(self.matching_service(2), self.wf, self.index, threshold=50)
+        executor = shard_pool.executor(2)
+        temporary = dataclasses.replace(self.index, key=None)
+        MatchingService(sequence_ratio, shard_workers=2).match_reference_index(
+            self.wf, temporary, threshold=50
+        )
+
+        self.assertIs(shard_pool.executor(2), executor)
+        published = os.listdir(shard_pool._ensure_directory())
+        self.assertEqual(published, ["index-sharding-test.pickle"])
+
+    def test_scorers_that_are_not_sharded(self):
+        rows = len(self.wf)
+
+        def shard_workers(matching_function, workers=2, rows=rows):
+            service = MatchingService(matching_function, shard_workers=workers)
+            return service._shard_worker_count(rows)
+
+        self.assertEqual(shard_workers(sequence_ratio), 2)
+        # RapidFuzz liczy bez GIL, a małe pliki nie opłacają uruchomienia procesów
+        self.assertEqual(shard_workers(fuzz.ratio), 0)
+        self.assertEqual(shard_workers(sequence_ratio, workers=0), 0)
+        self.assertEqual(shard_workers(sequence_ratio, rows=5), 0)
+        with self.assertLogs("matching.services.matching_service", "WARNING"):
+            self.assertEqual(shard_workers(lambda first, second: 0.0), 0)
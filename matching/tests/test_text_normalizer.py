@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from matching.services.matching_service import MatchingService
+from matching.services.text_normalizer import TextNormalizer
+from matching.tests.factories import ref_data
+
+
+class TextNormalizerTests(SimpleTestCase):
+    """Normalizacja opisów: wielkość liter, polskie znaki, jednostki i liczby"""
+
+    def setUp(self):
+        self.normalizer = TextNormalizer()
+
+    def assertNormalized(self, cases, normalizer=None):
+        normalizer = normalizer or self.normalizer
+        for text, expected in cases:
+            with self.subTest(text=text):
+                self.assertEqual(normalizer.normalize(text), expected)
+
+    def test_case_diacritics_and_whitespace(self):
+        self.assertNormalized(
+            [
+                ("Ściana  DZIAŁOWA\tżelbetowa", "sciana dzialowa zelbetowa"),
+                ("Łączenie  rur", "laczenie rur"),
+            ]
+        )
+
+    def test_units_and_abbreviations(self):
+        self.assertNormalized(
+            [
+                ("Tynk 12 m²", "tynk 12 m2"),
+                ("Tynk 12 m^2", "tynk 12 m2"),
+                ("Tynk 12 m kw.", "tynk 12 m2"),
+                ("Beton 3 m szesc.", "beton 3 m3"),
+                ("Obrzeża 10 m.b.", "obrzeza 10 mb"),
+                ("Drzwi - 2 sztuki", "drzwi 2 szt"),
+                ("Rura ø110", "rura fi 110"),
+            ]
+        )
+
+    def test_numbers(self):
+        self.assertNormalized(
+            [
+                ("0,50m2", "0.5 m2"),
+                ("Rura 100,00mm", "rura 100 mm"),
+                ("DN110,0", "dn 110"),
+                ("Kabel 3x2,5", "kabel 3 x 2.5"),
+                ("wersja v1.0.0", "wersja v 1.0.0"),
+                ("termin 01.10.2024", "termin 01.10.2024"),
+            ]
+        )
+
+    def test_exponent_is_kept_only_after_unit(self):
+        self.assertNormalized(
+            [
+                ("Płyta 2m2", "plyta 2 m2"),
+                ("wariant 2 m 3 szt", "wariant 2 m 3 szt"),
+            ]
+        )
+
+    def test_steps_can_be_disabled(self):
+        normalizer = TextNormalizer(
+            casefold=False,
+            fold_diacritics=False,
+            canonical_units=False,
+            normalize_numbers=False,
+        )
+
+        self.assertNormalized([("Tynk  12,50 m²", "Tynk 12,50 m2")], normalizer)
+
+    def test_signature_follows_options(self):
+        self.assertEqual(TextNormalizer().signature, self.normalizer.signature)
+        self.assertNotEqual(
+            TextNormalizer(fold_diacritics=False).signature, self.normalizer.signature
+        )
+
+    @override_settings(MATCHING_TEXT_NORMALIZATION={"casefold": False})
+    def test_from_settings(self):
+        normalizer = TextNormalizer.from_settings()
+
+        self.assertFalse(normalizer.casefold)
+        self.assertTrue(normalizer.fold_diacritics)
+
+    def test_normalize_many_computes_repeated_text_once(self):
+        with mock.patch.object(
+            self.normalizer, "normalize", wraps=self.normalizer.normalize
+        ) as normalize:
+            normalized = self.normalizer.normalize_many(["Rura", "Kabel", "Rura"])
+
+        self.assertEqual(normalized, ["rura", "kabel", "rura"])
+        self.assertEqual(normalize.call_count, 2)
+
+    def test_find_best_match_normalizes_reference_once(self):
+        service = MatchingService(normalizer=self.normalizer)
+        ref_descriptions, ref_prices = ref_data(["Rura PVC DN 110", "Farba", "Tynk"])
+
+        with mock.patch.object(
+            self.normalizer, "normalize", wraps=self.normalizer.normalize
+        ) as normalize:
+            for cell, description in enumerate(["rura pcv", "farby", "tynk"]):
+                service.find_best_match(
+                    (description, f"B{cell}"), ref_descriptions, ref_prices, "E", 50
+                )
+
+        # 3 opisy REF raz oraz 3 opisy WF
+        self.assertEqual(normalize.call_count, 6)
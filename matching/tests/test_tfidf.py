@@ -0,0 +1,45 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from matching.services.tfidf_matching_service import TfidfMatchingService
+from matching.tests.factories import generated_descriptions, reference_index, wf_data
+
+
+class TfidfMatchingTests(SimpleTestCase):
+    """Najlepsze dopasowania z macierzy rzadkiej zgodne z macierzą gęstą"""
+
+    def setUp(self):
+        wf_descriptions, catalog = generated_descriptions(wf_rows=60, ref_rows=200)
+        self.index = reference_index(catalog)
+        self.wf_texts = self.index.normalizer.normalize_many(wf_descriptions)
+        # Zbiór n-gramów małego katalogu - bez pomijania częstych n-gramów
+        self.service = TfidfMatchingService(max_document_frequency=1.0)
+
+    def test_sparse_top_k_equals_dense_ranking(self):
+        dense = self.service.score_matrix(
+            self.wf_texts, [], reference_index=self.index
+        )
+
+        for threshold, top_k in [(0, 1), (40, 1), (0, 3), (40, 3)]:
+            with self.subTest(threshold=threshold, top_k=top_k):
+                indices, scores = self.service._best_block_matches(
+                    self.wf_texts, self.index, threshold, top_k
+                )
+
+                expected = self.service._top_k_indices(
+                    np.where(dense >= threshold, dense, 0), top_k
+                )
+                np.testing.assert_array_equal(indices, expected)
+                expected_scores = np.take_along_axis(dense, expected, axis=1)
+                expected_scores[expected < 0] = 0
+                np.testing.assert_allclose(scores, expected_scores)
+
+    def test_results_within_score_scale(self):
+        results = self.service.match_reference_index(
+            wf_data(self.index.descriptions[:5]), self.index, threshold=50, top_k=2
+        )
+
+        self.assertEqual(len(results), 5)
+        for row, result in enumerate(results):
+            self.assertEqual(result["ref_cell"], self.index.cells[row])
+            self.assertLessEqual(result["match_score"], 100.0)
@@ -0,0 +1,99 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from matching.services.matching_service import MatchingService
+from matching.tests.factories import (
+    generated_descriptions,
+    ref_data,
+    reference_index,
+    wf_data,
+)
+
+
+def ranking(result):
+    """(komórka REF, wynik) najlepszego kandydata i kolejnych alternatyw"""
+    candidates = [result, *result.get("alternatives", [])]
+    return [(candidate["ref_cell"], candidate["match_score"]) for candidate in candidates]
+
+
+class TopKTests(SimpleTestCase):
+    """Kolejność top_k kandydatów, remisy i brakujący kandydaci"""
+
+    def setUp(self):
+        self.service = MatchingService(candidate_limit=None)
+
+    def test_top_k_indices_order_and_ties(self):
+        scores = np.array(
+            [
+                [50.0, 90.0, 70.0, 90.0, 10.0],
+                [0.0, 0.0, 80.0, 0.0, 0.0],
+            ]
+        )
+
+        best = self.service._top_k_indices(scores, 3)
+
+        # Remis 90/90 - wcześniejszy wiersz REF pierwszy; wyniki 0 pomijane (-1)
+        np.testing.assert_array_equal(best, [[1, 3, 2], [2, -1, -1]])
+
+    def test_find_best_match_returns_ranked_alternatives(self):
+        ref_descriptions, ref_prices = ref_data(
+            ["rura pvc dn 110", "farba", "rura pvc dn 110", "rura pe dn 110", "rura"]
+        )
+
+        result = self.service.find_best_match(
+            ("rura pcv dn 110", "B4"), ref_descriptions, ref_prices, "E", 40, top_k=3
+        )
+
+        cells_and_scores = ranking(result)
+        self.assertEqual([cell for cell, _ in cells_and_scores], ["C4", "C6", "C7"])
+        scores = [score for _, score in cells_and_scores]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(scores[0], scores[1])
+
+    def test_fewer_candidates_than_top_k(self):
+        results = self.service.match_reference_index(
+            wf_data(["rura pcv dn 110"]),
+            reference_index(["rura pvc dn 110", "farba", "tynk"]),
+            threshold=60,
+            top_k=5,
+        )
+
+        self.assertEqual(len(ranking(results[0])), 1)
+
+    def test_matrix_and_blocked_top_k_equal_row_by_row_search(self):
+        wf_descriptions, catalog = generated_descriptions(wf_rows=50, ref_rows=400)
+        ref_descriptions, ref_prices = ref_data(catalog)
+        wf = wf_data(wf_descriptions)
+        index = reference_index(catalog)
+        expected = [
+            ranking(match)
+            for match in (
+                self.service.find_best_match(
+                    description, ref_descriptions, ref_prices, "E", 60, top_k=3
+                )
+                for description in wf
+            )
+            if match is not None
+        ]
+
+        blocking = MatchingService(candidate_limit=400, min_gram_overlap=0)
+        blocking.BLOCKING_MIN_REF_ROWS = 1
+        for service in (self.service, blocking):
+            with self.subTest(blocking=service is blocking):
+                results = service.match_reference_index(wf, index, 60, top_k=3)
+                self.assertEqual([ranking(result) for result in results], expected)
+
+    def test_custom_pairwise_scorer_with_top_k(self):
+        def common_words(first, second):
+            first_words, second_words = set(first.split()), set(second.split())
+            return 100 * len(first_words & second_words) / len(first_words | second_words)
+
+        service = MatchingService(matching_function=common_words, shard_workers=0)
+        results = service.match_reference_index(
+            wf_data(["rura pcv dn 110"]),
+            reference_index(["rura pvc dn 110", "rura pcv dn 160", "rura pcv"]),
+            threshold=40,
+            top_k=2,
+        )
+
+        self.assertEqual(ranking(results[0]), [("C4", 60.0), ("C5", 60.0)])
@@ -0,0 +1,81 @@
+from django.test import SimpleTestCase
+
+from matching.services.matching_service import MatchingService, matching_rates
+from matching.tests.factories import match_with_counters, reference_index, wf_data
+
+
+class WorkingFileDedupTests(SimpleTestCase):
+    """Powtórzone opisy WF porównywane raz, wynik trafia do każdego wiersza"""
+
+    CATALOG = ["Rura PVC DN 110", "Kabel YDY 3x2,5", "Farba akrylowa biała"]
+
+    def setUp(self):
+        self.service = MatchingService()
+        self.index = reference_index(self.CATALOG)
+
+    def test_repeated_descriptions_are_compared_once(self):
+        descriptions = [
+            "rura pcv dn 110",
+            "Farba akryl. biała",
+            "RURA PCV DN110",
+            "rura pcv dn 110",
+            "farba akryl. biala",
+        ]
+
+        results, counters = match_with_counters(
+            self.service, wf_data(descriptions), self.index, threshold=60
+        )
+
+        self.assertEqual(counters["comparisons"], 2 * len(self.CATALOG))
+        self.assertEqual(counters["wf_duplicate_rows"], 3)
+        self.assertEqual(
+            [(r["wf_cell"], r["wf_description"], r["ref_cell"]) for r in results],
+            [
+                ("B4", "rura pcv dn 110", "C4"),
+                ("B5", "Farba akryl. biała", "C6"),
+                ("B6", "RURA PCV DN110", "C4"),
+                ("B7", "rura pcv dn 110", "C4"),
+                ("B8", "farba akryl. biala", "C6"),
+            ],
+        )
+        self.assertEqual(results[0]["match_score"], results[2]["match_score"])
+
+    def test_batches_cover_rows_in_order(self):
+        batches = []
+        descriptions = ["rura pcv dn 110", "Rura PVC DN 110", "rura pcv dn 110", "xyz"]
+
+        results, _ = match_with_counters(
+            self.service,
+            wf_data(descriptions),
+            self.index,
+            threshold=60,
+            on_batch=lambda done, total, block: batches.append((done, total, block)),
+        )
+
+        rows_done = [done for done, _, _ in batches]
+        self.assertEqual(rows_done, sorted(rows_done))
+        self.assertEqual(batches[-1][:2], (4, 4))
+        self.assertEqual([r for _, _, block in batches for r in block], results)
+
+    def test_statistics_report_dedup_ratio(self):
+        descriptions = ["rura pcv dn 110", "xyz", "RURA PCV DN110", "xyz"]
+        results, counters = match_with_counters(
+            self.service, wf_data(descriptions), self.index, threshold=60
+        )
+        counters["wf_rows_read"] = len(descriptions)
+
+        statistics = self.service.get_matching_statistics(results, counters)
+
+        self.assertEqual(statistics["dedup_ratio"], 0.5)
+        empty = self.service.get_matching_statistics([], {"wf_rows_read": 0})
+        self.assertEqual(empty["dedup_ratio"], 0.0)
+
+    def test_matching_rates(self):
+        rates = matching_rates(
+            {"wf_rows_read": 8, "exact_matches": 2, "wf_duplicate_rows": 3}
+        )
+
+        self.assertEqual(rates, {"exact_match_rate": 0.25, "dedup_ratio": 0.375})
+        self.assertEqual(
+            matching_rates({}), {"exact_match_rate": 0.0, "dedup_ratio": 0.0}
+        )
@@ -1,6 +1,41 @@
 from django.urls import path
-from matching.views import MatchingView
+from matching.views import (
+    MatchingSessionEventsView,
+    MatchingSessionProfileView,
+    MatchingSessionResultsExportView,
+    MatchingSessionResultsView,
+    MatchingSessionView,
+    MatchingView,
+)
 
 urlpatterns = [
     path("compare/rapidfuzz/", MatchingView.as_view(), name="compare-rapidfuzz"),
+    path(
+        "compare/tfidf/", MatchingView.as_view(engine="tfidf"), name="compare-tfidf"
+    ),
+    path(
+        "sessions/<int:session_id>/",
+        MatchingSessionView.as_view(),
+        name="matching-session",
+    ),
+    path(
+        "sessions/<int:session_id>/events/",
+        MatchingSessionEventsView.as_view(),
+        name="matching-session-events",
+    ),
+    path(
+        "sessions/<int:session_id>/profile/<str:profile_format>/",
+        MatchingSessionProfileView.as_view(),
+        name="matching-session-profile",
+    ),
+    path(
+        "sessions/<int:session_id>/results/",
+        MatchingSessionResultsView.as_view(),
+        name="matching-session-results",
+    ),
+    path(
+        "sessions/<int:session_id>/results/export/<str:export_format>/",
+        MatchingSessionResultsExportView.as_view(),
+        name="matching-session-results-export",
+    ),
 ]
@@ -1,27 +1,85 @@
+import csv
+import hashlib
+import json
 from pathlib import Path
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from rest_framework.permissions import IsAdminUser
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.response import Response
 
-from matching.serializers import MatchingRequestSerializer
-from matching.services.matching_orchestrator import MatchingConfig, MatchingOrchestrator
-from matching.services.excel_processor import ExcelProcessor
+from matching.exceptions import MatchingError, ValidationError
+from matching.models import MatchingResult, MatchingSession
+from matching.pagination import MatchScoreKeysetPagination
+from matching.renderers import (
+    CSVRenderer,
+    EventStreamRenderer,
+    NDJSONRenderer,
+    PrometheusTextRenderer,
+)
+from matching.serializers import (
+    MatchingRequestSerializer,
+    MatchingResultSerializer,
+    MatchingSessionSerializers,
+    ResultQuerySerializer,
+)
+from matching.services import metrics
+from matching.services.matching_orchestrator import MatchingConfig
 from matching.services.data_validator import DataValidator
-from matching.services.matching_service import MatchingService
-from matching.services.result_writer import ResultWriter
+from matching.services.matching_jobs import MatchingJobRunner
+from matching.services.profiling import collapsed_path_for
+from matching.services.progress_events import follow_events
+from matching.services.reference_catalog import ReferenceCatalog
+from matching.services.sheet_config import SheetConfig
+
+
+def sheet_configs(file_config, price_field):
+    """Arkusze pliku z żądania - pominięte kolumny i zakres przejmowane z pliku"""
+    return [
+        SheetConfig(
+            sheet=sheet["name"],
+            description_column=sheet.get(
+                "description_column", file_config["description_column"]
+            ),
+            description_range=dict(
+                sheet.get("description_range", file_config["description_range"])
+            ),
+            price_column=sheet.get(price_field, file_config[price_field]),
+        )
+        for sheet in file_config.get("sheets", [])
+    ]
+
+
+def reference_catalog(file_config):
+    """Katalog REF z żądania (bez listy arkuszy - aktywny arkusz pliku)"""
+    return ReferenceCatalog(
+        file_path=Path(file_config["file_path"]),
+        sheets=sheet_configs(file_config, "price_source_column")
+        or [
+            SheetConfig(
+                sheet=None,
+                description_column=file_config["description_column"],
+                description_range=dict(file_config["description_range"]),
+                price_column=file_config["price_source_column"],
+            )
+        ],
+        score_bias=file_config["score_bias"],
+    )
 
 
 class MatchingView(APIView):
+    # Silnik dopasowania - ustawiany w urls.py przez as_view(engine=...)
+    engine = "rapidfuzz"
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        excel_processor = ExcelProcessor()
-
-        self.orchestrator = MatchingOrchestrator(
-            excel_processor=ExcelProcessor(),
-            data_validator=DataValidator(),
-            matching_service=MatchingService(),
-            result_writer=ResultWriter(excel_processor=excel_processor),
-        )
+        self.job_runner = MatchingJobRunner()
 
     def post(self, request):
         serializer = MatchingRequestSerializer(data=request.data)
@@ -57,11 +115,388 @@ class MatchingView(APIView):
                     ref_price_source_column=validated_data["reference_file"][
                         "price_source_column"
                     ],
+                    top_k=validated_data["top_k"],
+                    engine=self.engine,
+                    wf_sheets=sheet_configs(
+                        validated_data["working_file"], "price_target_column"
+                    ),
+                    ref_sheets=sheet_configs(
+                        validated_data["reference_file"], "price_source_column"
+                    ),
+                    ref_score_bias=validated_data["reference_file"]["score_bias"],
+                    additional_catalogs=[
+                        reference_catalog(file_config)
+                        for file_config in validated_data.get(
+                            "additional_reference_files", []
+                        )
+                    ],
                 )
 
-                # Wywołanie procesu dopasowania
-                report_path = self.orchestrator.process_matching_request(config)
-                return Response({"report_path": report_path}, status=status.HTTP_200_OK)
-            except Exception as e:
+                # Szybka walidacja plików przed zleceniem zadania (bez ich parsowania)
+                DataValidator().validate_files(
+                    config.working_file_path,
+                    config.reference_file_path,
+                    additional_reference_file_paths=[
+                        catalog.file_path for catalog in config.additional_catalogs
+                    ],
+                )
+                self.job_runner.check_capacity()
+            except ValidationError as e:
+                metrics.record_failure(e, phase="submit")
                 return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            except MatchingError as e:
+                metrics.record_failure(e, phase="submit")
+                return Response(
+                    {"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+                )
+
+            # Profilowanie zadania dostępne tylko dla personelu
+            if validated_data["profile"] and not request.user.is_staff:
+                return Response(
+                    {"error": "Profilowanie zadania dostępne jest tylko dla personelu"},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+
+            # Zadanie wykonywane jest w tle - klient odpytuje status sesji
+            session = MatchingSession.objects.create(
+                working_file_path=str(config.working_file_path),
+                reference_file_path=str(config.reference_file_path),
+                config=config.to_dict(),
+                profile_enabled=validated_data["profile"],
+            )
+            self.job_runner.submit(session)
+            session.refresh_from_db(fields=["status"])
+
+            return Response(
+                {
+                    "session_id": session.pk,
+                    "status": session.status,
+                    "status_url": reverse("matching-session", args=[session.pk]),
+                    "events_url": reverse(
+                        "matching-session-events", args=[session.pk]
+                    ),
+                },
+                status=status.HTTP_202_ACCEPTED,
+            )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class MatchingSessionView(APIView):
+    """Status zadania dopasowania (PENDING / RUNNING / COMPLETED / ERROR)"""
+
+    def get(self, request, session_id):
+        session = get_object_or_404(MatchingSession, pk=session_id)
+        return Response(
+            MatchingSessionSerializers(session, context={"request": request}).data
+        )
+
+
+class MatchingSessionProfileView(APIView):
+    """
+    Pobranie profilu zadania (tylko personel): pstats (cProfile, np. snakeviz)
+    lub collapsed (stosy dla flamegraph.pl / speedscope).
+    """
+
+    permission_classes = [IsAdminUser]
+    PROFILE_FORMATS = ("pstats", "collapsed")
+
+    def get(self, request, session_id, profile_format):
+        if profile_format not in self.PROFILE_FORMATS:
+            return Response(
+                {"error": f"Nieobsługiwany format profilu: {profile_format}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        session = get_object_or_404(MatchingSession, pk=session_id)
+        if not session.profile_path:
+            return Response(
+                {"error": "Sesja nie ma zapisanego profilu"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        path = Path(session.profile_path)
+        if profile_format == "collapsed":
+            path = collapsed_path_for(path)
+        if not path.exists():
+            return Response(
+                {"error": "Plik profilu nie istnieje"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return FileResponse(open(path, "rb"), as_attachment=True, filename=path.name)
+
+
+class MatchingSessionEventsView(APIView):
+    """
+    Strumień zdarzeń postępu zadania dopasowania: etapy, postęp dopasowania
+    (rows_done / rows_total), paczki gotowych wyników oraz zdarzenie końcowe.
+
+    Format wybierany nagłówkiem Accept lub parametrem ?format=:
+    text/event-stream (sse) albo application/x-ndjson (ndjson, domyślny).
+    Wznowienie strumienia: nagłówek Last-Event-ID lub parametr ?after=<seq>.
+    """
+
+    renderer_classes = [NDJSONRenderer, EventStreamRenderer]
+
+    def get(self, request, session_id):
+        session = get_object_or_404(MatchingSession, pk=session_id)
+        after = request.META.get("HTTP_LAST_EVENT_ID") or request.query_params.get(
+            "after", "0"
+        )
+        after = int(after) if str(after).isdigit() else 0
+
+        finished_statuses = [
+            MatchingSession.STATUS_COMPLETED,
+            MatchingSession.STATUS_ERROR,
+        ]
+
+        def is_finished() -> bool:
+            return MatchingSession.objects.filter(
+                pk=session.pk, status__in=finished_statuses
+            ).exists()
+
+        events = follow_events(session.pk, is_finished, after=after)
+        if request.accepted_renderer.format == EventStreamRenderer.format:
+            stream = self._sse_lines(events)
+        else:
+            stream = self._ndjson_lines(events)
+
+        response = StreamingHttpResponse(
+            stream, content_type=request.accepted_renderer.media_type
+        )
+        # Zdarzenia mają trafiać do klienta od razu (bez buforowania przez proxy)
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    @staticmethod
+    def _encode(event) -> str:
+        return json.dumps(event, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+    def _ndjson_lines(self, events):
+        for event in events:
+            if event is not None:
+                yield self._encode(event) + "\n"
+
+    def _sse_lines(self, events):
+        for event in events:
+            if event is None:
+                # Komentarz keep-alive - połączenie nie zostanie zamknięte jako bezczynne
+                yield ": keep-alive\n\n"
+            else:
+                yield (
+                    f"id: {event['seq']}\nevent: {event['type']}\n"
+                    f"data: {self._encode(event)}\n\n"
+                )
+
+
+class SessionResultsMixin:
+    """Wspólne dla odczytu wyników sesji: filtr przedziału podobieństwa i ETag"""
+
+    def get_session_and_query(self, request, session_id):
+        session = get_object_or_404(MatchingSession, pk=session_id)
+        query = ResultQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return session, query.validated_data
+
+    @staticmethod
+    def filter_results(session, params):
+        queryset = MatchingResult.objects.filter(session=session)
+        if "min_score" in params:
+            queryset = queryset.filter(match_score__gte=params["min_score"])
+        if "max_score" in params:
+            queryset = queryset.filter(match_score__lte=params["max_score"])
+        return queryset
+
+    @staticmethod
+    def results_etag(session, request) -> str:
+        """
+        Wersja odpowiedzi: status i czas zakończenia sesji oraz liczba
+        i ostatnie id wyników - w trakcie zadania (RUNNING) wyniki mogą już
+        być zapisywane, a status i czas zakończenia jeszcze się nie zmieniają.
+        """
+        results = MatchingResult.objects.filter(session=session).aggregate(
+            count=Count("id"), last_id=Max("id")
+        )
+        version = (
+            f"{session.pk}:{session.status}:{session.finished_at}:"
+            f"{results['count']}:{results['last_id']}:"
+            f"{request.get_full_path()}:{request.accepted_renderer.format}"
+        )
+        return '"' + hashlib.sha256(version.encode("utf-8")).hexdigest()[:32] + '"'
+
+    @staticmethod
+    def is_not_modified(request, etag: str) -> bool:
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH", "")
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or (
+            if_none_match.strip() == "*"
+        )
+
+    @staticmethod
+    def cache_headers(session, etag: str) -> dict:
+        """Wyniki niezakończonej sesji nie mogą trafić do pamięci podręcznej pośredników"""
+        headers = {"ETag": etag}
+        if session.status not in (
+            MatchingSession.STATUS_COMPLETED,
+            MatchingSession.STATUS_ERROR,
+        ):
+            headers["Cache-Control"] = "no-store"
+        return headers
+
+
+class MatchingSessionResultsView(SessionResultsMixin, APIView):
+    """
+    Wyniki dopasowania sesji stronicowane po kluczu (match_score, id) malejąco.
+    Parametry: min_score, max_score, limit, cursor. Obsługuje If-None-Match (304).
+    """
+
+    def get(self, request, session_id):
+        session, params = self.get_session_and_query(request, session_id)
+
+        etag = self.results_etag(session, request)
+        headers = self.cache_headers(session, etag)
+        if self.is_not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        paginator = MatchScoreKeysetPagination(limit=params["limit"])
+        page = paginator.paginate_queryset(
+            self.filter_results(session, params), request, params.get("cursor")
+        )
+        response = paginator.get_paginated_response(
+            MatchingResultSerializer(page, many=True).data
+        )
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+
+class MatchingSessionResultsExportView(SessionResultsMixin, APIView):
+    """
+    Eksport wszystkich wyników sesji jako NDJSON lub CSV.
+    Wiersze czytane są kursorem bazy (QuerySet.iterator) i od razu wysyłane -
+    queryset nie jest materializowany w pamięci.
+    """
+
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    EXPORT_FORMATS = {
+        NDJSONRenderer.format: NDJSONRenderer.media_type,
+        CSVRenderer.format: CSVRenderer.media_type,
+    }
+    EXPORT_FIELDS = [
+        "id",
+        "wf_description",
+        "wf_sheet",
+        "wf_cell",
+        "ref_description",
+        "ref_sheet",
+        "ref_cell",
+        "ref_file_name",
+        "price_target_cell",
+        "source_info_cell",
+        "match_score",
+        "price",
+    ]
+    ITERATOR_CHUNK_SIZE = 2000
+
+    def get(self, request, session_id, export_format):
+        if export_format not in self.EXPORT_FORMATS:
+            return Response(
+                {"error": f"Nieobsługiwany format eksportu: {export_format}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        session, params = self.get_session_and_query(request, session_id)
+
+        etag = self.results_etag(session, request)
+        headers = self.cache_headers(session, etag)
+        if self.is_not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        rows = (
+            self.filter_results(session, params)
+            .order_by(*MatchScoreKeysetPagination.ordering)
+            .values_list(*self.EXPORT_FIELDS)
+            .iterator(chunk_size=self.ITERATOR_CHUNK_SIZE)
+        )
+        if export_format == CSVRenderer.format:
+            stream = self._csv_lines(rows)
+        else:
+            stream = self._ndjson_lines(rows)
+
+        response = StreamingHttpResponse(
+            stream,
+            content_type=f"{self.EXPORT_FORMATS[export_format]}; charset=utf-8",
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="matching_session_{session.pk}.{export_format}"'
+        )
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    def _ndjson_lines(self, rows):
+        for row in rows:
+            yield (
+                json.dumps(
+                    dict(zip(self.EXPORT_FIELDS, row)),
+                    cls=DjangoJSONEncoder,
+                    ensure_ascii=False,
+                )
+                + "\n"
+            )
+
+    def _csv_lines(self, rows):
+        buffer = _LineBuffer()
+        writer = csv.writer(buffer)
+        yield writer.writerow(self.EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class _LineBuffer:
+    """Bufor dla csv.writer - zwraca zapisaną linię zamiast ją przechowywać"""
+
+    def write(self, value):
+        return value
+
+
+class MetricsView(APIView):
+    """
+    Metryki dla Prometheus: histogramy rozmiaru plików i czasów etapów,
+    liczniki zadań i błędów (zsumowane z migawek wszystkich procesów)
+    oraz bieżąca głębokość kolejki zadań.
+
+    Dostęp określa settings.MATCHING_METRICS_PERMISSION_CLASSES.
+    """
+
+    renderer_classes = [PrometheusTextRenderer]
+
+    def get_permissions(self):
+        return [
+            import_string(permission_class)()
+            for permission_class in settings.MATCHING_METRICS_PERMISSION_CLASSES
+        ]
+
+    def get(self, request):
+        status_counts = dict(
+            MatchingSession.objects.filter(
+                status__in=[
+                    MatchingSession.STATUS_PENDING,
+                    MatchingSession.STATUS_RUNNING,
+                ]
+            )
+            .values_list("status")
+            .annotate(count=Count("id"))
+        )
+        gauges = {
+            "fastbidder_job_queue_depth": (
+                "Zadania oczekujące na wykonanie",
+                status_counts.get(MatchingSession.STATUS_PENDING, 0),
+            ),
+            "fastbidder_jobs_running": (
+                "Zadania w trakcie wykonywania",
+                status_counts.get(MatchingSession.STATUS_RUNNING, 0),
+            ),
+        }
+        return Response(
+            metrics.render_prometheus(metrics.collect(), gauges),
+            content_type=f"{PrometheusTextRenderer.media_type}; version=0.0.4; "
+            f"charset={PrometheusTextRenderer.charset}",
+        )